@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+决策仪表盘的结构化输出 Schema
+===================================
+
+原先只在提示词里描述 JSON 格式，解析时去代码块、截取首尾花括号、正则修补，
+仍失败就退化为关键词计数，既浪费调用又得到低置信度结果。
+
+这里由 AnalysisResult 字段与仪表盘结构生成 JSON Schema：
+1. 请求时交给服务商约束输出（OpenAI response_format / Gemini response_schema）
+2. 响应返回后用 validate 本地校验（类型、必需字段、枚举、取值范围）
+3. 校验不通过时由分析器带上错误清单做一次定向修复，而不是重跑整次分析
+
+Schema 用标准 JSON Schema 书写，to_gemini_schema 转为 Gemini 支持的 OpenAPI 子集。
+"""
+
+import dataclasses
+import typing
+from typing import Any, Dict, List, Optional
+
+TREND_PREDICTIONS = ['强烈看多', '看多', '震荡', '看空', '强烈看空']
+OPERATION_ADVICES = ['买入', '加仓', '持有', '减仓', '卖出', '观望']
+CONFIDENCE_LEVELS = ['高', '中', '低']
+
+# 不由模型输出的元数据字段
+_EXCLUDED_FIELDS = {'code', 'name', 'raw_response', 'success', 'error_message'}
+
+_STR = {'type': 'string'}
+_NUM = {'type': ['number', 'null']}
+_STR_LIST = {'type': 'array', 'items': _STR}
+
+
+def _object(properties: Dict[str, Any], required: Optional[List[str]] = None) -> Dict[str, Any]:
+    schema = {'type': 'object', 'properties': properties}
+    if required:
+        schema['required'] = required
+    return schema
+
+
+# 与 SYSTEM_PROMPT 中的输出格式一致
+DASHBOARD_SCHEMA = _object({
+    'core_conclusion': _object({
+        'one_sentence': _STR,
+        'signal_type': _STR,
+        'time_sensitivity': _STR,
+        'position_advice': _object({'no_position': _STR, 'has_position': _STR}),
+    }, required=['one_sentence']),
+    'data_perspective': _object({
+        'trend_status': _object({'ma_alignment': _STR, 'is_bullish': {'type': 'boolean'}, 'trend_score': _NUM}),
+        'price_position': _object({
+            'current_price': _NUM, 'ma5': _NUM, 'ma10': _NUM, 'ma20': _NUM,
+            'bias_ma5': _NUM, 'bias_status': _STR, 'support_level': _NUM, 'resistance_level': _NUM,
+        }),
+        'volume_analysis': _object({
+            'volume_ratio': _NUM, 'volume_status': _STR, 'turnover_rate': _NUM, 'volume_meaning': _STR,
+        }),
+        'chip_structure': _object({
+            'profit_ratio': _NUM, 'avg_cost': _NUM, 'concentration': _NUM, 'chip_health': _STR,
+        }),
+    }),
+    'intelligence': _object({
+        'latest_news': _STR,
+        'risk_alerts': _STR_LIST,
+        'positive_catalysts': _STR_LIST,
+        'earnings_outlook': _STR,
+        'sentiment_summary': _STR,
+    }),
+    'battle_plan': _object({
+        'sniper_points': _object({'ideal_buy': _STR, 'secondary_buy': _STR, 'stop_loss': _STR, 'take_profit': _STR}),
+        'position_strategy': _object({'suggested_position': _STR, 'entry_plan': _STR, 'risk_control': _STR}),
+        'action_checklist': _STR_LIST,
+    }),
+}, required=['core_conclusion'])
+
+_FIELD_OVERRIDES = {
+    'sentiment_score': {'type': 'integer', 'minimum': 0, 'maximum': 100},
+    'trend_prediction': {'type': 'string', 'enum': TREND_PREDICTIONS},
+    'operation_advice': {'type': 'string', 'enum': OPERATION_ADVICES},
+    'confidence_level': {'type': 'string', 'enum': CONFIDENCE_LEVELS},
+    'dashboard': DASHBOARD_SCHEMA,
+}
+
+_PY_TYPES = {str: 'string', int: 'integer', float: 'number', bool: 'boolean'}
+
+
+def build_analysis_schema(result_cls: type, required: List[str]) -> Dict[str, Any]:
+    """
+    由 AnalysisResult 数据类生成 JSON Schema
+
+    Args:
+        result_cls: AnalysisResult
+        required: 必需字段（日报与推送用到的字段）
+
+    Returns:
+        JSON Schema（必需字段在前，其余按数据类顺序；
+        服务商按 Schema 顺序输出，流式提前中断时不必等待靠后的长文本字段）
+    """
+    hints = typing.get_type_hints(result_cls)
+    fields = [f.name for f in dataclasses.fields(result_cls) if f.name not in _EXCLUDED_FIELDS]
+    properties = {}
+    for name in list(required) + [n for n in fields if n not in required]:
+        if name in _FIELD_OVERRIDES:
+            properties[name] = _FIELD_OVERRIDES[name]
+        elif hints.get(name) in _PY_TYPES:
+            properties[name] = {'type': _PY_TYPES[hints[name]]}
+    return _object(properties, required=list(required))
+
+
+_JSON_TYPES = {
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+    'array': list,
+    'object': dict,
+    'null': type(None),
+}
+
+
+def validate(data: Any, schema: Dict[str, Any], path: str = '$') -> List[str]:
+    """
+    按 Schema 校验数据（支持 type / properties / required / items / enum / minimum / maximum）
+
+    Returns:
+        错误描述列表，为空表示通过
+    """
+    errors = []
+    types = schema.get('type')
+    if types is not None:
+        types = [types] if isinstance(types, str) else types
+        # bool 是 int 的子类，数值类型不接受 true/false
+        ok = any(
+            isinstance(data, _JSON_TYPES[t]) and not (t in ('integer', 'number') and isinstance(data, bool))
+            for t in types
+        )
+        if not ok:
+            return [f"{path} 应为 {'/'.join(types)}，实际为 {type(data).__name__}"]
+
+    if 'enum' in schema and data not in schema['enum']:
+        errors.append(f"{path} 取值 {data!r} 不在 {'/'.join(map(str, schema['enum']))} 中")
+    if isinstance(data, (int, float)) and not isinstance(data, bool):
+        if 'minimum' in schema and data < schema['minimum']:
+            errors.append(f"{path} 不应小于 {schema['minimum']}")
+        if 'maximum' in schema and data > schema['maximum']:
+            errors.append(f"{path} 不应大于 {schema['maximum']}")
+
+    if isinstance(data, dict):
+        for key in schema.get('required', []):
+            if key not in data:
+                errors.append(f"{path}.{key} 缺失")
+        for key, sub in schema.get('properties', {}).items():
+            if key in data:
+                errors.extend(validate(data[key], sub, f"{path}.{key}"))
+    elif isinstance(data, list) and 'items' in schema:
+        for i, item in enumerate(data):
+            errors.extend(validate(item, schema['items'], f"{path}[{i}]"))
+    return errors
+
+
+def to_gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    转为 Gemini response_schema 支持的 OpenAPI 子集
+
+    类型名大写、["number", "null"] 改为 nullable，去掉 minimum / maximum（由本地校验负责）
+    """
+    result: Dict[str, Any] = {}
+    types = schema.get('type')
+    if isinstance(types, list):
+        non_null = [t for t in types if t != 'null']
+        result['type'] = non_null[0].upper()
+        if len(non_null) < len(types):
+            result['nullable'] = True
+    elif types:
+        result['type'] = types.upper()
+    if 'enum' in schema:
+        result['enum'] = list(schema['enum'])
+    if 'properties' in schema:
+        result['properties'] = {k: to_gemini_schema(v) for k, v in schema['properties'].items()}
+    if schema.get('required'):
+        result['required'] = list(schema['required'])
+    if 'items' in schema:
+        result['items'] = to_gemini_schema(schema['items'])
+    return result
@@ -10,11 +10,14 @@ A股自选股智能分析系统 - AI分析层
 3. 结合技术面和消息面生成分析报告
 """
 
+import asyncio
 import json
 import logging
+import threading
 import time
 from dataclasses import dataclass
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 
 from tenacity import (
     retry,
@@ -24,7 +27,21 @@ from tenacity import (
     before_sleep_log,
 )
 
+from analysis_schema import (
+    CONFIDENCE_LEVELS, OPERATION_ADVICES, TREND_PREDICTIONS,
+    build_analysis_schema, to_gemini_schema, validate,
+)
 from config import get_config
+from json_extract import extract_json
+from llm_breaker import CircuitOpenError, get_circuit_breaker, record_failure
+from llm_cache import LLMResponseCache
+from llm_errors import classify_error
+from llm_limiter import LLMRateLimiter, estimate_tokens, get_llm_limiter
+from llm_prefix_cache import GeminiPrefixCache, PrefixCacheStats
+from llm_router import LLMRouter, admission_wait
+from llm_stream import JSONFieldScanner
+from llm_usage import UsageRecorder, UsageTotals, gemini_usage, openai_usage, parse_pricing
+from prompt_budget import PromptSection, assemble_prompt, count_tokens, trim_news
 
 logger = logging.getLogger(__name__)
 
@@ -101,6 +118,7 @@ class AnalysisResult:
     data_sources: str = ""  # 数据来源说明
     success: bool = True
     error_message: Optional[str] = None
+    llm_usage: Optional[UsageTotals] = None  # 本只股票的大模型用量（tokens、耗时、费用）
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -132,6 +150,7 @@ class AnalysisResult:
             'search_performed': self.search_performed,
             'success': self.success,
             'error_message': self.error_message,
+            'llm_usage': self.llm_usage.to_dict() if self.llm_usage else None,
         }
     
     def get_core_conclusion(self) -> str:
@@ -382,6 +401,48 @@ class GeminiAnalyzer:
 4. **检查清单可视化**：用 ✅⚠️❌ 明确显示每项检查结果
 5. **风险优先级**：舆情中的风险点要醒目标出"""
 
+    # 配额预约时按此估算输出 token，响应返回后按实际长度修正
+    EXPECTED_OUTPUT_TOKENS = 2000
+
+    # 批量模式：每只股票预留的输出 token 与单次请求的输出上限
+    PACKED_OUTPUT_TOKENS = 4096
+    PACKED_MAX_OUTPUT_TOKENS = 65536
+
+    # 日报与推送用到的字段：流式响应中这些字段都已闭合即中断请求（长文本分析字段不再等待）
+    REPORT_FIELDS = (
+        'sentiment_score', 'trend_prediction', 'operation_advice', 'confidence_level',
+        'dashboard', 'analysis_summary', 'risk_warning', 'buy_reason',
+    )
+
+    # 结构化输出 Schema（由 AnalysisResult 字段与仪表盘结构生成，REPORT_FIELDS 为必需字段）
+    ANALYSIS_SCHEMA = build_analysis_schema(AnalysisResult, list(REPORT_FIELDS))
+
+    # 新闻段落因总预算被压缩时保留的最少 token 数
+    NEWS_MIN_TOKENS = 300
+
+    # 异步客户端连接池：同时在途的连接数上限与保持的空闲长连接数
+    ASYNC_MAX_CONNECTIONS = 64
+    ASYNC_MAX_KEEPALIVE = 32
+
+    # 服务商建议的重试等待（Retry-After）最多遵循的秒数，更长时视为本次调用不可重试
+    MAX_RETRY_AFTER = 120
+
+    # 分析任务要求（单只与批量提示词共用）
+    ANALYSIS_REQUIREMENTS = """
+### 重点关注（必须明确回答）：
+1. ❓ 是否满足 MA5>MA10>MA20 多头排列？
+2. ❓ 当前乖离率是否在安全范围内（<5%）？—— 超过5%必须标注"严禁追高"
+3. ❓ 量能是否配合（缩量回调/放量突破）？
+4. ❓ 筹码结构是否健康？
+5. ❓ 消息面有无重大利空？（减持、处罚、业绩变脸等）
+
+### 决策仪表盘要求：
+- **核心结论**：一句话说清该买/该卖/该等
+- **持仓分类建议**：空仓者怎么做 vs 持仓者怎么做
+- **具体狙击点位**：买入价、止损价、目标价（精确到分）
+- **检查清单**：每项用 ✅/⚠️/❌ 标记
+"""
+
     def __init__(self, api_key: Optional[str] = None):
         """
         初始化 AI 分析器
@@ -395,9 +456,40 @@ class GeminiAnalyzer:
         self._api_key = api_key or config.gemini_api_key
         self._model = None
         self._current_model_name = None  # 当前使用的模型名称
+        self._gemini_models: Dict[str, Any] = {}  # 已创建的 Gemini 模型（主模型 / 备选模型）
+        self._gemini_models_lock = threading.Lock()
         self._using_fallback = False  # 是否正在使用备选模型
         self._use_openai = False  # 是否使用 OpenAI 兼容 API
         self._openai_client = None  # OpenAI 客户端
+        self._async_openai_client = None  # 异步 OpenAI 客户端（懒加载，绑定事件循环）
+        self._async_openai_loop = None
+        
+        # 本次运行的用量统计：每次实际请求的 tokens、耗时与费用（按股票、按运行汇总）
+        self._usage = UsageRecorder(parse_pricing(config.llm_pricing))
+        self._usage_lock = threading.Lock()
+        self._cached_calls = 0
+        
+        # 结构化输出级别：schema > json > off，服务商拒绝时按服务商逐级降级
+        self._format_level = {'gemini': config.llm_structured_output, 'openai': config.llm_structured_output}
+        # OpenAI 流式请求附带 stream_options.include_usage（服务商不支持时关闭）
+        self._openai_stream_usage = True
+        
+        # 服务商侧前缀缓存：Gemini 显式缓存系统提示词；OpenAI 兼容 API 自动缓存固定前缀，只做命中统计
+        self._prefix_stats = PrefixCacheStats()
+        self._gemini_prefix = None
+        if config.llm_prefix_cache_enabled:
+            self._gemini_prefix = GeminiPrefixCache(
+                self.SYSTEM_PROMPT, ttl_seconds=config.llm_prefix_cache_ttl_minutes * 60
+            )
+        
+        # 响应缓存（prompt 不变时跳过调用）
+        self._response_cache = None
+        if config.llm_cache_enabled:
+            self._response_cache = LLMResponseCache(
+                cache_dir=config.cache_dir,
+                ttl_seconds=config.llm_cache_ttl_hours * 3600,
+                max_bytes=config.llm_cache_max_mb << 20,
+            )
         
         # 检查 Gemini API Key 是否有效（过滤占位符）
         gemini_key_valid = self._api_key and not self._api_key.startswith('your_') and len(self._api_key) > 10
@@ -417,8 +509,38 @@ class GeminiAnalyzer:
         # 两者都未配置
         if not self._model and not self._openai_client:
             logger.warning("未配置任何 AI API Key，AI 分析功能将不可用")
+        
+        # 多个端点可用时按延迟路由（替代固定的 Gemini → 备选模型 → OpenAI 顺序）
+        self._router = None
+        if config.llm_router_enabled:
+            self._init_router()
+    
+    def _init_router(self) -> None:
+        """收集可用端点（服务商:模型），不少于两个时启用 LLMRouter"""
+        config = get_config()
+        endpoints = []
+        if self._model is not None:
+            endpoints.append(f"gemini:{self._current_model_name}")
+            fallback = config.gemini_model_fallback
+            if fallback and fallback != self._current_model_name:
+                endpoints.append(f"gemini:{fallback}")
+            if not self._openai_client:
+                self._init_openai_fallback(activate=False)
+        if self._openai_client:
+            endpoints.append(f"openai:{config.openai_model}")
+        if len(endpoints) < 2:
+            return
+        self._router = LLMRouter(
+            endpoints,
+            hedge=config.llm_hedge_enabled,
+            hedge_delay=config.llm_hedge_delay_seconds,
+            deadline=config.llm_call_deadline_seconds,
+            max_workers=max(16, config.max_workers * 2),
+            latency_ranking=config.llm_router_latency_ranking,
+        )
+        logger.info(f"[LLM路由] 已启用，端点: {', '.join(endpoints)}")
     
-    def _init_openai_fallback(self) -> None:
+    def _init_openai_fallback(self, activate: bool = True) -> None:
         """
         初始化 OpenAI 兼容 API 作为备选
         
@@ -427,6 +549,9 @@ class GeminiAnalyzer:
         - DeepSeek
         - 通义千问
         - Moonshot 等
+        
+        Args:
+            activate: 是否切换为 OpenAI 模式（False 时只创建客户端，供路由使用）
         """
         config = get_config()
         
@@ -455,8 +580,9 @@ class GeminiAnalyzer:
                 client_kwargs["base_url"] = config.openai_base_url
             
             self._openai_client = OpenAI(**client_kwargs)
-            self._current_model_name = config.openai_model
-            self._use_openai = True
+            if activate:
+                self._current_model_name = config.openai_model
+                self._use_openai = True
             logger.info(f"OpenAI 兼容 API 初始化成功 (base_url: {config.openai_base_url}, model: {config.openai_model})")
         except ImportError as e:
             # 依赖缺失（如 socksio）
@@ -495,28 +621,55 @@ class GeminiAnalyzer:
             
             # 尝试初始化主模型
             try:
-                self._model = genai.GenerativeModel(
-                    model_name=model_name,
-                    system_instruction=self.SYSTEM_PROMPT,
-                )
+                self._model = self._new_gemini_model(genai, model_name)
                 self._current_model_name = model_name
                 self._using_fallback = False
+                self._gemini_models[model_name] = self._model
                 logger.info(f"Gemini 模型初始化成功 (模型: {model_name})")
             except Exception as model_error:
                 # 尝试备选模型
                 logger.warning(f"主模型 {model_name} 初始化失败: {model_error}，尝试备选模型 {fallback_model}")
-                self._model = genai.GenerativeModel(
-                    model_name=fallback_model,
-                    system_instruction=self.SYSTEM_PROMPT,
-                )
+                self._model = self._new_gemini_model(genai, fallback_model)
                 self._current_model_name = fallback_model
                 self._using_fallback = True
+                self._gemini_models[fallback_model] = self._model
                 logger.info(f"Gemini 备选模型初始化成功 (模型: {fallback_model})")
             
         except Exception as e:
             logger.error(f"Gemini 模型初始化失败: {e}")
             self._model = None
     
+    def _new_gemini_model(self, genai, model_name: str):
+        """创建 Gemini 模型：启用前缀缓存时引用缓存的系统提示词，否则每次请求携带系统提示词"""
+        if self._gemini_prefix is not None:
+            return self._gemini_prefix.create_model(model_name)
+        return genai.GenerativeModel(
+            model_name=model_name,
+            system_instruction=self.SYSTEM_PROMPT,
+        )
+    
+    def _gemini_model(self, model_name: str):
+        """取得（必要时创建）指定名称的 Gemini 模型"""
+        if model_name == self._current_model_name and self._model is not None:
+            return self._model
+        with self._gemini_models_lock:
+            model = self._gemini_models.get(model_name)
+            if model is None:
+                import google.generativeai as genai
+                model = self._new_gemini_model(genai, model_name)
+                self._gemini_models[model_name] = model
+            return model
+    
+    def _refresh_prefix_cache(self, model_name: str) -> None:
+        """请求前检查该模型 Gemini 前缀缓存的有效期，必要时续期或重建"""
+        if self._gemini_prefix is not None:
+            model = self._gemini_prefix.refresh(model_name)
+            if model is not None:
+                with self._gemini_models_lock:
+                    self._gemini_models[model_name] = model
+                if model_name == self._current_model_name:
+                    self._model = model
+    
     def _switch_to_fallback_model(self) -> bool:
         """
         切换到备选模型
@@ -525,15 +678,11 @@ class GeminiAnalyzer:
             是否成功切换
         """
         try:
-            import google.generativeai as genai
             config = get_config()
             fallback_model = config.gemini_model_fallback
             
             logger.warning(f"[LLM] 切换到备选模型: {fallback_model}")
-            self._model = genai.GenerativeModel(
-                model_name=fallback_model,
-                system_instruction=self.SYSTEM_PROMPT,
-            )
+            self._model = self._gemini_model(fallback_model)
             self._current_model_name = fallback_model
             self._using_fallback = True
             logger.info(f"[LLM] 备选模型 {fallback_model} 初始化成功")
@@ -546,13 +695,78 @@ class GeminiAnalyzer:
         """检查分析器是否可用"""
         return self._model is not None or self._openai_client is not None
     
-    def _call_openai_api(self, prompt: str, generation_config: dict) -> str:
+    def _acquire_quota(
+        self,
+        provider: str,
+        prompt: str,
+        model_name: Optional[str] = None
+    ) -> Tuple[LLMRateLimiter, List[float], int]:
+        """
+        按 RPM/TPM 配额预约一次请求（配额有余量时立即返回）
+
+        Returns:
+            (限流器, 预约记录, 输入 token 估算)
+        """
+        limiter, input_tokens = self._quota_target(provider, prompt, model_name)
+        # 排队等配额的时间不计入路由的端点延迟与对冲计时
+        with admission_wait():
+            reservation = limiter.acquire(input_tokens + self.EXPECTED_OUTPUT_TOKENS)
+        return limiter, reservation, input_tokens
+    
+    async def _acquire_quota_async(
+        self,
+        provider: str,
+        prompt: str,
+        model_name: Optional[str] = None
+    ) -> Tuple[LLMRateLimiter, List[float], int]:
+        """_acquire_quota 的协程版本，等待配额时不阻塞事件循环"""
+        limiter, input_tokens = self._quota_target(provider, prompt, model_name)
+        with admission_wait():
+            reservation = await limiter.acquire_async(input_tokens + self.EXPECTED_OUTPUT_TOKENS)
+        return limiter, reservation, input_tokens
+    
+    def _quota_target(self, provider: str, prompt: str, model_name: Optional[str] = None) -> Tuple[LLMRateLimiter, int]:
+        """模型（默认当前模型）的共享限流器与输入 token 估算"""
+        limiter = get_llm_limiter(provider, model_name or self._current_model_name)
+        input_tokens = estimate_tokens(self.SYSTEM_PROMPT) + estimate_tokens(prompt)
+        return limiter, input_tokens
+    
+    @classmethod
+    def _retry_delay(cls, attempt: int, base_delay: float, error: Optional[Exception] = None) -> float:
+        """指数退避: 5, 10, 20, 40...，最大 60 秒；服务商给出等待时间时取两者较大值"""
+        delay = min(base_delay * (2 ** (attempt - 1)), 60)
+        hint = cls._suggested_wait(error) if error is not None else None
+        return max(delay, hint) if hint is not None else delay
+    
+    @classmethod
+    def _suggested_wait(cls, error: Exception) -> Optional[float]:
+        """Retry-After 或熔断剩余时间（秒，最多 MAX_RETRY_AFTER）；没有建议时返回 None"""
+        if isinstance(error, CircuitOpenError):
+            wait = error.retry_in
+        else:
+            wait = classify_error(error).retry_after
+        return min(wait, cls.MAX_RETRY_AFTER) if wait is not None else None
+    
+    @classmethod
+    def _is_retryable(cls, error: Exception) -> bool:
+        """鉴权、模型不存在、参数错误、内容拦截等重试不会成功的错误返回 False"""
+        if isinstance(error, CircuitOpenError):
+            return error.retry_in <= cls.MAX_RETRY_AFTER
+        return classify_error(error).retryable
+
+    def _call_openai_api(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
         """
         调用 OpenAI 兼容 API
         
         Args:
             prompt: 提示词
             generation_config: 生成配置
+            stop_fields: 流式请求并在这些顶层字段就绪时中断（None 为普通请求）
             
         Returns:
             响应文本
@@ -561,72 +775,592 @@ class GeminiAnalyzer:
         max_retries = config.gemini_max_retries
         base_delay = config.gemini_retry_delay
         
+        last_error = None
         for attempt in range(max_retries):
             try:
                 if attempt > 0:
-                    delay = base_delay * (2 ** (attempt - 1))
-                    delay = min(delay, 60)
+                    delay = self._retry_delay(attempt, base_delay, last_error)
                     logger.info(f"[OpenAI] 第 {attempt + 1} 次重试，等待 {delay:.1f} 秒...")
                     time.sleep(delay)
                 
-                response = self._openai_client.chat.completions.create(
-                    model=self._current_model_name,
-                    messages=[
-                        {"role": "system", "content": self.SYSTEM_PROMPT},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=generation_config.get('temperature', 0.7),
-                    max_tokens=generation_config.get('max_output_tokens', 8192),
-                )
-                
-                # 处理不同的响应格式
-                if response is None:
-                    raise ValueError("OpenAI API 返回空响应")
-                
-                # 标准 OpenAI 格式：response.choices[0].message.content
-                if hasattr(response, 'choices') and response.choices:
-                    content = response.choices[0].message.content
-                    if content:
-                        return content
-                    raise ValueError("OpenAI API 返回空内容")
-                
-                # 某些兼容 API 直接返回字符串
-                if isinstance(response, str):
-                    if response.strip():
-                        return response
-                    raise ValueError("OpenAI API 返回空字符串")
-                
-                # 某些 API 返回 dict 格式
-                if isinstance(response, dict):
-                    # 尝试多种常见格式
-                    if 'choices' in response and response['choices']:
-                        content = response['choices'][0].get('message', {}).get('content')
-                        if content:
-                            return content
-                    if 'content' in response:
-                        return response['content']
-                    if 'text' in response:
-                        return response['text']
-                    if 'response' in response:
-                        return response['response']
-                
-                raise ValueError(f"无法解析 OpenAI API 响应格式: {type(response)}")
+                return self._openai_once(prompt, generation_config, stop_fields)
                     
             except Exception as e:
-                error_str = str(e)
-                is_rate_limit = '429' in error_str or 'rate' in error_str.lower() or 'quota' in error_str.lower()
-                
-                if is_rate_limit:
-                    logger.warning(f"[OpenAI] API 限流，第 {attempt + 1}/{max_retries} 次尝试: {error_str[:100]}")
-                else:
-                    logger.warning(f"[OpenAI] API 调用失败，第 {attempt + 1}/{max_retries} 次尝试: {error_str[:100]}")
+                last_error = e
+                downgraded = self._downgrade_output_format('openai', e)
+                self._log_openai_error(e, attempt, max_retries)
+                if attempt == max_retries - 1 or not (downgraded or self._is_retryable(e)):
+                    raise
+        
+        raise Exception("OpenAI API 调用失败，已达最大重试次数")
+    
+    async def _call_openai_api_async(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """
+        调用 OpenAI 兼容 API（协程版本，AsyncOpenAI + 共享连接池）
+        
+        Args:
+            prompt: 提示词
+            generation_config: 生成配置
+            stop_fields: 流式请求并在这些顶层字段就绪时中断（None 为普通请求）
+            
+        Returns:
+            响应文本
+        """
+        config = get_config()
+        max_retries = config.gemini_max_retries
+        base_delay = config.gemini_retry_delay
+        
+        last_error = None
+        for attempt in range(max_retries):
+            try:
+                if attempt > 0:
+                    delay = self._retry_delay(attempt, base_delay, last_error)
+                    logger.info(f"[OpenAI] 第 {attempt + 1} 次重试，等待 {delay:.1f} 秒...")
+                    await asyncio.sleep(delay)
                 
-                if attempt == max_retries - 1:
+                return await self._openai_once_async(prompt, generation_config, stop_fields)
+                    
+            except Exception as e:
+                last_error = e
+                downgraded = self._downgrade_output_format('openai', e)
+                self._log_openai_error(e, attempt, max_retries)
+                if attempt == max_retries - 1 or not (downgraded or self._is_retryable(e)):
                     raise
         
         raise Exception("OpenAI API 调用失败，已达最大重试次数")
     
-    def _call_api_with_retry(self, prompt: str, generation_config: dict) -> str:
+    def _openai_once(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None,
+        model_name: Optional[str] = None
+    ) -> str:
+        """向 OpenAI 兼容 API 发起一次请求（不重试，经熔断器）"""
+        return self._guarded(
+            'openai', model_name or self._current_model_name,
+            self._openai_request_once, prompt, generation_config, stop_fields, model_name,
+        )
+    
+    async def _openai_once_async(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None,
+        model_name: Optional[str] = None
+    ) -> str:
+        """_openai_once 的协程版本"""
+        return await self._guarded_async(
+            'openai', model_name or self._current_model_name,
+            self._openai_request_once_async, prompt, generation_config, stop_fields, model_name,
+        )
+    
+    def _gemini_once(
+        self,
+        model_name: str,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """向指定 Gemini 模型发起一次请求（不重试，经熔断器）"""
+        return self._guarded(
+            'gemini', model_name,
+            self._gemini_request_once, model_name, prompt, generation_config, stop_fields,
+        )
+    
+    async def _gemini_once_async(
+        self,
+        model_name: str,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """_gemini_once 的协程版本"""
+        return await self._guarded_async(
+            'gemini', model_name,
+            self._gemini_request_once_async, model_name, prompt, generation_config, stop_fields,
+        )
+    
+    @staticmethod
+    def _guarded(provider: str, model_name: str, request, *args) -> str:
+        """
+        经共享熔断器发起请求：已熔断时直接抛出 CircuitOpenError，
+        失败按错误分类登记（服务商宕机、Key 无效等信息在股票之间共享）
+        """
+        breaker = get_circuit_breaker(provider, model_name)
+        breaker.before_call()
+        try:
+            result = request(*args)
+        except Exception as e:
+            record_failure(provider, model_name, classify_error(e))
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
+    
+    @staticmethod
+    async def _guarded_async(provider: str, model_name: str, request, *args) -> str:
+        """_guarded 的协程版本（请求被取消时交还半开状态的探测名额）"""
+        breaker = get_circuit_breaker(provider, model_name)
+        breaker.before_call()
+        try:
+            result = await request(*args)
+        except Exception as e:
+            record_failure(provider, model_name, classify_error(e))
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
+    
+    def _openai_request_once(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None,
+        model_name: Optional[str] = None
+    ) -> str:
+        """OpenAI 兼容 API 的实际请求"""
+        limiter, reservation, input_tokens = self._acquire_quota('openai', prompt, model_name)
+        started = time.monotonic()
+        if stop_fields:
+            content, output_tokens, cutoff, usage = self._stream_openai(prompt, generation_config, stop_fields, model_name)
+        else:
+            response = self._openai_client.chat.completions.create(
+                **self._openai_request(prompt, generation_config, model_name)
+            )
+            content, cutoff = self._extract_openai_content(response), False
+            output_tokens, usage = estimate_tokens(content), openai_usage(response)
+        model_name = model_name or self._current_model_name
+        limiter.settle(reservation, self._record_usage(
+            'openai', model_name, usage, input_tokens, output_tokens, started, prompt if cutoff else None
+        ))
+        return content
+    
+    async def _openai_request_once_async(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None,
+        model_name: Optional[str] = None
+    ) -> str:
+        """_openai_request_once 的协程版本"""
+        client = self._get_async_openai_client()
+        limiter, reservation, input_tokens = await self._acquire_quota_async('openai', prompt, model_name)
+        started = time.monotonic()
+        if stop_fields:
+            content, output_tokens, cutoff, usage = await self._stream_openai_async(
+                client, prompt, generation_config, stop_fields, model_name
+            )
+        else:
+            response = await client.chat.completions.create(
+                **self._openai_request(prompt, generation_config, model_name)
+            )
+            content, cutoff = self._extract_openai_content(response), False
+            output_tokens, usage = estimate_tokens(content), openai_usage(response)
+        model_name = model_name or self._current_model_name
+        limiter.settle(reservation, self._record_usage(
+            'openai', model_name, usage, input_tokens, output_tokens, started, prompt if cutoff else None
+        ))
+        return content
+    
+    def _gemini_request_once(
+        self,
+        model_name: str,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """Gemini 的实际请求"""
+        self._refresh_prefix_cache(model_name)
+        model = self._gemini_model(model_name)
+        limiter, reservation, input_tokens = self._acquire_quota('gemini', prompt, model_name)
+        started = time.monotonic()
+        if stop_fields:
+            text, output_tokens, cutoff, usage = self._stream_gemini(prompt, generation_config, stop_fields, model)
+            limiter.settle(reservation, self._record_usage(
+                'gemini', model_name, usage, input_tokens, output_tokens, started, prompt if cutoff else None
+            ))
+            return text
+        
+        response = model.generate_content(
+            prompt,
+            generation_config=self._gemini_generation_config(generation_config),
+            request_options={"timeout": 120}
+        )
+        
+        if response and response.text:
+            usage = gemini_usage(response)
+            output_tokens = estimate_tokens(response.text)
+            limiter.settle(reservation, self._record_usage('gemini', model_name, usage, input_tokens, output_tokens, started))
+            return response.text
+        raise ValueError("Gemini 返回空响应")
+    
+    async def _gemini_request_once_async(
+        self,
+        model_name: str,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """_gemini_request_once 的协程版本"""
+        self._refresh_prefix_cache(model_name)
+        model = self._gemini_model(model_name)
+        limiter, reservation, input_tokens = await self._acquire_quota_async('gemini', prompt, model_name)
+        started = time.monotonic()
+        if stop_fields:
+            text, output_tokens, cutoff, usage = await self._stream_gemini_async(prompt, generation_config, stop_fields, model)
+            limiter.settle(reservation, self._record_usage(
+                'gemini', model_name, usage, input_tokens, output_tokens, started, prompt if cutoff else None
+            ))
+            return text
+        
+        response = await model.generate_content_async(
+            prompt,
+            generation_config=self._gemini_generation_config(generation_config),
+            request_options={"timeout": 120}
+        )
+        
+        if response and response.text:
+            usage = gemini_usage(response)
+            output_tokens = estimate_tokens(response.text)
+            limiter.settle(reservation, self._record_usage('gemini', model_name, usage, input_tokens, output_tokens, started))
+            return response.text
+        raise ValueError("Gemini 返回空响应")
+    
+    def _record_usage(
+        self,
+        provider: str,
+        model_name: str,
+        usage: Optional[Tuple[int, int, int]],
+        input_tokens: int,
+        output_tokens: int,
+        started: float,
+        cutoff_prompt: Optional[str] = None
+    ) -> int:
+        """
+        登记一次请求的用量（服务商未返回 usage 时按本地估算）
+        
+        Args:
+            cutoff_prompt: 流式提前结束时的提示词；这类请求收不到最后附带 usage 的分片，
+                输入 tokens 按提示词重新计数（输入仍按全量计费）
+        
+        Returns:
+            用于结算配额的 token 数（输入 + 输出）
+        """
+        if usage:
+            prompt_tokens, completion_tokens, cached_tokens = usage
+            self._prefix_stats.record(prompt_tokens, cached_tokens)
+        elif cutoff_prompt is not None:
+            prompt_tokens = count_tokens(self.SYSTEM_PROMPT) + count_tokens(cutoff_prompt)
+            completion_tokens, cached_tokens = output_tokens, 0
+        else:
+            prompt_tokens, completion_tokens, cached_tokens = input_tokens, output_tokens, 0
+        self._usage.record(
+            provider, model_name, prompt_tokens, completion_tokens, cached_tokens,
+            latency=time.monotonic() - started, estimated=not usage,
+            cutoff=not usage and cutoff_prompt is not None,
+        )
+        return prompt_tokens + completion_tokens
+    
+    def _get_async_openai_client(self):
+        """
+        获取异步 OpenAI 客户端
+        
+        所有协程共享同一个 httpx.AsyncClient（keep-alive 连接池），
+        数十个请求同时在途时复用已建立的 TLS 连接，不为每个请求占用一个线程。
+        连接池绑定创建时的事件循环，换用新的事件循环时重新创建。
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_openai_client is not None and self._async_openai_loop is loop:
+            return self._async_openai_client
+        
+        import httpx
+        from openai import AsyncOpenAI
+        
+        config = get_config()
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=self.ASYNC_MAX_KEEPALIVE,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+        client_kwargs = {"api_key": config.openai_api_key, "http_client": http_client}
+        if config.openai_base_url and config.openai_base_url.startswith('http'):
+            client_kwargs["base_url"] = config.openai_base_url
+        
+        self._async_openai_client = AsyncOpenAI(**client_kwargs)
+        self._async_openai_loop = loop
+        logger.debug(f"[OpenAI] 异步客户端已创建 (最大连接数 {self.ASYNC_MAX_CONNECTIONS})")
+        return self._async_openai_client
+    
+    async def aclose(self) -> None:
+        """关闭异步客户端的连接池（在创建它的事件循环中调用）"""
+        if self._async_openai_client is not None:
+            await self._async_openai_client.close()
+            self._async_openai_client = None
+            self._async_openai_loop = None
+    
+    @staticmethod
+    def _log_openai_error(error: Exception, attempt: int, max_retries: int) -> None:
+        error_str = str(error)
+        info = 'circuit_open' if isinstance(error, CircuitOpenError) else classify_error(error)
+        
+        if getattr(info, 'reason', None) == 'rate_limit':
+            logger.warning(f"[OpenAI] API 限流，第 {attempt + 1}/{max_retries} 次尝试 ({info}): {error_str[:100]}")
+        else:
+            logger.warning(f"[OpenAI] API 调用失败，第 {attempt + 1}/{max_retries} 次尝试 ({info}): {error_str[:100]}")
+    
+    def _openai_request(self, prompt: str, generation_config: dict, model_name: Optional[str] = None) -> Dict[str, Any]:
+        """chat.completions.create 的请求参数（结构化输出转为 response_format）"""
+        request = dict(
+            model=model_name or self._current_model_name,
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=generation_config.get('temperature', 0.7),
+            max_tokens=generation_config.get('max_output_tokens', 8192),
+        )
+        level = self._format_level['openai']
+        if level == 'schema' and generation_config.get('response_schema'):
+            request['response_format'] = {
+                "type": "json_schema",
+                "json_schema": {"name": "stock_dashboard", "schema": generation_config['response_schema']},
+            }
+        elif level != 'off' and generation_config.get('response_mime_type') == 'application/json':
+            request['response_format'] = {"type": "json_object"}
+        return request
+    
+    def _openai_stream_request(self, prompt: str, generation_config: dict, model_name: Optional[str] = None) -> Dict[str, Any]:
+        """流式请求参数：要求最后一个分片附带 usage（提前结束时收不到）"""
+        request = self._openai_request(prompt, generation_config, model_name)
+        if self._openai_stream_usage:
+            request['stream_options'] = {"include_usage": True}
+        return request
+    
+    def _gemini_generation_config(self, generation_config: dict, streaming: bool = False) -> dict:
+        """
+        Gemini 的 generation_config（Schema 转为 OpenAPI 子集）
+        
+        带 response_schema 时 Gemini 按字母序输出字段，流式提前中断将等不到靠后的必需字段，
+        因此流式请求只用 JSON 模式，保持提示词中的字段顺序，由本地校验兜底。
+        """
+        config = dict(generation_config)
+        schema = config.pop('response_schema', None)
+        level = self._format_level['gemini']
+        if level == 'off':
+            config.pop('response_mime_type', None)
+        elif level == 'schema' and schema is not None and not streaming:
+            config['response_schema'] = to_gemini_schema(schema)
+        return config
+    
+    def _downgrade_output_format(self, provider: str, error: Exception) -> bool:
+        """
+        服务商不支持当前结构化输出方式时降一级（schema → json → off）；
+        不支持 stream_options 时流式请求不再附带该参数
+        
+        Returns:
+            是否降级（降级后的请求值得立即重试，即使错误本身是参数错误）
+        """
+        error_str = str(error).lower()
+        if provider == 'openai' and self._openai_stream_usage and 'stream_options' in error_str:
+            logger.warning("[LLM用量] OpenAI 兼容 API 不支持 stream_options，流式请求不再附带 usage 选项")
+            self._openai_stream_usage = False
+            return True
+        keywords = ('response_format', 'json_schema', 'json_object', 'response_schema', 'response_mime_type')
+        if not any(k in error_str for k in keywords):
+            return False
+        lower = {'schema': 'json', 'json': 'off'}.get(self._format_level[provider])
+        if lower:
+            logger.warning(f"[结构化输出] {provider} 不支持 {self._format_level[provider]} 模式，降级为 {lower}")
+            self._format_level[provider] = lower
+            return True
+        return False
+    
+    def _stream_openai(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Tuple[str, ...],
+        model_name: Optional[str] = None
+    ) -> Tuple[str, int, bool, Optional[Tuple[int, int, int]]]:
+        """
+        流式调用 OpenAI 兼容 API，所需字段就绪后关闭连接（服务端随之停止生成）
+        
+        Returns:
+            (响应文本, 实际收到的输出 token 估算, 是否提前结束, 服务商返回的用量（未返回时为 None）)
+        """
+        stream = self._openai_client.chat.completions.create(
+            stream=True, **self._openai_stream_request(prompt, generation_config, model_name)
+        )
+        scanner = JSONFieldScanner()
+        usage = None
+        try:
+            for chunk in stream:
+                # include_usage 时最后一个分片（choices 为空）附带 usage（含缓存命中数）
+                if getattr(chunk, 'usage', None):
+                    usage = openai_usage(chunk) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    scanner.feed(chunk.choices[0].delta.content)
+                    # 已完整收到时继续读完，拿到最后附带 usage 的分片
+                    if scanner.has_fields(stop_fields) and not scanner.finished:
+                        break
+        finally:
+            stream.close()
+        return (*self._stream_result('OpenAI', scanner, stop_fields), usage)
+    
+    async def _stream_openai_async(
+        self,
+        client,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Tuple[str, ...],
+        model_name: Optional[str] = None
+    ) -> Tuple[str, int, bool, Optional[Tuple[int, int, int]]]:
+        """_stream_openai 的协程版本"""
+        stream = await client.chat.completions.create(
+            stream=True, **self._openai_stream_request(prompt, generation_config, model_name)
+        )
+        scanner = JSONFieldScanner()
+        usage = None
+        try:
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    usage = openai_usage(chunk) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    scanner.feed(chunk.choices[0].delta.content)
+                    # 已完整收到时继续读完，拿到最后附带 usage 的分片
+                    if scanner.has_fields(stop_fields) and not scanner.finished:
+                        break
+        finally:
+            await stream.close()
+        return (*self._stream_result('OpenAI', scanner, stop_fields), usage)
+    
+    def _stream_gemini(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Tuple[str, ...],
+        model=None
+    ) -> Tuple[str, int, bool, Optional[Tuple[int, int, int]]]:
+        """流式调用 Gemini（默认当前模型），所需字段就绪后停止读取"""
+        response = (model or self._model).generate_content(
+            prompt,
+            generation_config=self._gemini_generation_config(generation_config, streaming=True),
+            request_options={"timeout": 120},
+            stream=True,
+        )
+        scanner = JSONFieldScanner()
+        usage = None
+        for chunk in response:
+            # 每个分片的 usage_metadata 为截至该分片的累计值
+            usage = gemini_usage(chunk) or usage
+            scanner.feed(self._gemini_chunk_text(chunk))
+            if scanner.has_fields(stop_fields):
+                break
+        # 中断后不再消费迭代器，底层流随响应对象释放而取消
+        return (*self._stream_result('Gemini', scanner, stop_fields), usage)
+    
+    async def _stream_gemini_async(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Tuple[str, ...],
+        model=None
+    ) -> Tuple[str, int, bool, Optional[Tuple[int, int, int]]]:
+        """_stream_gemini 的协程版本"""
+        response = await (model or self._model).generate_content_async(
+            prompt,
+            generation_config=self._gemini_generation_config(generation_config, streaming=True),
+            request_options={"timeout": 120},
+            stream=True,
+        )
+        scanner = JSONFieldScanner()
+        usage = None
+        async for chunk in response:
+            usage = gemini_usage(chunk) or usage
+            scanner.feed(self._gemini_chunk_text(chunk))
+            if scanner.has_fields(stop_fields):
+                break
+        return (*self._stream_result('Gemini', scanner, stop_fields), usage)
+    
+    @staticmethod
+    def _gemini_chunk_text(chunk) -> str:
+        # 结束分片可能不含 parts，访问 .text 会抛 ValueError
+        try:
+            return chunk.text or ""
+        except ValueError:
+            return ""
+    
+    @staticmethod
+    def _stream_result(provider: str, scanner: JSONFieldScanner, stop_fields: Tuple[str, ...]) -> Tuple[str, int, bool]:
+        """
+        流式结果：字段提前就绪时返回重新序列化的 JSON，否则返回完整原文
+        
+        Returns:
+            (响应文本, 实际收到的输出 token 估算, 是否提前结束)
+        """
+        output_tokens = estimate_tokens(scanner.text)
+        if not scanner.text.strip():
+            raise ValueError(f"{provider} 返回空响应")
+        if scanner.has_fields(stop_fields) and not scanner.finished:
+            logger.info(f"[{provider}] 所需字段已就绪，提前结束流式响应 (已收 {len(scanner.text)} 字符)")
+            return scanner.to_json(), output_tokens, True
+        return scanner.text, output_tokens, False
+    
+    @staticmethod
+    def _extract_openai_content(response) -> str:
+        """从 OpenAI 兼容 API 的各种响应格式中取出文本"""
+        # 处理不同的响应格式
+        if response is None:
+            raise ValueError("OpenAI API 返回空响应")
+        
+        # 标准 OpenAI 格式：response.choices[0].message.content
+        if hasattr(response, 'choices') and response.choices:
+            content = response.choices[0].message.content
+            if content:
+                return content
+            raise ValueError("OpenAI API 返回空内容")
+        
+        # 某些兼容 API 直接返回字符串
+        if isinstance(response, str):
+            if response.strip():
+                return response
+            raise ValueError("OpenAI API 返回空字符串")
+        
+        # 某些 API 返回 dict 格式
+        if isinstance(response, dict):
+            # 尝试多种常见格式
+            if 'choices' in response and response['choices']:
+                content = response['choices'][0].get('message', {}).get('content')
+                if content:
+                    return content
+            if 'content' in response:
+                return response['content']
+            if 'text' in response:
+                return response['text']
+            if 'response' in response:
+                return response['response']
+        
+        raise ValueError(f"无法解析 OpenAI API 响应格式: {type(response)}")
+    
+    def _call_api_with_retry(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
         """
         调用 AI API，带有重试和模型切换机制
         
@@ -637,70 +1371,55 @@ class GeminiAnalyzer:
         2. 多次失败后切换到备选模型
         3. Gemini 完全失败后尝试 OpenAI
         
+        启用路由（多个端点可用）时改由 LLMRouter 按延迟选择端点并对冲，见 _call_routed
+        
         Args:
             prompt: 提示词
             generation_config: 生成配置
+            stop_fields: 流式请求并在这些顶层字段就绪时中断（None 为普通请求）
             
         Returns:
             响应文本
         """
+        if self._router is not None:
+            return self._call_routed(prompt, generation_config, stop_fields)
+        
         # 如果已经在使用 OpenAI 模式，直接调用 OpenAI
         if self._use_openai:
-            return self._call_openai_api(prompt, generation_config)
+            return self._call_openai_api(prompt, generation_config, stop_fields)
         
         config = get_config()
         max_retries = config.gemini_max_retries
         base_delay = config.gemini_retry_delay
         
         last_error = None
+        wait_hint = None
         tried_fallback = getattr(self, '_using_fallback', False)
         
         for attempt in range(max_retries):
             try:
                 # 请求前增加延时（防止请求过快触发限流）
                 if attempt > 0:
-                    delay = base_delay * (2 ** (attempt - 1))  # 指数退避: 5, 10, 20, 40...
-                    delay = min(delay, 60)  # 最大60秒
+                    delay = self._retry_delay(attempt, base_delay, wait_hint)
                     logger.info(f"[Gemini] 第 {attempt + 1} 次重试，等待 {delay:.1f} 秒...")
                     time.sleep(delay)
                 
-                response = self._model.generate_content(
-                    prompt,
-                    generation_config=generation_config,
-                    request_options={"timeout": 120}
-                )
-                
-                if response and response.text:
-                    return response.text
-                else:
-                    raise ValueError("Gemini 返回空响应")
+                return self._gemini_once(self._current_model_name, prompt, generation_config, stop_fields)
                     
             except Exception as e:
                 last_error = e
-                error_str = str(e)
-                
-                # 检查是否是 429 限流错误
-                is_rate_limit = '429' in error_str or 'quota' in error_str.lower() or 'rate' in error_str.lower()
-                
-                if is_rate_limit:
-                    logger.warning(f"[Gemini] API 限流 (429)，第 {attempt + 1}/{max_retries} 次尝试: {error_str[:100]}")
-                    
-                    # 如果已经重试了一半次数且还没切换过备选模型，尝试切换
-                    if attempt >= max_retries // 2 and not tried_fallback:
-                        if self._switch_to_fallback_model():
-                            tried_fallback = True
-                            logger.info("[Gemini] 已切换到备选模型，继续重试")
-                        else:
-                            logger.warning("[Gemini] 切换备选模型失败，继续使用当前模型重试")
-                else:
-                    # 非限流错误，记录并继续重试
-                    logger.warning(f"[Gemini] API 调用失败，第 {attempt + 1}/{max_retries} 次尝试: {error_str[:100]}")
+                switched, retry = self._handle_gemini_error(e, attempt, max_retries, tried_fallback)
+                # 刚切换到备选模型时，原模型的 Retry-After / 熔断时间不再适用
+                wait_hint = None if switched != tried_fallback else e
+                tried_fallback = switched
+                if not retry:
+                    break
         
         # Gemini 所有重试都失败，尝试 OpenAI 兼容 API
         if self._openai_client:
             logger.warning("[Gemini] 所有重试失败，切换到 OpenAI 兼容 API")
             try:
-                return self._call_openai_api(prompt, generation_config)
+                return self._call_openai_api(prompt, generation_config, stop_fields)
             except Exception as openai_error:
                 logger.error(f"[OpenAI] 备选 API 也失败: {openai_error}")
                 raise last_error or openai_error
@@ -710,7 +1429,7 @@ class GeminiAnalyzer:
             self._init_openai_fallback()
             if self._openai_client:
                 try:
-                    return self._call_openai_api(prompt, generation_config)
+                    return self._call_openai_api(prompt, generation_config, stop_fields)
                 except Exception as openai_error:
                     logger.error(f"[OpenAI] 备选 API 也失败: {openai_error}")
                     raise last_error or openai_error
@@ -718,6 +1437,177 @@ class GeminiAnalyzer:
         # 所有方式都失败
         raise last_error or Exception("所有 AI API 调用失败，已达最大重试次数")
     
+    async def _call_api_with_retry_async(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """
+        _call_api_with_retry 的协程版本（Gemini generate_content_async / AsyncOpenAI）
+        
+        重试、备选模型切换与 OpenAI 兜底策略与同步版本一致，
+        退避和配额等待都用 asyncio.sleep，不阻塞事件循环。
+        """
+        if self._router is not None:
+            return await self._call_routed_async(prompt, generation_config, stop_fields)
+        
+        if self._use_openai:
+            return await self._call_openai_api_async(prompt, generation_config, stop_fields)
+        
+        config = get_config()
+        max_retries = config.gemini_max_retries
+        base_delay = config.gemini_retry_delay
+        
+        last_error = None
+        wait_hint = None
+        tried_fallback = getattr(self, '_using_fallback', False)
+        
+        for attempt in range(max_retries):
+            try:
+                if attempt > 0:
+                    delay = self._retry_delay(attempt, base_delay, wait_hint)
+                    logger.info(f"[Gemini] 第 {attempt + 1} 次重试，等待 {delay:.1f} 秒...")
+                    await asyncio.sleep(delay)
+                
+                return await self._gemini_once_async(self._current_model_name, prompt, generation_config, stop_fields)
+                    
+            except Exception as e:
+                last_error = e
+                switched, retry = self._handle_gemini_error(e, attempt, max_retries, tried_fallback)
+                # 刚切换到备选模型时，原模型的 Retry-After / 熔断时间不再适用
+                wait_hint = None if switched != tried_fallback else e
+                tried_fallback = switched
+                if not retry:
+                    break
+        
+        # Gemini 所有重试都失败，尝试 OpenAI 兼容 API（必要时懒加载初始化）
+        if not self._openai_client and config.openai_api_key and config.openai_base_url:
+            logger.warning("[Gemini] 所有重试失败，尝试初始化 OpenAI 兼容 API")
+            self._init_openai_fallback()
+        if self._openai_client:
+            logger.warning("[Gemini] 所有重试失败，切换到 OpenAI 兼容 API")
+            try:
+                return await self._call_openai_api_async(prompt, generation_config, stop_fields)
+            except Exception as openai_error:
+                logger.error(f"[OpenAI] 备选 API 也失败: {openai_error}")
+                raise last_error or openai_error
+        
+        raise last_error or Exception("所有 AI API 调用失败，已达最大重试次数")
+    
+    def _call_routed(self, prompt: str, generation_config: dict, stop_fields: Optional[Tuple[str, ...]] = None) -> str:
+        """
+        经 LLMRouter 调用：按延迟 / 错误率选择端点，失败立即换端点，超过 p95 时对冲
+        
+        每轮每个端点至多请求一次，整轮失败后按 gemini_retry_delay 退避（遵循 Retry-After），
+        最多 gemini_max_retries 轮，全部轮次受 llm_call_deadline_seconds 约束；
+        一轮中的错误全部不可重试（鉴权、参数错误、已熔断至运行结束等）时直接放弃。
+        """
+        config = get_config()
+        
+        def attempt(endpoint: str) -> str:
+            provider, model_name = endpoint.split(':', 1)
+            for _ in range(2):
+                try:
+                    if provider == 'openai':
+                        return self._openai_once(prompt, generation_config, stop_fields, model_name)
+                    return self._gemini_once(model_name, prompt, generation_config, stop_fields)
+                except Exception as e:
+                    # 结构化输出方式被拒绝时降级后立即重发一次
+                    if not self._downgrade_output_format(provider, e):
+                        raise
+            raise ValueError(f"{endpoint} 结构化输出降级后仍失败")
+        
+        return self._router.call(
+            attempt,
+            rounds=config.gemini_max_retries,
+            backoff=lambda n, errors: self._round_delay(n, errors),
+            retryable=self._is_retryable,
+        )
+    
+    async def _call_routed_async(
+        self,
+        prompt: str,
+        generation_config: dict,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """_call_routed 的协程版本（落败的对冲请求会被取消）"""
+        config = get_config()
+        
+        async def attempt(endpoint: str) -> str:
+            provider, model_name = endpoint.split(':', 1)
+            for _ in range(2):
+                try:
+                    if provider == 'openai':
+                        return await self._openai_once_async(prompt, generation_config, stop_fields, model_name)
+                    return await self._gemini_once_async(model_name, prompt, generation_config, stop_fields)
+                except Exception as e:
+                    # 结构化输出方式被拒绝时降级后立即重发一次
+                    if not self._downgrade_output_format(provider, e):
+                        raise
+            raise ValueError(f"{endpoint} 结构化输出降级后仍失败")
+        
+        return await self._router.call_async(
+            attempt,
+            rounds=config.gemini_max_retries,
+            backoff=lambda n, errors: self._round_delay(n, errors),
+            retryable=self._is_retryable,
+        )
+    
+    def _round_delay(self, round_index: int, errors: List[Exception]) -> float:
+        """
+        路由下一轮前的等待：指数退避；各端点的可重试错误都给出了等待时间
+        （Retry-After / 熔断剩余时间）时，至少等到最早可用的端点
+        """
+        delay = self._retry_delay(round_index, get_config().gemini_retry_delay)
+        hints = [self._suggested_wait(e) for e in errors if self._is_retryable(e)]
+        if hints and all(h is not None for h in hints):
+            return max(delay, min(hints))
+        return delay
+    
+    def _handle_gemini_error(
+        self,
+        error: Exception,
+        attempt: int,
+        max_retries: int,
+        tried_fallback: bool
+    ) -> Tuple[bool, bool]:
+        """
+        记录 Gemini 调用失败并决定是否继续重试
+        
+        - 限流且已重试过半、或当前模型不可用（模型不存在 / 已熔断）时切换备选模型
+        - 鉴权、参数错误、内容拦截等不可重试的错误直接停止，不再退避
+        
+        Returns:
+            (是否已切换过备选模型, 是否继续重试)
+        """
+        downgraded = self._downgrade_output_format('gemini', error)
+        error_str = str(error)
+        
+        if isinstance(error, CircuitOpenError):
+            logger.warning(f"[Gemini] {error_str}")
+            model_down, rate_limited = True, False
+        else:
+            info = classify_error(error)
+            model_down = info.reason == 'not_found'
+            rate_limited = info.reason == 'rate_limit'
+            if rate_limited:
+                logger.warning(f"[Gemini] API 限流 (429)，第 {attempt + 1}/{max_retries} 次尝试 ({info}): {error_str[:100]}")
+            else:
+                logger.warning(f"[Gemini] API 调用失败，第 {attempt + 1}/{max_retries} 次尝试 ({info}): {error_str[:100]}")
+        
+        # 限流重试过半、或当前模型不可用时，切换备选模型继续重试
+        if not tried_fallback and (model_down or (rate_limited and attempt >= max_retries // 2)):
+            if self._switch_to_fallback_model():
+                logger.info("[Gemini] 已切换到备选模型，继续重试")
+                return True, True
+            logger.warning("[Gemini] 切换备选模型失败，继续使用当前模型重试")
+        
+        retry = downgraded or self._is_retryable(error)
+        if not retry:
+            logger.warning("[Gemini] 错误不可重试，停止重试")
+        return tried_fallback, retry
+    
     def analyze(
         self, 
         context: Dict[str, Any],
@@ -740,13 +1630,262 @@ class GeminiAnalyzer:
             AnalysisResult 对象
         """
         code = context.get('code', 'Unknown')
-        config = get_config()
+        name = self._resolve_name(context)
+        
+        # 如果模型不可用，返回默认结果
+        if not self.is_available():
+            return self._unavailable_result(code, name)
+        
+        with self._usage.track() as usage:
+            try:
+                prompt, generation_config, model_name = self._prepare_single(context, code, name, news_context)
+                response_text = self._generate(prompt, generation_config, model_name, self._stop_fields())
+                repair = self._repair_request(response_text)
+                if repair:
+                    try:
+                        repaired = self._generate(repair[0], generation_config, model_name, self._stop_fields())
+                    except Exception as e:
+                        logger.warning(f"[结构化输出] 修复请求失败，使用原响应: {e}")
+                        repaired = None
+                    response_text = self._pick_repaired(response_text, repair[1], repaired)
+                result = self._finish_single(response_text, code, name, news_context)
+            except Exception as e:
+                result = self._error_result(code, name, e)
+        result.llm_usage = usage
+        return result
+    
+    async def analyze_async(
+        self,
+        context: Dict[str, Any],
+        news_context: Optional[str] = None
+    ) -> AnalysisResult:
+        """
+        分析单只股票（协程版本）
+        
+        与 analyze 使用相同的 prompt、缓存与解析逻辑，网络请求走
+        AsyncOpenAI / Gemini 异步接口，单个事件循环内可同时发起数十个分析，
+        等待响应期间不占用线程。
+        
+        Args:
+            context: 从 storage.get_analysis_context() 获取的上下文数据
+            news_context: 预先搜索的新闻内容（可选）
+            
+        Returns:
+            AnalysisResult 对象
+        """
+        code = context.get('code', 'Unknown')
+        name = self._resolve_name(context)
         
-        # 请求前增加延时（防止连续请求触发限流）
-        request_delay = config.gemini_request_delay
-        if request_delay > 0:
-            logger.debug(f"[LLM] 请求前等待 {request_delay:.1f} 秒...")
-            time.sleep(request_delay)
+        if not self.is_available():
+            return self._unavailable_result(code, name)
+        
+        with self._usage.track() as usage:
+            try:
+                prompt, generation_config, model_name = self._prepare_single(context, code, name, news_context)
+                response_text = await self._generate_async(prompt, generation_config, model_name, self._stop_fields())
+                repair = self._repair_request(response_text)
+                if repair:
+                    try:
+                        repaired = await self._generate_async(repair[0], generation_config, model_name, self._stop_fields())
+                    except Exception as e:
+                        logger.warning(f"[结构化输出] 修复请求失败，使用原响应: {e}")
+                        repaired = None
+                    response_text = self._pick_repaired(response_text, repair[1], repaired)
+                result = self._finish_single(response_text, code, name, news_context)
+            except Exception as e:
+                result = self._error_result(code, name, e)
+        result.llm_usage = usage
+        return result
+    
+    def _stop_fields(self) -> Optional[Tuple[str, ...]]:
+        """单只分析的流式中断字段（LLM_STREAM_ENABLED=false 时为普通请求）"""
+        return self.REPORT_FIELDS if get_config().llm_stream_enabled else None
+    
+    def _prepare_single(
+        self,
+        context: Dict[str, Any],
+        code: str,
+        name: str,
+        news_context: Optional[str]
+    ) -> Tuple[str, dict, str]:
+        """构建单只股票的请求：(prompt, 生成配置, 模型名)"""
+        # 格式化输入（包含技术面数据和新闻）
+        prompt = self._format_prompt(context, name, news_context)
+        model_name = self._model_name()
+        
+        logger.info(f"========== AI 分析 {name}({code}) ==========")
+        logger.info(f"[LLM配置] 模型: {model_name}")
+        logger.info(f"[LLM配置] Prompt 长度: {len(prompt)} 字符, 约 {count_tokens(prompt)} tokens")
+        logger.info(f"[LLM配置] 是否包含新闻: {'是' if news_context else '否'}")
+        
+        # 记录完整 prompt 到日志（INFO级别记录摘要，DEBUG记录完整）
+        prompt_preview = prompt[:500] + "..." if len(prompt) > 500 else prompt
+        logger.info(f"[LLM Prompt 预览]\n{prompt_preview}")
+        logger.debug(f"=== 完整 Prompt ({len(prompt)}字符) ===\n{prompt}\n=== End Prompt ===")
+        
+        # 设置生成配置
+        generation_config = {
+            "temperature": 0.7,
+            "max_output_tokens": 8192,
+            **self._structured_output_config(),
+        }
+        return prompt, generation_config, model_name
+    
+    def _structured_output_config(self) -> Dict[str, Any]:
+        """结构化输出配置（Gemini 原生键名，OpenAI 路径在 _openai_request 中转换）"""
+        mode = get_config().llm_structured_output
+        if mode == 'off':
+            return {}
+        config = {"response_mime_type": "application/json"}
+        if mode == 'schema':
+            config["response_schema"] = self.ANALYSIS_SCHEMA
+        return config
+    
+    def _validation_errors(self, response_text: str) -> List[str]:
+        """按 ANALYSIS_SCHEMA 校验响应，返回错误列表"""
+        try:
+            data = self._extract_json(response_text)
+        except ValueError as e:
+            return [f"JSON 无法解析: {str(e)[:100]}"]
+        return validate(data, self.ANALYSIS_SCHEMA)
+    
+    def _repair_request(self, response_text: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        校验不通过时构建定向修复请求：只附上次输出与错误清单，不重发行情和新闻数据
+        
+        Returns:
+            (修复提示词, 错误列表)，校验通过时返回 None
+        """
+        errors = self._validation_errors(response_text)
+        if not errors:
+            return None
+        logger.warning(f"[结构化输出] 响应校验未通过，定向修复一次: {'; '.join(errors[:5])}")
+        problems = "\n".join(f"- {e}" for e in errors[:20])
+        prompt = f"""# 决策仪表盘 JSON 修复
+
+你上一次输出的决策仪表盘 JSON 未通过校验，问题如下：
+{problems}
+
+请只修正上述问题，其余内容保持不变，输出一个完整、合法的 JSON 对象（不要输出 JSON 以外的任何内容）。
+取值要求：sentiment_score 为 0-100 整数；trend_prediction 为 {'/'.join(TREND_PREDICTIONS)}；
+operation_advice 为 {'/'.join(OPERATION_ADVICES)}；confidence_level 为 {'/'.join(CONFIDENCE_LEVELS)}。
+
+上一次的输出：
+```json
+{response_text}
+```"""
+        return prompt, errors
+    
+    def _pick_repaired(self, response_text: str, errors: List[str], repaired: Optional[str]) -> str:
+        """修复结果问题更少时采用，否则保留原响应（交给宽松解析）"""
+        if repaired is None:
+            return response_text
+        remaining = self._validation_errors(repaired)
+        if not remaining:
+            logger.info("[结构化输出] 修复成功")
+            return repaired
+        logger.warning(f"[结构化输出] 修复后仍有 {len(remaining)} 个问题: {'; '.join(remaining[:3])}")
+        return repaired if len(remaining) < len(errors) else response_text
+    
+    def _finish_single(
+        self,
+        response_text: str,
+        code: str,
+        name: str,
+        news_context: Optional[str]
+    ) -> AnalysisResult:
+        """记录响应并解析为 AnalysisResult"""
+        # 记录响应预览（INFO级别）和完整响应（DEBUG级别）
+        response_preview = response_text[:300] + "..." if len(response_text) > 300 else response_text
+        logger.info(f"[LLM返回 预览]\n{response_preview}")
+        logger.debug(f"=== Gemini 完整响应 ({len(response_text)}字符) ===\n{response_text}\n=== End Response ===")
+        
+        # 解析响应
+        result = self._parse_response(response_text, code, name)
+        result.raw_response = response_text
+        result.search_performed = bool(news_context)
+        
+        logger.info(f"[LLM解析] {name}({code}) 分析完成: {result.trend_prediction}, 评分 {result.sentiment_score}")
+        return result
+    
+    @staticmethod
+    def _error_result(code: str, name: str, error: Exception) -> AnalysisResult:
+        """分析失败时的默认结果"""
+        logger.error(f"AI 分析 {name}({code}) 失败: {error}")
+        return AnalysisResult(
+            code=code,
+            name=name,
+            sentiment_score=50,
+            trend_prediction='震荡',
+            operation_advice='持有',
+            confidence_level='低',
+            analysis_summary=f'分析过程出错: {str(error)[:100]}',
+            risk_warning='分析失败，请稍后重试或手动分析',
+            success=False,
+            error_message=str(error),
+        )
+    
+    def analyze_packed(
+        self,
+        contexts: List[Dict[str, Any]],
+        news_contexts: Optional[List[Optional[str]]] = None
+    ) -> List[AnalysisResult]:
+        """
+        把多只股票打包进一次请求分析（批量模式）
+        
+        SYSTEM_PROMPT 与分析任务说明只发送一次，要求模型输出以 code 区分的 JSON 数组，
+        再逐项交给 _parse_response 还原为 AnalysisResult。
+        数组中缺失、无法解析的股票（或整批请求失败时的全部股票）逐只调用 analyze 重试。
+        
+        Args:
+            contexts: 上下文数据列表
+            news_contexts: 与 contexts 一一对应的新闻内容（可选）
+            
+        Returns:
+            AnalysisResult 列表，顺序与 contexts 一致
+        """
+        news_contexts = news_contexts or [None] * len(contexts)
+        if len(contexts) <= 1 or not self.is_available():
+            return [self.analyze(c, n) for c, n in zip(contexts, news_contexts)]
+        
+        codes = [c.get('code', 'Unknown') for c in contexts]
+        names = [self._resolve_name(c) for c in contexts]
+        parsed: Dict[str, AnalysisResult] = {}
+        with self._usage.track() as packed_usage:
+            try:
+                prompt = self._format_packed_prompt(contexts, names, news_contexts)
+                model_name = self._model_name()
+                logger.info(f"========== AI 批量分析 {len(contexts)} 只: {', '.join(codes)} ==========")
+                logger.info(f"[LLM配置] 模型: {model_name}, Prompt 长度: {len(prompt)} 字符, 约 {count_tokens(prompt)} tokens")
+                
+                generation_config = {
+                    "temperature": 0.7,
+                    "max_output_tokens": min(self.PACKED_OUTPUT_TOKENS * len(contexts), self.PACKED_MAX_OUTPUT_TOKENS),
+                }
+                response_text = self._generate(prompt, generation_config, model_name)
+                parsed = self._parse_packed_response(response_text, dict(zip(codes, names)))
+            except Exception as e:
+                logger.error(f"AI 批量分析失败，逐只重试: {e}")
+        
+        results = []
+        for context, news_context, code in zip(contexts, news_contexts, codes):
+            result = parsed.get(code)
+            if result is None:
+                logger.warning(f"[LLM批量] {code} 未包含在批量响应中，单独重试")
+                result = self.analyze(context, news_context)
+            else:
+                result.search_performed = bool(news_context)
+            # 批量请求的用量平均分摊到每只股票，单独重试的用量另计
+            usage = packed_usage.share(len(contexts))
+            if result.llm_usage is not None:
+                usage.merge(result.llm_usage)
+            result.llm_usage = usage
+            results.append(result)
+        return results
+    
+    def _resolve_name(self, context: Dict[str, Any]) -> str:
+        """股票名称：上下文 > 实时行情 > 映射表"""
+        code = context.get('code', 'Unknown')
         
         # 优先从上下文获取股票名称（由 main.py 传入）
         name = context.get('stock_name')
@@ -757,87 +1896,115 @@ class GeminiAnalyzer:
             else:
                 # 最后从映射表获取
                 name = STOCK_NAME_MAP.get(code, f'股票{code}')
+        return name
+    
+    def _model_name(self) -> str:
+        """当前使用的模型名称"""
+        model_name = getattr(self, '_current_model_name', None)
+        if not model_name:
+            model_name = getattr(self._model, '_model_name', 'unknown')
+            if hasattr(self._model, 'model_name'):
+                model_name = self._model.model_name
+        return model_name
+    
+    @staticmethod
+    def _unavailable_result(code: str, name: str) -> AnalysisResult:
+        return AnalysisResult(
+            code=code,
+            name=name,
+            sentiment_score=50,
+            trend_prediction='震荡',
+            operation_advice='持有',
+            confidence_level='低',
+            analysis_summary='AI 分析功能未启用（未配置 API Key）',
+            risk_warning='请配置 Gemini API Key 后重试',
+            success=False,
+            error_message='Gemini API Key 未配置',
+        )
+    
+    def _generate(
+        self,
+        prompt: str,
+        generation_config: dict,
+        model_name: str,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """调用大模型（相同请求命中缓存时跳过调用；stop_fields 见 _call_api_with_retry）"""
+        cache_key, response_text = self._cache_lookup(prompt, generation_config, model_name)
+        if response_text is not None:
+            return response_text
         
-        # 如果模型不可用，返回默认结果
-        if not self.is_available():
-            return AnalysisResult(
-                code=code,
-                name=name,
-                sentiment_score=50,
-                trend_prediction='震荡',
-                operation_advice='持有',
-                confidence_level='低',
-                analysis_summary='AI 分析功能未启用（未配置 API Key）',
-                risk_warning='请配置 Gemini API Key 后重试',
-                success=False,
-                error_message='Gemini API Key 未配置',
-            )
+        # 限流由 _call_api_with_retry 内的 RPM/TPM 配额控制，不再固定等待
+        logger.info(f"[LLM调用] 开始调用 Gemini API (temperature={generation_config['temperature']}, max_tokens={generation_config['max_output_tokens']})...")
         
-        try:
-            # 格式化输入（包含技术面数据和新闻）
-            prompt = self._format_prompt(context, name, news_context)
-            
-            # 获取模型名称
-            model_name = getattr(self, '_current_model_name', None)
-            if not model_name:
-                model_name = getattr(self._model, '_model_name', 'unknown')
-                if hasattr(self._model, 'model_name'):
-                    model_name = self._model.model_name
-            
-            logger.info(f"========== AI 分析 {name}({code}) ==========")
-            logger.info(f"[LLM配置] 模型: {model_name}")
-            logger.info(f"[LLM配置] Prompt 长度: {len(prompt)} 字符")
-            logger.info(f"[LLM配置] 是否包含新闻: {'是' if news_context else '否'}")
-            
-            # 记录完整 prompt 到日志（INFO级别记录摘要，DEBUG记录完整）
-            prompt_preview = prompt[:500] + "..." if len(prompt) > 500 else prompt
-            logger.info(f"[LLM Prompt 预览]\n{prompt_preview}")
-            logger.debug(f"=== 完整 Prompt ({len(prompt)}字符) ===\n{prompt}\n=== End Prompt ===")
-            
-            # 设置生成配置
-            generation_config = {
-                "temperature": 0.7,
-                "max_output_tokens": 8192,
-            }
-            
-            logger.info(f"[LLM调用] 开始调用 Gemini API (temperature={generation_config['temperature']}, max_tokens={generation_config['max_output_tokens']})...")
-            
-            # 使用带重试的 API 调用
-            start_time = time.time()
-            response_text = self._call_api_with_retry(prompt, generation_config)
-            elapsed = time.time() - start_time
-            
-            # 记录响应信息
-            logger.info(f"[LLM返回] Gemini API 响应成功, 耗时 {elapsed:.2f}s, 响应长度 {len(response_text)} 字符")
-            
-            # 记录响应预览（INFO级别）和完整响应（DEBUG级别）
-            response_preview = response_text[:300] + "..." if len(response_text) > 300 else response_text
-            logger.info(f"[LLM返回 预览]\n{response_preview}")
-            logger.debug(f"=== Gemini 完整响应 ({len(response_text)}字符) ===\n{response_text}\n=== End Response ===")
-            
-            # 解析响应
-            result = self._parse_response(response_text, code, name)
-            result.raw_response = response_text
-            result.search_performed = bool(news_context)
-            
-            logger.info(f"[LLM解析] {name}({code}) 分析完成: {result.trend_prediction}, 评分 {result.sentiment_score}")
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"AI 分析 {name}({code}) 失败: {e}")
-            return AnalysisResult(
-                code=code,
-                name=name,
-                sentiment_score=50,
-                trend_prediction='震荡',
-                operation_advice='持有',
-                confidence_level='低',
-                analysis_summary=f'分析过程出错: {str(e)[:100]}',
-                risk_warning='分析失败，请稍后重试或手动分析',
-                success=False,
-                error_message=str(e),
-            )
+        # 使用带重试的 API 调用
+        start_time = time.time()
+        response_text = self._call_api_with_retry(prompt, generation_config, stop_fields)
+        elapsed = time.time() - start_time
+        
+        # 记录响应信息
+        logger.info(f"[LLM返回] Gemini API 响应成功, 耗时 {elapsed:.2f}s, 响应长度 {len(response_text)} 字符")
+        
+        self._cache_store(cache_key, response_text, model_name)
+        return response_text
+    
+    async def _generate_async(
+        self,
+        prompt: str,
+        generation_config: dict,
+        model_name: str,
+        stop_fields: Optional[Tuple[str, ...]] = None
+    ) -> str:
+        """_generate 的协程版本"""
+        cache_key, response_text = self._cache_lookup(prompt, generation_config, model_name)
+        if response_text is not None:
+            return response_text
+        
+        logger.info(f"[LLM调用] 开始异步调用 Gemini API (temperature={generation_config['temperature']}, max_tokens={generation_config['max_output_tokens']})...")
+        
+        start_time = time.time()
+        response_text = await self._call_api_with_retry_async(prompt, generation_config, stop_fields)
+        elapsed = time.time() - start_time
+        
+        logger.info(f"[LLM返回] Gemini API 响应成功, 耗时 {elapsed:.2f}s, 响应长度 {len(response_text)} 字符")
+        
+        self._cache_store(cache_key, response_text, model_name)
+        return response_text
+    
+    def _cache_lookup(self, prompt: str, generation_config: dict, model_name: str) -> Tuple[Optional[str], Optional[str]]:
+        """查询响应缓存：(缓存键, 命中的响应文本)，未启用缓存时键为 None"""
+        if self._response_cache is None:
+            return None, None
+        cache_key = self._response_cache.make_key(model_name, generation_config, prompt, self.SYSTEM_PROMPT)
+        response_text = self._response_cache.get(cache_key)
+        if response_text is not None:
+            logger.info(f"[LLM缓存] 命中 {cache_key[:12]}，跳过 API 调用, 响应长度 {len(response_text)} 字符")
+            with self._usage_lock:
+                self._cached_calls += 1
+        return cache_key, response_text
+    
+    def close(self) -> None:
+        """运行结束时释放服务商侧资源（删除本次创建的 Gemini 前缀缓存，避免按存储时长计费到 TTL 到期）"""
+        if self._gemini_prefix is not None:
+            self._gemini_prefix.close()
+    
+    def token_summary(self) -> str:
+        """本次运行的用量统计（实际请求的 tokens、耗时、费用，以及响应缓存、前缀缓存与路由）"""
+        with self._usage_lock:
+            cached = self._cached_calls
+        total = self._usage.snapshot()
+        if not total.calls:
+            return f"未发起 LLM 调用（缓存命中 {cached} 次）"
+        return (f"LLM {self._usage.summary()}；缓存命中 {cached} 次，"
+                f"每次平均输入 {total.prompt_tokens // total.calls} / 输出 {total.completion_tokens // total.calls} tokens，"
+                f"最大输入 {total.max_prompt_tokens} tokens；"
+                f"{self._prefix_stats.summary()}"
+                f"{f'；{self._router.summary()}' if self._router is not None else ''}")
+    
+    def _cache_store(self, cache_key: Optional[str], response_text: str, model_name: str) -> None:
+        # 只缓存包含 JSON 的响应，异常输出在重跑时重新请求
+        if cache_key and '{' in response_text and '}' in response_text:
+            self._response_cache.set(cache_key, response_text, model=model_name)
     
     def _format_prompt(
         self, 
@@ -856,18 +2023,48 @@ class GeminiAnalyzer:
             news_context: 预先搜索的新闻内容
         """
         code = context.get('code', 'Unknown')
+        stock_name = self._prompt_stock_name(context, name)
         
-        # 优先使用上下文中的股票名称（从 realtime_quote 获取）
+        # ========== 构建决策仪表盘格式的输入 ==========
+        prompt = "# 决策仪表盘分析请求\n\n" + self._format_stock_data(context, stock_name, news_context)
+        prompt += f"""
+---
+
+## ✅ 分析任务
+
+请为 **{stock_name}({code})** 生成【决策仪表盘】，严格按照 JSON 格式输出。
+{self.ANALYSIS_REQUIREMENTS}
+请输出完整的 JSON 格式决策仪表盘。"""
+        
+        return prompt
+    
+    @staticmethod
+    def _prompt_stock_name(context: Dict[str, Any], name: str) -> str:
+        """优先使用上下文中的股票名称（从 realtime_quote 获取）"""
+        code = context.get('code', 'Unknown')
         stock_name = context.get('stock_name', name)
         if not stock_name or stock_name == f'股票{code}':
             stock_name = STOCK_NAME_MAP.get(code, f'股票{code}')
-            
+        return stock_name
+    
+    def _format_stock_data(
+        self,
+        context: Dict[str, Any],
+        stock_name: str,
+        news_context: Optional[str] = None
+    ) -> str:
+        """
+        单只股票的数据部分（基础信息、技术面、筹码、趋势、关键价位、舆情），不含分析任务
+        
+        各部分按优先级组成段落，超出 LLM_PROMPT_TOKEN_BUDGET 时从价值最低的段落开始裁剪：
+        量价变化（与今日行情重复）→ 新闻（先删序号靠后、日期较早的条目）→ 筹码 → 关键价位 → 实时行情 → 趋势分析。
+        新闻另受 LLM_NEWS_TOKEN_BUDGET 限制。
+        """
+        config = get_config()
+        code = context.get('code', 'Unknown')
         today = context.get('today', {})
         
-        # ========== 构建决策仪表盘格式的输入 ==========
-        prompt = f"""# 决策仪表盘分析请求
-
-## 📊 股票基础信息
+        core = f"""## 📊 股票基础信息
 | 项目 | 数据 |
 |------|------|
 | 股票代码 | **{code}** |
@@ -897,11 +2094,12 @@ class GeminiAnalyzer:
 | MA20 | {today.get('ma20', 'N/A')} | 中期趋势线 |
 | 均线形态 | {context.get('ma_status', '未知')} | 多头/空头/缠绕 |
 """
+        sections = [PromptSection('基础信息与行情', core)]
         
         # 添加实时行情数据（量比、换手率等）
         if 'realtime' in context:
             rt = context['realtime']
-            prompt += f"""
+            sections.append(PromptSection('实时行情', f"""
 ### 实时行情增强数据
 | 指标 | 数值 | 解读 |
 |------|------|------|
@@ -913,13 +2111,13 @@ class GeminiAnalyzer:
 | 总市值 | {self._format_amount(rt.get('total_mv'))} | |
 | 流通市值 | {self._format_amount(rt.get('circ_mv'))} | |
 | 60日涨跌幅 | {rt.get('change_60d', 'N/A')}% | 中期表现 |
-"""
+""", priority=4))
         
         # 添加筹码分布数据
         if 'chip' in context:
             chip = context['chip']
             profit_ratio = chip.get('profit_ratio', 0)
-            prompt += f"""
+            sections.append(PromptSection('筹码分布', f"""
 ### 筹码分布数据（效率指标）
 | 指标 | 数值 | 健康标准 |
 |------|------|----------|
@@ -928,13 +2126,13 @@ class GeminiAnalyzer:
 | 90%筹码集中度 | {chip.get('concentration_90', 0):.2%} | <15%为集中 |
 | 70%筹码集中度 | {chip.get('concentration_70', 0):.2%} | |
 | 筹码状态 | {chip.get('chip_status', '未知')} | |
-"""
+""", priority=2))
         
         # 添加趋势分析结果（基于交易理念的预判）
         if 'trend_analysis' in context:
             trend = context['trend_analysis']
             bias_warning = "🚨 超过5%，严禁追高！" if trend.get('bias_ma5', 0) > 5 else "✅ 安全范围"
-            prompt += f"""
+            sections.append(PromptSection('趋势分析', f"""
 ### 趋势分析预判（基于交易理念）
 | 指标 | 数值 | 判定 |
 |------|------|------|
@@ -946,6 +2144,7 @@ class GeminiAnalyzer:
 | 量能状态 | {trend.get('volume_status', '未知')} | {trend.get('volume_trend', '')} |
 | 系统信号 | {trend.get('buy_signal', '未知')} | |
 | 系统评分 | {trend.get('signal_score', 0)}/100 | |
+| 信号变化 | {trend.get('signal_transition') or '未知'} | |
 
 #### 系统分析理由
 **买入理由**：
@@ -953,63 +2152,106 @@ class GeminiAnalyzer:
 
 **风险因素**：
 {chr(10).join('- ' + r for r in trend.get('risk_factors', ['无'])) if trend.get('risk_factors') else '- 无'}
-"""
-        
+""", priority=5))
+
+        # 添加关键价位（长周期波段高低点 + 成交密集区）
+        levels = context.get('key_levels')
+        if levels and (levels.get('supports') or levels.get('resistances')):
+            rows = [
+                f"| {kind} | {l['price']:.2f} | {'N/A' if l['distance_pct'] is None else format(l['distance_pct'], '+.2f') + '%'} | {l['strength']:.1f} | "
+                f"{l['sources']}{'，' + str(l['touches']) + '次触及' if l['touches'] else ''} |"
+                for kind, items in (('压力', levels.get('resistances', [])[::-1]), ('支撑', levels.get('supports', [])))
+                for l in items
+            ]
+            sections.append(PromptSection('关键价位', f"""
+### 关键价位（近 {levels.get('bars', 0)} 个交易日的波段高低点与成交密集区）
+| 类型 | 价位 | 距现价 | 强度 | 依据 |
+|------|------|--------|------|------|
+{chr(10).join(rows)}
+
+> 狙击点位请以上述价位为锚：买入价参考最近支撑，止损价设在支撑下方，目标价参考最近压力。
+""", priority=3))
+
         # 添加昨日对比数据
         if 'yesterday' in context:
             volume_change = context.get('volume_change_ratio', 'N/A')
-            prompt += f"""
+            sections.append(PromptSection('量价变化', f"""
 ### 量价变化
 - 成交量较昨日变化：{volume_change}倍
 - 价格较昨日变化：{context.get('price_change_ratio', 'N/A')}%
-"""
+""", priority=0))
         
         # 添加新闻搜索结果（重点区域）
-        prompt += """
+        if news_context and config.llm_news_token_budget > 0:
+            news_context = trim_news(news_context, config.llm_news_token_budget)
+        
+        def render_news(news: Optional[str]) -> str:
+            section = """
 ---
 
 ## 📰 舆情情报
 """
-        if news_context:
-            prompt += f"""
+            if news:
+                section += f"""
 以下是 **{stock_name}({code})** 近7日的新闻搜索结果，请重点提取：
 1. 🚨 **风险警报**：减持、处罚、利空
 2. 🎯 **利好催化**：业绩、合同、政策
 3. 📊 **业绩预期**：年报预告、业绩快报
 
 ```
-{news_context}
+{news}
 ```
 """
-        else:
-            prompt += """
+            else:
+                section += """
 未搜索到该股票近期的相关新闻。请主要依据技术面数据进行分析。
 """
+            return section
         
-        # 明确的输出要求
-        prompt += f"""
----
+        if news_context:
+            overhead = count_tokens(render_news('…'))
+            sections.append(PromptSection(
+                '舆情情报', render_news(news_context), priority=1,
+                shrink=lambda max_tokens: render_news(trim_news(news_context, max(max_tokens - overhead, 0))),
+                min_tokens=self.NEWS_MIN_TOKENS,
+            ))
+        else:
+            sections.append(PromptSection('舆情情报', render_news(None)))
+        
+        prompt, trimmed = assemble_prompt(sections, config.llm_prompt_token_budget)
+        if trimmed:
+            logger.info(f"[Prompt预算] {code} 超出 {config.llm_prompt_token_budget} tokens，已裁剪: {', '.join(trimmed)}")
+        return prompt
+    
+    def _format_packed_prompt(
+        self,
+        contexts: List[Dict[str, Any]],
+        names: List[str],
+        news_contexts: List[Optional[str]]
+    ) -> str:
+        """批量模式提示词：分析任务说明只出现一次，各股票数据依次列出"""
+        stocks = []
+        for i, (context, name, news_context) in enumerate(zip(contexts, names, news_contexts), 1):
+            code = context.get('code', 'Unknown')
+            stock_name = self._prompt_stock_name(context, name)
+            stocks.append(f"# 股票 {i}/{len(contexts)}：{stock_name}({code})\n\n"
+                          + self._format_stock_data(context, stock_name, news_context))
+        
+        codes = [c.get('code', 'Unknown') for c in contexts]
+        example = ", ".join(f'{{"code": "{code}", ...}}' for code in codes[:2])
+        return f"""# 批量决策仪表盘分析请求
 
-## ✅ 分析任务
+本次共 {len(contexts)} 只股票：{', '.join(codes)}。请逐只独立分析（不得混用其他股票的数据与新闻），
+按系统提示中的决策仪表盘 JSON 格式为每只股票生成一个对象，并在对象中增加 "code" 字段（股票代码）。
 
-请为 **{stock_name}({code})** 生成【决策仪表盘】，严格按照 JSON 格式输出。
+**输出格式**：只输出一个 JSON 数组，按上面的顺序每只股票一个元素，例如 `[{example}]`。
 
-### 重点关注（必须明确回答）：
-1. ❓ 是否满足 MA5>MA10>MA20 多头排列？
-2. ❓ 当前乖离率是否在安全范围内（<5%）？—— 超过5%必须标注"严禁追高"
-3. ❓ 量能是否配合（缩量回调/放量突破）？
-4. ❓ 筹码结构是否健康？
-5. ❓ 消息面有无重大利空？（减持、处罚、业绩变脸等）
+## ✅ 分析任务（适用于每只股票）
+{self.ANALYSIS_REQUIREMENTS}
 
-### 决策仪表盘要求：
-- **核心结论**：一句话说清该买/该卖/该等
-- **持仓分类建议**：空仓者怎么做 vs 持仓者怎么做
-- **具体狙击点位**：买入价、止损价、目标价（精确到分）
-- **检查清单**：每项用 ✅/⚠️/❌ 标记
+---
 
-请输出完整的 JSON 格式决策仪表盘。"""
-        
-        return prompt
+""" + "\n\n---\n\n".join(stocks)
     
     def _format_volume(self, volume: Optional[float]) -> str:
         """格式化成交量显示"""
@@ -1046,91 +2288,108 @@ class GeminiAnalyzer:
         如果解析失败，尝试智能提取或返回默认结果
         """
         try:
-            # 清理响应文本：移除 markdown 代码块标记
-            cleaned_text = response_text
-            if '```json' in cleaned_text:
-                cleaned_text = cleaned_text.replace('```json', '').replace('```', '')
-            elif '```' in cleaned_text:
-                cleaned_text = cleaned_text.replace('```', '')
-            
-            # 尝试找到 JSON 内容
-            json_start = cleaned_text.find('{')
-            json_end = cleaned_text.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = cleaned_text[json_start:json_end]
-                
-                # 尝试修复常见的 JSON 问题
-                json_str = self._fix_json_string(json_str)
-                
-                data = json.loads(json_str)
-                
-                # 提取 dashboard 数据
-                dashboard = data.get('dashboard', None)
-                
-                # 解析所有字段，使用默认值防止缺失
-                return AnalysisResult(
-                    code=code,
-                    name=name,
-                    # 核心指标
-                    sentiment_score=int(data.get('sentiment_score', 50)),
-                    trend_prediction=data.get('trend_prediction', '震荡'),
-                    operation_advice=data.get('operation_advice', '持有'),
-                    confidence_level=data.get('confidence_level', '中'),
-                    # 决策仪表盘
-                    dashboard=dashboard,
-                    # 走势分析
-                    trend_analysis=data.get('trend_analysis', ''),
-                    short_term_outlook=data.get('short_term_outlook', ''),
-                    medium_term_outlook=data.get('medium_term_outlook', ''),
-                    # 技术面
-                    technical_analysis=data.get('technical_analysis', ''),
-                    ma_analysis=data.get('ma_analysis', ''),
-                    volume_analysis=data.get('volume_analysis', ''),
-                    pattern_analysis=data.get('pattern_analysis', ''),
-                    # 基本面
-                    fundamental_analysis=data.get('fundamental_analysis', ''),
-                    sector_position=data.get('sector_position', ''),
-                    company_highlights=data.get('company_highlights', ''),
-                    # 情绪面/消息面
-                    news_summary=data.get('news_summary', ''),
-                    market_sentiment=data.get('market_sentiment', ''),
-                    hot_topics=data.get('hot_topics', ''),
-                    # 综合
-                    analysis_summary=data.get('analysis_summary', '分析完成'),
-                    key_points=data.get('key_points', ''),
-                    risk_warning=data.get('risk_warning', ''),
-                    buy_reason=data.get('buy_reason', ''),
-                    # 元数据
-                    search_performed=data.get('search_performed', False),
-                    data_sources=data.get('data_sources', '技术面数据'),
-                    success=True,
-                )
-            else:
-                # 没有找到 JSON，尝试从纯文本中提取信息
-                logger.warning(f"无法从响应中提取 JSON，使用原始文本分析")
-                return self._parse_text_response(response_text, code, name)
-                
+            data = self._extract_json(response_text)
         except json.JSONDecodeError as e:
             logger.warning(f"JSON 解析失败: {e}，尝试从文本提取")
             return self._parse_text_response(response_text, code, name)
-    
-    def _fix_json_string(self, json_str: str) -> str:
-        """修复常见的 JSON 格式问题"""
-        import re
+        except ValueError:
+            # 没有找到 JSON，尝试从纯文本中提取信息
+            logger.warning(f"无法从响应中提取 JSON，使用原始文本分析")
+            return self._parse_text_response(response_text, code, name)
         
-        # 移除注释
-        json_str = re.sub(r'//.*?\n', '\n', json_str)
-        json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
+        # 提取 dashboard 数据
+        dashboard = data.get('dashboard', None)
         
-        # 修复尾随逗号
-        json_str = re.sub(r',\s*}', '}', json_str)
-        json_str = re.sub(r',\s*]', ']', json_str)
+        # 解析所有字段，使用默认值防止缺失
+        return AnalysisResult(
+            code=code,
+            name=name,
+            # 核心指标
+            sentiment_score=int(data.get('sentiment_score', 50)),
+            trend_prediction=data.get('trend_prediction', '震荡'),
+            operation_advice=data.get('operation_advice', '持有'),
+            confidence_level=data.get('confidence_level', '中'),
+            # 决策仪表盘
+            dashboard=dashboard,
+            # 走势分析
+            trend_analysis=data.get('trend_analysis', ''),
+            short_term_outlook=data.get('short_term_outlook', ''),
+            medium_term_outlook=data.get('medium_term_outlook', ''),
+            # 技术面
+            technical_analysis=data.get('technical_analysis', ''),
+            ma_analysis=data.get('ma_analysis', ''),
+            volume_analysis=data.get('volume_analysis', ''),
+            pattern_analysis=data.get('pattern_analysis', ''),
+            # 基本面
+            fundamental_analysis=data.get('fundamental_analysis', ''),
+            sector_position=data.get('sector_position', ''),
+            company_highlights=data.get('company_highlights', ''),
+            # 情绪面/消息面
+            news_summary=data.get('news_summary', ''),
+            market_sentiment=data.get('market_sentiment', ''),
+            hot_topics=data.get('hot_topics', ''),
+            # 综合
+            analysis_summary=data.get('analysis_summary', '分析完成'),
+            key_points=data.get('key_points', ''),
+            risk_warning=data.get('risk_warning', ''),
+            buy_reason=data.get('buy_reason', ''),
+            # 元数据
+            search_performed=data.get('search_performed', False),
+            data_sources=data.get('data_sources', '技术面数据'),
+            success=True,
+        )
+    
+    def _extract_json(self, response_text: str) -> Dict[str, Any]:
+        """
+        从响应中取出 JSON 对象（容错：前后说明文字、注释、尾随逗号、Python 字面量、截断的结尾）
         
-        # 确保布尔值是小写
-        json_str = json_str.replace('True', 'true').replace('False', 'false')
+        Raises:
+            json.JSONDecodeError: JSON 格式错误
+            ValueError: 响应中没有 JSON 对象
+        """
+        data = extract_json(response_text, start='{')
+        if not isinstance(data, dict):
+            raise ValueError("JSON 顶层不是对象")
+        return data
+    
+    def _parse_packed_response(self, response_text: str, names: Dict[str, str]) -> Dict[str, AnalysisResult]:
+        """
+        解析批量模式的 JSON 数组
         
-        return json_str
+        Args:
+            response_text: 模型原始响应
+            names: {股票代码: 股票名称}，只接受其中的代码
+            
+        Returns:
+            {股票代码: AnalysisResult}，缺失或无法解析的股票不在其中
+        """
+        try:
+            items = extract_json(response_text, start='[')
+        except ValueError as e:
+            logger.warning(f"[LLM批量] JSON 数组解析失败: {e}")
+            return {}
+        
+        results = {}
+        items = items if isinstance(items, list) else []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            code = str(item.get('code', '')).strip()
+            if code not in names or code in results:
+                continue
+            if index == len(items) - 1 and not all(field in item for field in self.REPORT_FIELDS):
+                # 响应被截断时最后一只只收到部分字段，交给单独重试
+                continue
+            item_text = json.dumps(item, ensure_ascii=False)
+            try:
+                result = self._parse_response(item_text, code, names[code])
+            except Exception as e:
+                # 单只股票的字段异常（如评分为 null）只让这一只单独重试，不连累整批
+                logger.warning(f"[LLM批量] {code} 解析失败，单独重试: {e}")
+                continue
+            result.raw_response = item_text
+            results[code] = result
+        return results
     
     def _parse_text_response(
         self, 
@@ -1182,31 +2441,60 @@ class GeminiAnalyzer:
     def batch_analyze(
         self, 
         contexts: List[Dict[str, Any]],
-        delay_between: float = 2.0
+        news_contexts: Optional[List[Optional[str]]] = None,
+        max_workers: Optional[int] = None,
+        batch_size: Optional[int] = None
     ) -> List[AnalysisResult]:
         """
-        批量分析多只股票
+        批量分析多只股票（并发）
         
-        注意：为避免 API 速率限制，每次分析之间会有延迟
+        请求节奏由 RPM/TPM 配额控制：配额有余量时各线程立即发起请求，
+        配额用满时在限流器中排队，不再在两次分析之间固定等待。
         
         Args:
             contexts: 上下文数据列表
-            delay_between: 每次分析之间的延迟（秒）
+            news_contexts: 与 contexts 一一对应的新闻内容（可选）
+            max_workers: 并发线程数，默认 MAX_WORKERS
+            batch_size: 每次请求打包的股票数，默认 LLM_BATCH_SIZE（≤1 为逐只请求）
             
         Returns:
-            AnalysisResult 列表
+            AnalysisResult 列表，顺序与 contexts 一致
         """
-        results = []
+        config = get_config()
+        news_contexts = news_contexts or [None] * len(contexts)
+        max_workers = max_workers or config.max_workers
+        batch_size = max(1, batch_size or config.llm_batch_size)
         
-        for i, context in enumerate(contexts):
-            if i > 0:
-                logger.debug(f"等待 {delay_between} 秒后继续...")
-                time.sleep(delay_between)
-            
-            result = self.analyze(context)
-            results.append(result)
+        chunks = [
+            (contexts[i:i + batch_size], news_contexts[i:i + batch_size])
+            for i in range(0, len(contexts), batch_size)
+        ]
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            grouped = pool.map(lambda chunk: self.analyze_packed(*chunk), chunks)
+            return [result for group in grouped for result in group]
+    
+    async def batch_analyze_async(
+        self,
+        contexts: List[Dict[str, Any]],
+        news_contexts: Optional[List[Optional[str]]] = None
+    ) -> List[AnalysisResult]:
+        """
+        批量分析多只股票（协程并发）
         
-        return results
+        所有股票同时发起 analyze_async，请求节奏由 RPM/TPM 配额控制，
+        在途请求共享同一连接池。
+        
+        Args:
+            contexts: 上下文数据列表
+            news_contexts: 与 contexts 一一对应的新闻内容（可选）
+            
+        Returns:
+            AnalysisResult 列表，顺序与 contexts 一致
+        """
+        news_contexts = news_contexts or [None] * len(contexts)
+        return list(await asyncio.gather(
+            *(self.analyze_async(c, n) for c, n in zip(contexts, news_contexts))
+        ))
 
 
 # 便捷函数
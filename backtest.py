@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+趋势信号回测
+===================================
+
+检验 StockTrendAnalyzer 的信号规则（BIAS_THRESHOLD、VOLUME_SHRINK_RATIO、
+80/65/50/35 评分门槛等）在历史上的表现：
+
+1. 用 compute_signals 在整块面板上一次算出每只股票、每个交易日的信号与评分
+   （与逐日调用 analyze 的结果一致，不做 N×T 次标量调用）
+2. 按信号、评分区间统计未来 N 日收益、胜率与持有期最大不利波动
+3. 每个信号按"当日出现该信号的股票等权持有 1 日"构建组合，计算最大回撤
+
+约定：信号在当日收盘产生、以当日收盘价成交，不计手续费与涨跌停无法成交的情况。
+
+使用方式：
+    python backtest.py --codes 600519,000001 --start 2023-01-01
+    python backtest.py                      # 回测全部已缓存股票
+"""
+
+import argparse
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Dict
+
+import numpy as np
+import pandas as pd
+
+from stock_analyzer import StockTrendAnalyzer, PricePanel, BUY_SIGNALS
+
+logger = logging.getLogger(__name__)
+
+# 默认统计的持有期（交易日）
+DEFAULT_HORIZONS = (1, 5, 10, 20)
+
+# 评分区间，与 _classify_signal 的 35/50/65/80 门槛对齐
+SCORE_BINS = (0, 35, 50, 65, 80, 101)
+
+
+@dataclass
+class BacktestReport:
+    """回测结果"""
+    horizons: Sequence[int]
+    by_signal: pd.DataFrame          # 行：买入信号；列：(持有期, 指标)
+    by_score: pd.DataFrame           # 行：评分区间；列：(持有期, 指标)
+    portfolio: pd.DataFrame          # 行：买入信号；列：天数、累计收益、最大回撤
+    n_symbols: int = 0
+    n_samples: int = 0
+    start: str = ""
+    end: str = ""
+    notes: List[str] = field(default_factory=list)
+
+    def format(self) -> str:
+        with pd.option_context('display.width', 200, 'display.max_columns', 50,
+                               'display.float_format', '{:.4f}'.format):
+            lines = [
+                f"=== 趋势信号回测 {self.start} ~ {self.end} ===",
+                f"股票 {self.n_symbols} 只，有效样本 {self.n_samples} 个（股票×交易日）",
+                "",
+                "📊 按信号统计（mean: 平均收益, hit: 胜率, mae: 平均持有期最大不利波动）",
+                self.by_signal.to_string(),
+                "",
+                "📊 按评分区间统计",
+                self.by_score.to_string(),
+                "",
+                "📈 信号等权组合（每日持有当日出现该信号的股票 1 日）",
+                self.portfolio.to_string(),
+            ]
+        lines.extend(self.notes)
+        return "\n".join(lines)
+
+
+def forward_stats(close: np.ndarray, horizon: int):
+    """
+    未来 horizon 根 K 线的收益与最大不利波动
+
+    Returns:
+        (收益, 最大不利波动)，均为 (T, N)，未来数据不足处为 NaN
+    """
+    if horizon < 1:
+        raise ValueError(f"持有期必须 ≥ 1 个交易日: {horizon}")
+    future = np.full_like(close, np.nan)
+    future[:-horizon] = close[horizon:]
+    # 第 t 行：close[t+1..t+horizon] 的最小值
+    window_min = pd.DataFrame(close).rolling(window=horizon).min().values
+    future_min = np.full_like(close, np.nan)
+    future_min[:-horizon] = window_min[horizon:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = future / close - 1
+        adverse = np.minimum(future_min / close - 1, 0.0)
+    return returns, adverse
+
+
+def _group_stats(groups: np.ndarray, returns: Dict[int, np.ndarray], adverse: Dict[int, np.ndarray]) -> pd.DataFrame:
+    """按分组统计各持有期的样本数、平均收益、胜率与平均最大不利波动"""
+    frames = {}
+    for h in returns:
+        df = pd.DataFrame({'group': groups, 'ret': returns[h], 'mae': adverse[h]}).dropna()
+        df['win'] = df['ret'] > 0
+        grouped = df.groupby('group', observed=True)
+        frames[h] = pd.DataFrame({
+            'n': grouped['ret'].size(),
+            'mean': grouped['ret'].mean(),
+            'hit': grouped['win'].mean(),
+            'mae': grouped['mae'].mean(),
+        })
+    return pd.concat(frames, axis=1, names=['horizon', 'metric'])
+
+
+def _portfolio_stats(signals: np.ndarray, dates: np.ndarray, next_returns: np.ndarray) -> pd.DataFrame:
+    """每个信号的等权日度组合：持有天数、累计收益、最大回撤"""
+    df = pd.DataFrame({'signal': signals, 'date': dates, 'ret': next_returns}).dropna()
+    daily = df.groupby(['signal', 'date'], observed=True)['ret'].mean()
+
+    rows = {}
+    for signal, series in daily.groupby(level='signal', observed=True):
+        equity = (1 + series.values).cumprod()
+        drawdown = equity / np.maximum.accumulate(equity) - 1
+        rows[signal] = {
+            'days': len(series),
+            'total_return': equity[-1] - 1,
+            'max_drawdown': drawdown.min(),
+        }
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def run_backtest(
+    panel: PricePanel,
+    analyzer: Optional[StockTrendAnalyzer] = None,
+    horizons: Sequence[int] = DEFAULT_HORIZONS
+) -> BacktestReport:
+    """
+    在面板上回测趋势信号
+
+    Args:
+        panel: 日线面板（前复权）
+        analyzer: 趋势分析器（可传入修改过阈值的子类/实例）
+        horizons: 统计的持有期（交易日）
+
+    Returns:
+        BacktestReport
+    """
+    analyzer = analyzer or StockTrendAnalyzer()
+    signals = analyzer.compute_signals(panel)
+    valid = signals['valid']
+
+    returns, adverse = {}, {}
+    for h in horizons:
+        ret, mae = forward_stats(panel.close, h)
+        returns[h], adverse[h] = ret[valid], mae[valid]
+
+    signal_names = np.array([s.value for s in BUY_SIGNALS], dtype=object)
+    signal_labels = pd.Categorical(signal_names[signals['buy_signal'][valid]],
+                                   categories=[s.value for s in BUY_SIGNALS])
+    score_labels = pd.cut(signals['score'][valid], bins=SCORE_BINS, right=False,
+                          labels=[f"{lo}-{hi - 1}" for lo, hi in zip(SCORE_BINS[:-1], SCORE_BINS[1:])])
+
+    next_returns, _ = forward_stats(panel.close, 1)
+    dates = panel.dates[valid]
+
+    report = BacktestReport(
+        horizons=list(horizons),
+        by_signal=_group_stats(signal_labels, returns, adverse),
+        by_score=_group_stats(score_labels, returns, adverse),
+        portfolio=_portfolio_stats(signal_labels, dates, next_returns[valid]),
+        n_symbols=int((panel.lengths > 0).sum()),
+        n_samples=int(valid.sum()),
+    )
+    if len(dates):
+        report.start, report.end = str(dates.min()), str(dates.max())
+    short = int(((panel.lengths > 0) & (panel.lengths <= max(horizons))).sum())
+    if short:
+        report.notes.append(f"⚠️ {short} 只股票历史短于最长持有期，仅参与较短持有期的统计")
+    return report
+
+
+def load_panel(bar_store, codes: Optional[List[str]] = None, start_date: Optional[str] = None) -> PricePanel:
+    """从 BarStore 缓存读取前复权日线面板（不触发网络请求）"""
+    codes = codes or bar_store.cached_codes()
+    frames = {code: bar_store.get_adjusted(code, start_date=start_date) for code in codes}
+    empty = [code for code, df in frames.items() if df.empty]
+    if empty:
+        logger.warning(f"{len(empty)} 只股票无缓存数据: {', '.join(empty[:10])}")
+    return PricePanel.from_frames({code: df for code, df in frames.items() if not df.empty})
+
+
+def parse_horizons(text: str) -> List[int]:
+    """解析逗号分隔的持有期（argparse type，每项须为 ≥ 1 的整数）"""
+    try:
+        horizons = [int(h) for h in text.split(',') if h.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"持有期须为整数: {text}")
+    if not horizons or min(horizons) < 1:
+        raise argparse.ArgumentTypeError(f"持有期须为 ≥ 1 的交易日数: {text}")
+    return horizons
+
+
+def main():
+    from config import get_config
+    from data_provider import BarStore
+
+    parser = argparse.ArgumentParser(description="趋势信号回测（基于日线缓存）")
+    parser.add_argument('--codes', default='', help="股票代码（逗号分隔），默认全部已缓存股票")
+    parser.add_argument('--start', default=None, help="开始日期 YYYY-MM-DD")
+    parser.add_argument('--horizons', type=parse_horizons, default=list(DEFAULT_HORIZONS), help="持有期（交易日，逗号分隔）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    config = get_config()
+    bar_store = BarStore(fetcher=None, cache_dir=config.cache_dir)
+    codes = [c.strip() for c in args.codes.split(',') if c.strip()] or None
+    panel = load_panel(bar_store, codes, start_date=args.start)
+    if not panel.codes:
+        logger.error("没有可回测的缓存数据，请先运行 ql_warmup.py 或 ql_main.py 建立日线缓存")
+        return
+
+    print(run_backtest(panel, horizons=args.horizons).format())
+
+
+if __name__ == "__main__":
+    main()
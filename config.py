@@ -10,7 +10,6 @@ class Config:
     gemini_api_key: Optional[str] = None
     gemini_model: str = "gemini-3-flash-preview"
     gemini_model_fallback: str = "gemini-2.5-flash"
-    gemini_request_delay: float = 2.0
     gemini_max_retries: int = 5
     gemini_retry_delay: float = 5.0
     openai_api_key: Optional[str] = None
@@ -19,6 +18,35 @@ class Config:
     tavily_api_keys: List[str] = field(default_factory=list)
     serpapi_keys: List[str] = field(default_factory=list)
     max_workers: int = 3
+    cache_dir: str = "cache"
+    bar_cache_enabled: bool = True
+    bar_cache_history_days: int = 365
+    warmup_sleep_min: float = 1.0
+    warmup_sleep_max: float = 3.0
+    warmup_backfill_minutes: float = 90.0
+    screener_enabled: bool = False
+    screener_top_n: int = 10
+    screener_min_score: int = 65
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_hours: float = 12.0
+    llm_cache_max_mb: int = 200
+    llm_rpm: int = 10
+    llm_tpm: int = 250000
+    llm_batch_size: int = 1
+    llm_stream_enabled: bool = True
+    llm_prompt_token_budget: int = 6000
+    llm_news_token_budget: int = 1500
+    llm_prefix_cache_enabled: bool = True
+    llm_prefix_cache_ttl_minutes: int = 60
+    llm_structured_output: str = "schema"
+    llm_router_enabled: bool = True
+    llm_hedge_enabled: bool = False
+    llm_router_latency_ranking: bool = False
+    llm_hedge_delay_seconds: float = 30.0
+    llm_call_deadline_seconds: float = 180.0
+    llm_breaker_failure_threshold: int = 3
+    llm_breaker_cooldown_seconds: float = 60.0
+    llm_pricing: str = ""
     
     _instance: Optional['Config'] = None
     
@@ -44,7 +72,6 @@ class Config:
             gemini_api_key=os.environ.get('GEMINI_API_KEY'),
             gemini_model=os.environ.get('GEMINI_MODEL', 'gemini-3-flash-preview'),
             gemini_model_fallback=os.environ.get('GEMINI_MODEL_FALLBACK', 'gemini-2.5-flash'),
-            gemini_request_delay=float(os.environ.get('GEMINI_REQUEST_DELAY', '2.0')),
             gemini_max_retries=int(os.environ.get('GEMINI_MAX_RETRIES', '5')),
             gemini_retry_delay=float(os.environ.get('GEMINI_RETRY_DELAY', '5.0')),
             openai_api_key=os.environ.get('OPENAI_API_KEY'),
@@ -53,6 +80,35 @@ class Config:
             tavily_api_keys=tavily_keys,
             serpapi_keys=serpapi_keys,
             max_workers=int(os.environ.get('MAX_WORKERS', '3')),
+            cache_dir=os.environ.get('CACHE_DIR', 'cache'),
+            bar_cache_enabled=os.environ.get('BAR_CACHE_ENABLED', 'true').lower() in ('true', '1', 'yes'),
+            bar_cache_history_days=int(os.environ.get('BAR_CACHE_HISTORY_DAYS', '365')),
+            warmup_sleep_min=float(os.environ.get('WARMUP_SLEEP_MIN', '1.0')),
+            warmup_sleep_max=float(os.environ.get('WARMUP_SLEEP_MAX', '3.0')),
+            warmup_backfill_minutes=float(os.environ.get('WARMUP_BACKFILL_MINUTES', '90')),
+            screener_enabled=os.environ.get('SCREENER_ENABLED', 'false').lower() in ('true', '1', 'yes'),
+            screener_top_n=int(os.environ.get('SCREENER_TOP_N', '10')),
+            screener_min_score=int(os.environ.get('SCREENER_MIN_SCORE', '65')),
+            llm_cache_enabled=os.environ.get('LLM_CACHE_ENABLED', 'true').lower() in ('true', '1', 'yes'),
+            llm_cache_ttl_hours=float(os.environ.get('LLM_CACHE_TTL_HOURS', '12')),
+            llm_cache_max_mb=int(os.environ.get('LLM_CACHE_MAX_MB', '200')),
+            llm_rpm=int(os.environ.get('LLM_RPM', '10')),
+            llm_tpm=int(os.environ.get('LLM_TPM', '250000')),
+            llm_batch_size=int(os.environ.get('LLM_BATCH_SIZE', '1')),
+            llm_stream_enabled=os.environ.get('LLM_STREAM_ENABLED', 'true').lower() in ('true', '1', 'yes'),
+            llm_prompt_token_budget=int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', '6000')),
+            llm_news_token_budget=int(os.environ.get('LLM_NEWS_TOKEN_BUDGET', '1500')),
+            llm_prefix_cache_enabled=os.environ.get('LLM_PREFIX_CACHE_ENABLED', 'true').lower() in ('true', '1', 'yes'),
+            llm_prefix_cache_ttl_minutes=int(os.environ.get('LLM_PREFIX_CACHE_TTL_MINUTES', '60')),
+            llm_structured_output=os.environ.get('LLM_STRUCTURED_OUTPUT', 'schema').lower(),
+            llm_router_enabled=os.environ.get('LLM_ROUTER_ENABLED', 'true').lower() in ('true', '1', 'yes'),
+            llm_hedge_enabled=os.environ.get('LLM_HEDGE_ENABLED', 'false').lower() in ('true', '1', 'yes'),
+            llm_router_latency_ranking=os.environ.get('LLM_ROUTER_LATENCY_RANKING', 'false').lower() in ('true', '1', 'yes'),
+            llm_hedge_delay_seconds=float(os.environ.get('LLM_HEDGE_DELAY_SECONDS', '30')),
+            llm_call_deadline_seconds=float(os.environ.get('LLM_CALL_DEADLINE_SECONDS', '180')),
+            llm_breaker_failure_threshold=int(os.environ.get('LLM_BREAKER_FAILURE_THRESHOLD', '3')),
+            llm_breaker_cooldown_seconds=float(os.environ.get('LLM_BREAKER_COOLDOWN_SECONDS', '60')),
+            llm_pricing=os.environ.get('LLM_PRICING', ''),
         )
     
     @classmethod
@@ -61,7 +117,7 @@ class Config:
     
     def validate(self) -> List[str]:
         warnings = []
-        if not self.stock_list:
+        if not self.stock_list and not self.screener_enabled:
             warnings.append("未配置 STOCK_LIST")
         if not self.gemini_api_key and not self.openai_api_key:
             warnings.append("未配置 AI API Key")
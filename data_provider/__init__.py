@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 from .base import BaseFetcher, DataFetcherManager, DataFetchError, RateLimitError
 from .akshare_fetcher import AkshareFetcher
+from .bar_store import BarStore
+from .bar_series import BarSeries
+from .bar_aggregator import StreamingBarAggregator, session_for
+from .rate_governor import RateGovernor, get_rate_governor
+from .trading_calendar import TradingCalendar
+from .disk_cache import DiskCache
 
 __all__ = [
     'BaseFetcher',
@@ -8,4 +14,12 @@ __all__ = [
     'DataFetchError',
     'RateLimitError',
     'AkshareFetcher',
+    'BarStore',
+    'BarSeries',
+    'StreamingBarAggregator',
+    'session_for',
+    'RateGovernor',
+    'get_rate_governor',
+    'TradingCalendar',
+    'DiskCache',
 ]
@@ -9,7 +9,7 @@ AkshareFetcher - 主数据源 (Priority 1)
 风险：爬虫机制易被反爬封禁
 
 防封禁策略：
-1. 每次请求前随机休眠 2-5 秒
+1. 全主机共享请求预算（RateGovernor），相邻请求间隔随机 2-5 秒
 2. 随机轮换 User-Agent
 3. 使用 tenacity 实现指数退避重试
 
@@ -22,7 +22,7 @@ import logging
 import random
 import time
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 
 import pandas as pd
@@ -35,6 +35,9 @@ from tenacity import (
 )
 
 from .base import BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS
+from .disk_cache import DiskCache
+from .rate_governor import RateGovernor, get_rate_governor
+from .trading_calendar import TradingCalendar
 
 
 @dataclass
@@ -181,6 +184,21 @@ USER_AGENTS = [
 ]
 
 
+# 磁盘缓存有效期（参考数据变化很慢）
+SYMBOL_MASTER_TTL = timedelta(days=1)
+TRADE_CALENDAR_TTL = timedelta(days=7)
+# 股票列表获取失败后，本次运行内隔多久再尝试（秒）；期间按空表处理，避免每只股票都重新请求
+SYMBOL_MASTER_RETRY_SECONDS = 600
+
+
+# 分钟 K 线支持的周期及标准列
+MINUTE_PERIODS = ('1', '5', '15', '30', '60')
+MINUTE_COLUMNS = ['datetime', 'open', 'high', 'low', 'close', 'volume', 'amount']
+
+# 全市场实时快照的标准列
+SPOT_COLUMNS = ['code', 'name', 'open', 'high', 'low', 'close', 'prev_close', 'volume', 'amount', 'pct_chg']
+
+
 # 缓存实时行情数据（避免重复请求）
 _realtime_cache: Dict[str, Any] = {
     'data': None,
@@ -214,6 +232,25 @@ def _is_etf_code(stock_code: str) -> bool:
     return stock_code.startswith(etf_prefixes) and len(stock_code) == 6
 
 
+def _to_sina_symbol(stock_code: str) -> str:
+    """
+    转换为新浪接口使用的带市场前缀代码
+    
+    规则：6/9 开头为上交所(sh)，4/8 开头为北交所(bj)，其余为深交所(sz)
+    
+    Args:
+        stock_code: 6位股票代码，如 '600519'
+        
+    Returns:
+        带前缀代码，如 'sh600519'
+    """
+    if stock_code.startswith(('6', '9')):
+        return f"sh{stock_code}"
+    if stock_code.startswith(('4', '8')):
+        return f"bj{stock_code}"
+    return f"sz{stock_code}"
+
+
 def _is_hk_code(stock_code: str) -> bool:
     """
     判断代码是否为港股
@@ -242,7 +279,7 @@ class AkshareFetcher(BaseFetcher):
     数据来源：东方财富网爬虫
     
     关键策略：
-    - 每次请求前随机休眠 2.0-5.0 秒
+    - 所有实例/线程/进程共享请求预算，相邻请求间隔随机 2.0-5.0 秒
     - 随机 User-Agent 轮换
     - 失败后指数退避重试（最多3次）
     """
@@ -250,17 +287,35 @@ class AkshareFetcher(BaseFetcher):
     name = "AkshareFetcher"
     priority = 1
     
-    def __init__(self, sleep_min: float = 2.0, sleep_max: float = 5.0):
+    def __init__(
+        self,
+        sleep_min: float = 2.0,
+        sleep_max: float = 5.0,
+        governor: Optional[RateGovernor] = None,
+        cache_dir: Optional[str] = None
+    ):
         """
         初始化 AkshareFetcher
         
         Args:
-            sleep_min: 最小休眠时间（秒）
-            sleep_max: 最大休眠时间（秒）
+            sleep_min: 相邻请求最小间隔（秒）
+            sleep_max: 相邻请求最大间隔（秒）
+            governor: 请求节流器（默认使用主机级共享的 eastmoney 节流器）
+            cache_dir: 磁盘缓存目录（筹码分布/股票列表/交易日历），None 表示不缓存
         """
         self.sleep_min = sleep_min
         self.sleep_max = sleep_max
-        self._last_request_time: Optional[float] = None
+        self._governor = governor or get_rate_governor('eastmoney')
+        self._cache_dir = cache_dir
+        self._trade_calendar: Optional[TradingCalendar] = None
+        self._symbol_names: Optional[Dict[str, str]] = None
+        self._symbol_master_retry_at = 0.0
+    
+    def _cache(self, namespace: str) -> Optional[DiskCache]:
+        """获取磁盘缓存（未配置 cache_dir 时返回 None）"""
+        if not self._cache_dir:
+            return None
+        return DiskCache(self._cache_dir, namespace)
     
     def _set_random_user_agent(self) -> None:
         """
@@ -283,21 +338,12 @@ class AkshareFetcher(BaseFetcher):
         强制执行速率限制
         
         策略：
-        1. 检查距离上次请求的时间间隔
-        2. 如果间隔不足，补充休眠时间
-        3. 然后再执行随机 jitter 休眠
-        """
-        if self._last_request_time is not None:
-            elapsed = time.time() - self._last_request_time
-            min_interval = self.sleep_min
-            if elapsed < min_interval:
-                additional_sleep = min_interval - elapsed
-                logger.debug(f"补充休眠 {additional_sleep:.2f} 秒")
-                time.sleep(additional_sleep)
-        
-        # 执行随机 jitter 休眠
-        self.random_sleep(self.sleep_min, self.sleep_max)
-        self._last_request_time = time.time()
+        向主机级 RateGovernor 预约请求时间片，与其他 fetcher 实例、
+        线程以及并发运行的青龙任务共享同一请求预算，间隔随机 jitter
+        """
+        waited = self._governor.acquire(self.sleep_min, self.sleep_max)
+        if waited > 0:
+            logger.debug(f"节流等待 {waited:.2f} 秒")
     
     @retry(
         stop=stop_after_attempt(3),  # 最多重试3次
@@ -328,11 +374,20 @@ class AkshareFetcher(BaseFetcher):
         else:
             return self._fetch_stock_data(stock_code, start_date, end_date)
     
-    def _fetch_stock_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+    def _fetch_stock_data(
+        self,
+        stock_code: str,
+        start_date: str,
+        end_date: str,
+        adjust: str = "qfq"
+    ) -> pd.DataFrame:
         """
         获取普通 A 股历史数据
         
         数据来源：ak.stock_zh_a_hist()
+        
+        Args:
+            adjust: 复权方式，"qfq" 前复权（默认），"" 不复权（供 BarStore 缓存使用）
         """
         import akshare as ak
         
@@ -343,12 +398,12 @@ class AkshareFetcher(BaseFetcher):
         self._enforce_rate_limit()
         
         logger.info(f"[API调用] ak.stock_zh_a_hist(symbol={stock_code}, period=daily, "
-                   f"start_date={start_date.replace('-', '')}, end_date={end_date.replace('-', '')}, adjust=qfq)")
+                   f"start_date={start_date.replace('-', '')}, end_date={end_date.replace('-', '')}, adjust={adjust})")
         
         try:
             # 调用 akshare 获取 A 股日线数据
             # period="daily" 获取日线数据
-            # adjust="qfq" 获取前复权数据
+            # adjust="qfq" 获取前复权数据，adjust="" 获取不复权数据
             import time as _time
             api_start = _time.time()
             
@@ -357,7 +412,7 @@ class AkshareFetcher(BaseFetcher):
                 period="daily",
                 start_date=start_date.replace('-', ''),
                 end_date=end_date.replace('-', ''),
-                adjust="qfq"  # 前复权
+                adjust=adjust
             )
             
             api_elapsed = _time.time() - api_start
@@ -508,6 +563,157 @@ class AkshareFetcher(BaseFetcher):
             
             raise DataFetchError(f"Akshare 获取港股数据失败: {e}") from e
     
+    def get_unadjusted_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        获取不复权日线数据（供 BarStore 增量缓存使用）
+        
+        仅支持普通 A 股。返回标准化、清洗后的数据，不计算技术指标。
+        
+        Args:
+            stock_code: 股票代码
+            start_date: 开始日期，格式 'YYYY-MM-DD'
+            end_date: 结束日期，格式 'YYYY-MM-DD'
+            
+        Returns:
+            不复权日线 DataFrame，区间内无数据时返回空 DataFrame
+        """
+        raw_df = self._fetch_stock_data(stock_code, start_date, end_date, adjust="")
+        if raw_df is None or raw_df.empty:
+            return pd.DataFrame(columns=['code'] + STANDARD_COLUMNS)
+        
+        df = self._normalize_data(raw_df, stock_code)
+        return self._clean_data(df)
+    
+    def get_adjust_factors(self, stock_code: str) -> pd.DataFrame:
+        """
+        获取后复权因子表
+        
+        数据来源：ak.stock_zh_a_daily(adjust="hfq-factor")（新浪）
+        每行对应一次除权除息事件，因子自该日起生效；
+        前复权价 = 不复权价 × 因子(当日) / 因子(最新)
+        
+        Args:
+            stock_code: 股票代码
+            
+        Returns:
+            DataFrame[date, hfq_factor]，按日期升序
+        """
+        import akshare as ak
+        
+        self._set_random_user_agent()
+        self._enforce_rate_limit()
+        
+        symbol = _to_sina_symbol(stock_code)
+        logger.info(f"[API调用] ak.stock_zh_a_daily(symbol={symbol}, adjust=hfq-factor) 获取复权因子...")
+        
+        try:
+            api_start = time.time()
+            df = ak.stock_zh_a_daily(symbol=symbol, adjust="hfq-factor")
+            api_elapsed = time.time() - api_start
+        except Exception as e:
+            raise DataFetchError(f"Akshare 获取复权因子失败: {e}") from e
+        
+        if df is None or df.empty:
+            logger.warning(f"[API返回] ak.stock_zh_a_daily 复权因子为空, 耗时 {api_elapsed:.2f}s")
+            return pd.DataFrame(columns=['date', 'hfq_factor'])
+        
+        logger.info(f"[API返回] ak.stock_zh_a_daily 成功: 返回 {len(df)} 条复权事件, 耗时 {api_elapsed:.2f}s")
+        
+        df = df[['date', 'hfq_factor']].copy()
+        df['date'] = pd.to_datetime(df['date'])
+        df['hfq_factor'] = pd.to_numeric(df['hfq_factor'], errors='coerce')
+        df = df.dropna().sort_values('date', ascending=True).reset_index(drop=True)
+        return df
+    
+    def get_minute_data(
+        self,
+        stock_code: str,
+        period: str = '1',
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        获取分钟 K 线（不复权）
+        
+        根据代码类型自动选择 API：
+        - 普通股票：ak.stock_zh_a_hist_min_em()
+        - ETF 基金：ak.fund_etf_hist_min_em()
+        - 港股：ak.stock_hk_hist_min_em()
+        
+        注意：东财 1 分钟线仅提供最近 5 个交易日；K 线时间为该分钟的结束时间
+        
+        Args:
+            stock_code: 股票/ETF/港股代码
+            period: 周期（分钟），'1'/'5'/'15'/'30'/'60'
+            start_date: 开始时间，格式 'YYYY-MM-DD HH:MM:SS'（默认当日 09:30）
+            end_date: 结束时间，格式 'YYYY-MM-DD HH:MM:SS'（默认当日收盘，A 股 15:00、港股 16:00）
+            
+        Returns:
+            DataFrame[datetime, open, high, low, close, volume, amount]，按时间升序
+        """
+        import akshare as ak
+        
+        if period not in MINUTE_PERIODS:
+            raise ValueError(f"不支持的分钟周期: {period}，可选 {MINUTE_PERIODS}")
+        
+        today = datetime.now().strftime('%Y-%m-%d')
+        start_date = start_date or f"{today} 09:30:00"
+        end_date = end_date or f"{today} {'16:00:00' if _is_hk_code(stock_code) else '15:00:00'}"
+        
+        self._set_random_user_agent()
+        self._enforce_rate_limit()
+        
+        if _is_hk_code(stock_code):
+            api_name = 'stock_hk_hist_min_em'
+            api = ak.stock_hk_hist_min_em
+            symbol = stock_code.lower().replace('hk', '').zfill(5)
+        elif _is_etf_code(stock_code):
+            api_name = 'fund_etf_hist_min_em'
+            api = ak.fund_etf_hist_min_em
+            symbol = stock_code
+        else:
+            api_name = 'stock_zh_a_hist_min_em'
+            api = ak.stock_zh_a_hist_min_em
+            symbol = stock_code
+        
+        logger.info(f"[API调用] ak.{api_name}(symbol={symbol}, period={period}, "
+                   f"start_date={start_date}, end_date={end_date})")
+        
+        try:
+            api_start = time.time()
+            df = api(symbol=symbol, start_date=start_date, end_date=end_date, period=period, adjust='')
+            api_elapsed = time.time() - api_start
+        except Exception as e:
+            error_msg = str(e).lower()
+            if any(keyword in error_msg for keyword in ['banned', 'blocked', '频率', 'rate', '限制']):
+                logger.warning(f"检测到可能被封禁: {e}")
+                raise RateLimitError(f"Akshare 可能被限流: {e}") from e
+            raise DataFetchError(f"Akshare 获取分钟数据失败: {e}") from e
+        
+        if df is None or df.empty:
+            logger.warning(f"[API返回] ak.{api_name} 返回空数据, 耗时 {api_elapsed:.2f}s")
+            return pd.DataFrame(columns=MINUTE_COLUMNS)
+        
+        logger.info(f"[API返回] ak.{api_name} 成功: 返回 {len(df)} 根 {period} 分钟K线, 耗时 {api_elapsed:.2f}s")
+        
+        df = df.rename(columns={
+            '时间': 'datetime',
+            '开盘': 'open',
+            '收盘': 'close',
+            '最高': 'high',
+            '最低': 'low',
+            '成交量': 'volume',
+            '成交额': 'amount',
+        })
+        df = df[[col for col in MINUTE_COLUMNS if col in df.columns]].copy()
+        df['datetime'] = pd.to_datetime(df['datetime'])
+        for col in MINUTE_COLUMNS[1:]:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        
+        df = df.dropna(subset=['close'])
+        return df.sort_values('datetime', ascending=True).reset_index(drop=True)
+    
     def _normalize_data(self, df: pd.DataFrame, stock_code: str) -> pd.DataFrame:
         """
         标准化 Akshare 数据
@@ -567,6 +773,73 @@ class AkshareFetcher(BaseFetcher):
         else:
             return self._get_stock_realtime_quote(stock_code)
     
+    def _get_spot_em(self) -> pd.DataFrame:
+        """
+        获取全部 A 股实时行情原始表（ak.stock_zh_a_spot_em，进程内缓存 60 秒）
+        
+        单只实时行情与全市场快照共用，同一次运行只请求一次
+        """
+        import akshare as ak
+        
+        # 检查缓存
+        current_time = time.time()
+        if (_realtime_cache['data'] is not None and 
+            current_time - _realtime_cache['timestamp'] < _realtime_cache['ttl']):
+            logger.debug(f"[缓存命中] 使用缓存的A股实时行情数据")
+            return _realtime_cache['data']
+        
+        # 防封禁策略
+        self._set_random_user_agent()
+        self._enforce_rate_limit()
+        
+        logger.info(f"[API调用] ak.stock_zh_a_spot_em() 获取A股实时行情...")
+        api_start = time.time()
+        
+        df = ak.stock_zh_a_spot_em()
+        
+        api_elapsed = time.time() - api_start
+        logger.info(f"[API返回] ak.stock_zh_a_spot_em 成功: 返回 {len(df)} 只股票, 耗时 {api_elapsed:.2f}s")
+        
+        # 更新缓存
+        _realtime_cache['data'] = df
+        _realtime_cache['timestamp'] = current_time
+        return df
+    
+    def get_spot_snapshot(self) -> pd.DataFrame:
+        """
+        获取全市场 A 股实时快照（标准列名）
+        
+        数据来源：ak.stock_zh_a_spot_em()
+        
+        Returns:
+            DataFrame[code, name, open, high, low, close, prev_close, volume, amount, pct_chg]，
+            close 为最新价；获取失败返回空 DataFrame
+        """
+        try:
+            df = self._get_spot_em()
+        except Exception as e:
+            logger.error(f"[API错误] 获取A股实时快照失败: {e}")
+            return pd.DataFrame(columns=SPOT_COLUMNS)
+        
+        df = df.rename(columns={
+            '代码': 'code',
+            '名称': 'name',
+            '今开': 'open',
+            '最高': 'high',
+            '最低': 'low',
+            '最新价': 'close',
+            '昨收': 'prev_close',
+            '成交量': 'volume',
+            '成交额': 'amount',
+            '涨跌幅': 'pct_chg',
+        })
+        df = df[[col for col in SPOT_COLUMNS if col in df.columns]].copy()
+        df['code'] = df['code'].astype(str)
+        for col in SPOT_COLUMNS[2:]:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df.reset_index(drop=True)
+    
     def _get_stock_realtime_quote(self, stock_code: str) -> Optional[RealtimeQuote]:
         """
         获取普通 A 股实时行情数据
@@ -574,32 +847,8 @@ class AkshareFetcher(BaseFetcher):
         数据来源：ak.stock_zh_a_spot_em()
         包含：量比、换手率、市盈率、市净率、总市值、流通市值等
         """
-        import akshare as ak
-        
         try:
-            # 检查缓存
-            current_time = time.time()
-            if (_realtime_cache['data'] is not None and 
-                current_time - _realtime_cache['timestamp'] < _realtime_cache['ttl']):
-                df = _realtime_cache['data']
-                logger.debug(f"[缓存命中] 使用缓存的A股实时行情数据")
-            else:
-                # 防封禁策略
-                self._set_random_user_agent()
-                self._enforce_rate_limit()
-                
-                logger.info(f"[API调用] ak.stock_zh_a_spot_em() 获取A股实时行情...")
-                import time as _time
-                api_start = _time.time()
-                
-                df = ak.stock_zh_a_spot_em()
-                
-                api_elapsed = _time.time() - api_start
-                logger.info(f"[API返回] ak.stock_zh_a_spot_em 成功: 返回 {len(df)} 只股票, 耗时 {api_elapsed:.2f}s")
-                
-                # 更新缓存
-                _realtime_cache['data'] = df
-                _realtime_cache['timestamp'] = current_time
+            df = self._get_spot_em()
             
             # 查找指定股票
             row = df[df['代码'] == stock_code]
@@ -805,7 +1054,7 @@ class AkshareFetcher(BaseFetcher):
             logger.error(f"[API错误] 获取港股 {stock_code} 实时行情失败: {e}")
             return None
     
-    def get_chip_distribution(self, stock_code: str) -> Optional[ChipDistribution]:
+    def get_chip_distribution(self, stock_code: str, refresh: bool = False) -> Optional[ChipDistribution]:
         """
         获取筹码分布数据
         
@@ -813,9 +1062,11 @@ class AkshareFetcher(BaseFetcher):
         包含：获利比例、平均成本、筹码集中度
         
         注意：ETF/指数没有筹码分布数据，会直接返回 None
+        配置 cache_dir 时，最近一次收盘后获取过的数据直接从磁盘缓存返回
         
         Args:
             stock_code: 股票代码
+            refresh: 忽略缓存强制拉取
             
         Returns:
             ChipDistribution 对象（最新一天的数据），获取失败返回 None
@@ -827,6 +1078,14 @@ class AkshareFetcher(BaseFetcher):
             logger.debug(f"[API跳过] {stock_code} 是 ETF/指数，无筹码分布数据")
             return None
         
+        # 检查磁盘缓存：最近一次收盘之后获取的筹码数据即为最新
+        cache = self._cache('chip')
+        if cache is not None and not refresh:
+            chip = cache.get(stock_code, fresh_after=self.get_trade_calendar().last_close())
+            if chip is not None:
+                logger.debug(f"[缓存命中] 使用缓存的 {stock_code} 筹码分布")
+                return chip
+        
         try:
             # 防封禁策略
             self._set_random_user_agent()
@@ -874,12 +1133,98 @@ class AkshareFetcher(BaseFetcher):
             logger.info(f"[筹码分布] {stock_code} 日期={chip.date}: 获利比例={chip.profit_ratio:.1%}, "
                        f"平均成本={chip.avg_cost}, 90%集中度={chip.concentration_90:.2%}, "
                        f"70%集中度={chip.concentration_70:.2%}")
+            if cache is not None:
+                cache.set(stock_code, chip)
             return chip
             
         except Exception as e:
             logger.error(f"[API错误] 获取 {stock_code} 筹码分布失败: {e}")
             return None
     
+    def get_trade_calendar(self, refresh: bool = False) -> TradingCalendar:
+        """
+        获取 A 股交易日历
+        
+        数据来源：ak.tool_trade_date_hist_sina()
+        磁盘缓存 7 天；获取失败时退化为工作日近似日历
+        
+        Args:
+            refresh: 忽略缓存强制拉取
+            
+        Returns:
+            TradingCalendar 对象
+        """
+        if self._trade_calendar is not None and not refresh:
+            return self._trade_calendar
+        
+        cache = self._cache('reference')
+        if cache is not None and not refresh:
+            dates = cache.get('trade_calendar', max_age=TRADE_CALENDAR_TTL)
+            if dates is not None:
+                self._trade_calendar = TradingCalendar(dates)
+                return self._trade_calendar
+        
+        try:
+            import akshare as ak
+            logger.info("[API调用] ak.tool_trade_date_hist_sina() 获取交易日历...")
+            df = ak.tool_trade_date_hist_sina()
+            dates = pd.to_datetime(df['trade_date']).dt.date.tolist()
+            logger.info(f"[API返回] ak.tool_trade_date_hist_sina 成功: {len(dates)} 个交易日")
+            if cache is not None:
+                cache.set('trade_calendar', dates)
+            self._trade_calendar = TradingCalendar(dates)
+        except Exception as e:
+            logger.warning(f"[API错误] 获取交易日历失败，使用工作日近似: {e}")
+            self._trade_calendar = TradingCalendar()
+        
+        return self._trade_calendar
+    
+    def get_symbol_master(self, refresh: bool = False) -> Dict[str, str]:
+        """
+        获取 A 股代码-名称映射
+        
+        数据来源：ak.stock_info_a_code_name()
+        磁盘缓存 1 天
+        
+        Args:
+            refresh: 忽略缓存强制拉取
+            
+        Returns:
+            {代码: 名称} 字典，获取失败返回空字典（SYMBOL_MASTER_RETRY_SECONDS 内不再重试）
+        """
+        if self._symbol_names is not None and not refresh:
+            if self._symbol_names or time.time() < self._symbol_master_retry_at:
+                return self._symbol_names
+        
+        cache = self._cache('reference')
+        if cache is not None and not refresh:
+            names = cache.get('symbol_master', max_age=SYMBOL_MASTER_TTL)
+            if names is not None:
+                self._symbol_names = names
+                return names
+        
+        try:
+            import akshare as ak
+            self._set_random_user_agent()
+            self._enforce_rate_limit()
+            logger.info("[API调用] ak.stock_info_a_code_name() 获取股票列表...")
+            df = ak.stock_info_a_code_name()
+            names = dict(zip(df['code'].astype(str), df['name'].astype(str)))
+            logger.info(f"[API返回] ak.stock_info_a_code_name 成功: {len(names)} 只股票")
+            if cache is not None:
+                cache.set('symbol_master', names)
+            self._symbol_names = names
+        except Exception as e:
+            logger.warning(f"[API错误] 获取股票列表失败，{SYMBOL_MASTER_RETRY_SECONDS} 秒内不再重试: {e}")
+            self._symbol_names = {}
+            self._symbol_master_retry_at = time.time() + SYMBOL_MASTER_RETRY_SECONDS
+        
+        return self._symbol_names
+    
+    def get_stock_name(self, stock_code: str) -> Optional[str]:
+        """从股票列表中查询名称（实时行情失败时的备选）"""
+        return self.get_symbol_master().get(stock_code)
+    
     def get_enhanced_data(self, stock_code: str, days: int = 60) -> Dict[str, Any]:
         """
         获取增强数据（历史K线 + 实时行情 + 筹码分布）
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+分钟 K 线流式聚合器
+===================================
+
+职责：
+1. 把 1 分钟 K 线流式聚合为 5/15/30/60 分钟等更高周期
+2. 同步维护当日未完成的日线（盘中最新一根日 K）
+3. 每个周期只保留固定数量的已完成 K 线，内存占用有上限
+
+盘中轮询时，可将未完成日线拼接到 BarStore 缓存的历史日线后，
+直接复用 StockTrendAnalyzer 的逻辑，无需每次重新拉取整段日线。
+
+交易时段：A 股 09:30-11:30、13:00-15:00，港股 09:30-12:00、13:00-16:00；
+分钟 K 线时间为该分钟的结束时间。
+"""
+
+import logging
+import math
+from collections import deque
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Iterable, Deque
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TradingSession:
+    """交易时段（自 00:00 起的分钟数）"""
+    morning_open: int
+    morning_close: int
+    afternoon_open: int
+    afternoon_close: int
+
+
+A_SHARE_SESSION = TradingSession(9 * 60 + 30, 11 * 60 + 30, 13 * 60, 15 * 60)
+HK_SESSION = TradingSession(9 * 60 + 30, 12 * 60, 13 * 60, 16 * 60)
+
+
+def session_for(stock_code: str) -> TradingSession:
+    """按代码选择交易时段（港股 / A 股及 ETF）"""
+    from .akshare_fetcher import _is_hk_code
+    return HK_SESSION if _is_hk_code(stock_code) else A_SHARE_SESSION
+
+
+@dataclass
+class OHLCVBar:
+    """单根 K 线（time 为周期结束时间，日线为当日 00:00）"""
+    time: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float = 0.0
+    amount: float = 0.0
+
+    def merged(self, other: 'OHLCVBar', time: Optional[datetime] = None) -> 'OHLCVBar':
+        """返回合并 other（时间更晚）后的新 K 线"""
+        return OHLCVBar(
+            time=time or self.time,
+            open=self.open,
+            high=max(self.high, other.high),
+            low=min(self.low, other.low),
+            close=other.close,
+            volume=self.volume + other.volume,
+            amount=self.amount + other.amount,
+        )
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'time': self.time,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume,
+            'amount': self.amount,
+        }
+
+
+def bucket_end(ts: datetime, minutes: int, session: TradingSession = A_SHARE_SESSION) -> datetime:
+    """
+    计算分钟 K 线所属周期的结束时间
+
+    上午、下午各自从开盘起按交易分钟计数，周期不跨午休：
+    A 股 60 分钟线为 10:30/11:30/14:00/15:00，港股为 10:30/11:30/12:00/14:00/15:00/16:00。
+    09:30 集合竞价那一根归入第一个周期。
+    """
+    minute_of_day = ts.hour * 60 + ts.minute
+    if minute_of_day <= session.morning_close:
+        open_minute, close_minute = session.morning_open, session.morning_close
+    else:
+        open_minute, close_minute = session.afternoon_open, session.afternoon_close
+
+    k = max(minute_of_day - open_minute, 0)
+    end_minute = min(open_minute + max(1, math.ceil(k / minutes)) * minutes, close_minute)
+    return ts.replace(hour=end_minute // 60, minute=end_minute % 60, second=0, microsecond=0)
+
+
+class StreamingBarAggregator:
+    """
+    分钟 K 线流式聚合器
+
+    使用方式：
+        agg = StreamingBarAggregator(timeframes=(5, 15, 60), session=session_for('600519'))
+        agg.update(fetcher.get_minute_data('600519', period='1'))   # 可反复传入当日全量分钟线
+        df_15m = agg.get_bars(15)
+        daily = agg.merge_into_daily(bar_store.get_adjusted('600519'))
+        result = StockTrendAnalyzer().analyze(daily, '600519')
+
+    最新一根分钟 K 线可能仍在变化，先作为 pending 保存，
+    直到更晚的分钟到达才提交到各周期，所以重复轮询是幂等的。
+    """
+
+    def __init__(
+        self,
+        timeframes: Iterable[int] = (5, 15, 30, 60),
+        max_bars: int = 500,
+        max_days: int = 5,
+        session: TradingSession = A_SHARE_SESSION
+    ):
+        """
+        Args:
+            timeframes: 需要聚合的周期（分钟）
+            max_bars: 每个周期保留的已完成 K 线数量上限
+            max_days: 保留的已完成日线数量上限
+            session: 交易时段（港股使用 HK_SESSION，可用 session_for(code) 选择）
+        """
+        self.session = session
+        self.timeframes = tuple(sorted(set(int(tf) for tf in timeframes)))
+        self._completed: Dict[int, Deque[OHLCVBar]] = {
+            tf: deque(maxlen=max_bars) for tf in self.timeframes
+        }
+        self._current: Dict[int, Optional[OHLCVBar]] = {tf: None for tf in self.timeframes}
+        self._completed_days: Deque[OHLCVBar] = deque(maxlen=max_days)
+        self._current_day: Optional[OHLCVBar] = None
+        self._pending: Optional[OHLCVBar] = None
+
+    # ========== 输入 ==========
+
+    def add_bar(
+        self,
+        ts: datetime,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float = 0.0,
+        amount: float = 0.0
+    ) -> None:
+        """
+        输入一根 1 分钟 K 线
+
+        早于 pending 的 K 线视为重复数据直接忽略；
+        与 pending 同一分钟则覆盖（该分钟仍在成交）。
+        """
+        bar = OHLCVBar(ts, float(open), float(high), float(low), float(close), float(volume), float(amount))
+
+        if self._pending is not None:
+            if ts < self._pending.time:
+                return
+            if ts > self._pending.time:
+                self._commit(self._pending)
+        self._pending = bar
+
+    def update(self, df: pd.DataFrame) -> int:
+        """
+        批量输入分钟 K 线（AkshareFetcher.get_minute_data 的返回格式）
+
+        Returns:
+            实际处理的新 K 线数量
+        """
+        if df is None or df.empty:
+            return 0
+
+        last_time = self._pending.time if self._pending is not None else None
+        if last_time is not None:
+            df = df[df['datetime'] >= last_time]
+
+        count = 0
+        for row in df.itertuples(index=False):
+            self.add_bar(
+                row.datetime.to_pydatetime(), row.open, row.high, row.low, row.close,
+                getattr(row, 'volume', 0.0), getattr(row, 'amount', 0.0),
+            )
+            count += 1
+        return count
+
+    def _commit(self, bar: OHLCVBar) -> None:
+        """把已确定的分钟 K 线累加到各周期和当日日线"""
+        for tf in self.timeframes:
+            end = bucket_end(bar.time, tf, self.session)
+            current = self._current[tf]
+            if current is not None and current.time == end:
+                self._current[tf] = current.merged(bar)
+            else:
+                if current is not None:
+                    self._completed[tf].append(current)
+                self._current[tf] = replace(bar, time=end)
+
+        day = bar.time.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self._current_day is not None and self._current_day.time == day:
+            self._current_day = self._current_day.merged(bar)
+        else:
+            if self._current_day is not None:
+                self._completed_days.append(self._current_day)
+            self._current_day = replace(bar, time=day)
+
+    # ========== 输出 ==========
+
+    def _with_pending(self, bar: Optional[OHLCVBar], time: datetime) -> Optional[OHLCVBar]:
+        """把 pending 分钟线临时并入（不修改内部状态）"""
+        if self._pending is None:
+            return bar
+        if bar is None or bar.time != time:
+            return replace(self._pending, time=time)
+        return bar.merged(self._pending)
+
+    def get_bars(self, minutes: int, include_partial: bool = True) -> pd.DataFrame:
+        """
+        获取指定周期的 K 线
+
+        Args:
+            minutes: 周期（分钟），必须在 timeframes 中
+            include_partial: 是否包含当前未完成的 K 线
+
+        Returns:
+            DataFrame[time, open, high, low, close, volume, amount]
+        """
+        if minutes not in self._completed:
+            raise ValueError(f"未配置 {minutes} 分钟周期，可选 {self.timeframes}")
+
+        bars: List[OHLCVBar] = list(self._completed[minutes])
+        current = self._current[minutes]
+        if include_partial:
+            if self._pending is not None:
+                end = bucket_end(self._pending.time, minutes, self.session)
+                if current is not None and current.time != end:
+                    bars.append(current)
+                current = self._with_pending(current, end)
+            if current is not None:
+                bars.append(current)
+
+        return pd.DataFrame([b.to_dict() for b in bars], columns=list(OHLCVBar.__dataclass_fields__))
+
+    def get_daily_bar(self) -> Optional[OHLCVBar]:
+        """获取当日（含未完成分钟）的日线"""
+        if self._pending is None:
+            return self._current_day
+        day = self._pending.time.replace(hour=0, minute=0, second=0, microsecond=0)
+        return self._with_pending(self._current_day, day)
+
+    def merge_into_daily(self, daily_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        将当日未完成日线拼接到历史日线末尾（替换同日已有 K 线）
+
+        返回只包含标准列的新 DataFrame；均线等指标由 StockTrendAnalyzer 自行计算。
+
+        Args:
+            daily_df: 历史日线（如 BarStore.get_adjusted 的返回），按日期升序；
+                      无缓存时的空 DataFrame 只返回当日这一根
+
+        Returns:
+            拼接后的日线 DataFrame
+        """
+        bar = self.get_daily_bar()
+        if bar is None:
+            return daily_df
+
+        if daily_df is None or 'date' not in daily_df.columns:
+            daily_df = pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg'])
+        history = daily_df[daily_df['date'] < pd.Timestamp(bar.time)]
+        prev_close = float(history['close'].iloc[-1]) if not history.empty else None
+
+        row = {
+            'date': pd.Timestamp(bar.time),
+            'open': bar.open,
+            'high': bar.high,
+            'low': bar.low,
+            'close': bar.close,
+            'volume': bar.volume,
+            'amount': bar.amount,
+            'pct_chg': round((bar.close / prev_close - 1) * 100, 2) if prev_close else 0.0,
+        }
+        if 'code' in daily_df.columns and not daily_df.empty:
+            row['code'] = daily_df['code'].iloc[-1]
+
+        columns = [col for col in daily_df.columns if col in row]
+        today = pd.DataFrame([row], columns=columns)
+        if history.empty:
+            return today
+        return pd.concat([history[columns], today], ignore_index=True)
+
+
+if __name__ == "__main__":
+    # 测试代码
+    logging.basicConfig(level=logging.INFO)
+
+    start = datetime(2026, 1, 9, 9, 30)
+    minutes = [start + timedelta(minutes=i) for i in range(121)]
+    minutes += [datetime(2026, 1, 9, 13, 1) + timedelta(minutes=i) for i in range(120)]
+    df = pd.DataFrame({
+        'datetime': pd.to_datetime(minutes),
+        'open': 10.0, 'high': 10.2, 'low': 9.8, 'close': 10.1,
+        'volume': 100.0, 'amount': 1010.0,
+    })
+
+    agg = StreamingBarAggregator(timeframes=(5, 60))
+    agg.update(df.iloc[:150])
+    agg.update(df)  # 重复轮询，幂等
+    print(agg.get_bars(60))
+    print(agg.get_daily_bar())
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+BarSeries - 只读日线序列
+===================================
+
+同一段日线在流水线中原本被反复整理：_clean_data 升序排序、趋势分析复制后再排序、
+计算均线再复制一次、build_context 又按降序排序。
+
+BarSeries 在取数后构建一次：
+1. 保证按日期升序（已有序时不排序、不复制）
+2. 列以只读 numpy 数组提供，首次访问后缓存
+3. 滚动均值等派生列按 (列, 窗口) 缓存，趋势分析、上下文构建、关键价位共用
+
+各环节只读取，不再各自排序或复制。
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class BarSeries:
+    """
+    单只股票的只读日线（按日期升序）
+
+    使用方式：
+        bars = BarSeries.from_frame(df)
+        close = bars.column('close')          # 只读数组
+        ma5 = bars.rolling_mean('close', 5)   # 缓存，与 df['close'].rolling(5).mean() 一致
+        today, yesterday = bars.row(-1), bars.row(-2)
+    """
+
+    __slots__ = ('_frame', '_columns', '_derived')
+
+    def __init__(self, frame: pd.DataFrame):
+        """直接包装已按日期升序、索引为 0..n-1 的 DataFrame（调用方保证有序，请优先使用 from_frame）"""
+        self._frame = frame
+        self._columns: Dict[str, np.ndarray] = {}
+        self._derived: Dict[Tuple[Any, ...], np.ndarray] = {}
+
+    @classmethod
+    def from_frame(cls, df: Optional[pd.DataFrame]) -> 'BarSeries':
+        """由日线 DataFrame 构建；已是 BarSeries 时原样返回，仅在无序时排序一次"""
+        if isinstance(df, cls):
+            return df
+        if df is None:
+            df = pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+        elif len(df) and not df['date'].is_monotonic_increasing:
+            df = df.sort_values('date', kind='mergesort').reset_index(drop=True)
+        elif not isinstance(df.index, pd.RangeIndex) or df.index.start != 0:
+            df = df.reset_index(drop=True)
+        return cls(df)
+
+    # ========== 基本属性 ==========
+
+    def __len__(self) -> int:
+        return len(self._frame)
+
+    @property
+    def empty(self) -> bool:
+        return len(self._frame) == 0
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """底层 DataFrame（只读约定：调用方不得修改）"""
+        return self._frame
+
+    def has(self, name: str) -> bool:
+        return name in self._frame.columns
+
+    # ========== 列与派生列 ==========
+
+    def column(self, name: str) -> np.ndarray:
+        """只读列数组（首次访问后缓存）"""
+        array = self._columns.get(name)
+        if array is None:
+            array = self._frame[name].to_numpy().view()
+            array.flags.writeable = False
+            self._columns[name] = array
+        return array
+
+    def rolling_mean(self, name: str, window: int) -> np.ndarray:
+        """滚动均值（不足 window 根为 NaN），按 (列, 窗口) 缓存"""
+        key = ('mean', name, window)
+        array = self._derived.get(key)
+        if array is None:
+            array = pd.Series(self.column(name)).rolling(window=window).mean().to_numpy()
+            array.flags.writeable = False
+            self._derived[key] = array
+        return array
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """第 i 根 K 线（支持负下标）的全部字段，日期为 pd.Timestamp"""
+        record = {}
+        for name in self._frame.columns:
+            value = self.column(name)[i]
+            if isinstance(value, np.datetime64):
+                value = pd.Timestamp(value)
+            record[name] = value
+        return record
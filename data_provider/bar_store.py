@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+BarStore - 日线增量缓存（复权因子感知）
+===================================
+
+问题：
+所有日线均使用 adjust="qfq" 获取，而每次分红、送转都会改写整段前复权历史，
+直接缓存 qfq K 线会在除权日之后整体失效。
+
+方案：
+1. 磁盘只保存不复权 K 线 + 每只股票的后复权因子表
+2. 读取时现算前复权视图：qfq = raw × 因子(当日) / 因子(最新K线日)
+3. 更新时只拉取最后一根 K 线之后的新数据；
+   仅当新 K 线出现除权缺口（或尚无因子表）时才刷新因子表
+
+因此缓存永远不需要整段重新拉取。
+"""
+
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from .base import DataFetchError
+from .disk_cache import write_pickle_atomic
+from .trading_calendar import TradingCalendar
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+
+class BarStore:
+    """
+    日线增量缓存
+
+    存储结构（每只股票一个 pickle 文件）：
+        {cache_dir}/bars/{code}.pkl = {
+            'bars': 不复权日线,
+            'factors': 后复权因子表 [date, hfq_factor],
+            'history_start': 已覆盖的最早请求日期,
+            'updated_at': 最近一次增量更新时间,
+        }
+
+    使用方式：
+        store = BarStore(AkshareFetcher(), cache_dir='cache')
+        df = store.get_daily_data('600519', days=30)   # 与 fetcher.get_daily_data 返回格式一致
+    """
+
+    name = "BarStore"
+
+    # 除权检测容忍度：东财不复权 pct_chg 以除权后昨收为基准，
+    # 反推昨收与上一根收盘价的相对偏差超过此值即视为发生除权除息
+    EX_RIGHTS_TOLERANCE = 5e-4
+
+    def __init__(
+        self,
+        fetcher,
+        cache_dir: str = "cache",
+        history_days: int = 365,
+        calendar: Optional[TradingCalendar] = None
+    ):
+        """
+        初始化 BarStore
+
+        Args:
+            fetcher: AkshareFetcher 实例（需提供 get_unadjusted_data / get_adjust_factors）
+            cache_dir: 缓存根目录
+            history_days: 首次建库时拉取的历史天数（自然日）
+            calendar: 交易日历（用于判断缓存是否已包含最近一个交易日，默认按工作日近似）
+        """
+        self._fetcher = fetcher
+        self._dir = Path(cache_dir) / "bars"
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self.history_days = history_days
+        self.calendar = calendar or TradingCalendar()
+        # 按股票加锁：同一只股票的更新串行（避免重复拉取、相互覆盖），不同股票的网络请求并行
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _symbol_lock(self, stock_code: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(stock_code, threading.Lock())
+
+    def supports(self, stock_code: str) -> bool:
+        """仅普通 A 股有复权因子接口，ETF/港股走原有 qfq 全量路径"""
+        from .akshare_fetcher import _is_etf_code, _is_hk_code
+        return not _is_hk_code(stock_code) and not _is_etf_code(stock_code)
+
+    def cached_codes(self) -> List[str]:
+        """已建库的股票代码"""
+        return sorted(path.stem for path in self._dir.glob("*.pkl"))
+
+    # ========== 读取 ==========
+
+    def get_daily_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: int = 30
+    ) -> pd.DataFrame:
+        """
+        获取前复权日线（先增量更新，再从缓存生成视图）
+
+        参数语义与 BaseFetcher.get_daily_data 一致，返回值包含 ma5/ma10/ma20/volume_ratio
+        """
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        if start_date is None:
+            start_dt = datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=days * 2)
+            start_date = start_dt.strftime('%Y-%m-%d')
+
+        try:
+            self.update(stock_code, start_date=start_date)
+        except Exception as e:
+            # 更新失败时退回已有缓存（可能缺少最新一根 K 线）
+            logger.warning(f"[{self.name}] {stock_code} 增量更新失败，使用已有缓存: {e}")
+
+        df = self.get_adjusted(stock_code, start_date, end_date)
+        if df.empty:
+            raise DataFetchError(f"[{self.name}] 缓存中无 {stock_code} 数据")
+
+        df = self._fetcher._calculate_indicators(df)
+        logger.info(f"[{self.name}] {stock_code} 读取成功，共 {len(df)} 条")
+        return df
+
+    def get_adjusted(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        从缓存生成前复权视图（不触发网络请求）
+
+        Returns:
+            前复权日线 DataFrame（按日期升序），无缓存时返回空 DataFrame
+        """
+        entry = self._load(stock_code)
+        if entry is None or entry['bars'].empty:
+            return pd.DataFrame()
+
+        bars = entry['bars']
+        if start_date is not None:
+            bars = bars[bars['date'] >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            bars = bars[bars['date'] <= pd.Timestamp(end_date)]
+
+        return self._apply_factors(bars, entry['factors'])
+
+    @staticmethod
+    def _apply_factors(bars: pd.DataFrame, factors: pd.DataFrame) -> pd.DataFrame:
+        """
+        按因子表生成前复权价格
+
+        以视图最后一根 K 线当日生效的因子为基准（而非因子表最后一行），
+        这样已公告但尚未到除权日的事件不会提前改变价格。
+        """
+        df = bars.reset_index(drop=True)
+        if df.empty or factors is None or factors.empty:
+            return df
+
+        f_dates = factors['date'].values
+        f_values = factors['hfq_factor'].values.astype(float)
+
+        idx = np.searchsorted(f_dates, df['date'].values, side='right') - 1
+        # 早于因子表首个事件的 K 线使用首个因子
+        bar_factors = f_values[np.clip(idx, 0, None)]
+        ratio = bar_factors / bar_factors[-1]
+
+        for col in PRICE_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].values * ratio
+        return df
+
+    # ========== 增量更新 ==========
+
+    def update(self, stock_code: str, start_date: Optional[str] = None, force: bool = False) -> int:
+        """
+        增量更新单只股票缓存
+
+        1. 首次建库：拉取 history_days 天不复权历史 + 因子表
+        2. 请求区间早于已覆盖历史：只向前补齐缺口
+        3. 日常更新：从最后一根 K 线（含，覆盖盘中未完成的 K 线）拉到今天
+        4. 新 K 线出现除权缺口时刷新因子表
+
+        Args:
+            stock_code: 股票代码
+            start_date: 需要覆盖的最早日期（可选）
+            force: 忽略新鲜度检查强制拉取
+
+        Returns:
+            新增/覆盖的 K 线数量
+        """
+        with self._symbol_lock(stock_code):
+            entry = self._load(stock_code)
+            today = datetime.now().strftime('%Y-%m-%d')
+
+            if entry is None:
+                first_start = (datetime.now() - timedelta(days=self.history_days)).strftime('%Y-%m-%d')
+                if start_date is not None and start_date < first_start:
+                    first_start = start_date
+                logger.info(f"[{self.name}] {stock_code} 首次建库: {first_start} ~ {today}")
+                bars = self._fetcher.get_unadjusted_data(stock_code, first_start, today)
+                factors = self._fetcher.get_adjust_factors(stock_code)
+                entry = {
+                    'bars': bars,
+                    'factors': factors,
+                    'history_start': first_start,
+                    'updated_at': datetime.now(),
+                }
+                self._save(stock_code, entry)
+                return len(bars)
+
+            changed = 0
+            dirty = False
+
+            # 向前补齐：请求区间早于已覆盖历史
+            if start_date is not None and start_date < entry['history_start']:
+                gap_end = (pd.Timestamp(entry['history_start']) - timedelta(days=1)).strftime('%Y-%m-%d')
+                logger.info(f"[{self.name}] {stock_code} 补齐历史: {start_date} ~ {gap_end}")
+                older = self._fetcher.get_unadjusted_data(stock_code, start_date, gap_end)
+                entry['bars'] = self._merge_bars(older, entry['bars'])
+                entry['history_start'] = start_date
+                changed += len(older)
+                dirty = True
+
+            # 向后增量
+            if force or not self._is_fresh(entry):
+                bars = entry['bars']
+                if bars.empty:
+                    fetch_start = entry['history_start']
+                else:
+                    fetch_start = bars['date'].iloc[-1].strftime('%Y-%m-%d')
+                newer = self._fetcher.get_unadjusted_data(stock_code, fetch_start, today)
+
+                if not newer.empty:
+                    merged = self._merge_bars(bars, newer)
+                    if entry['factors'].empty or self._has_ex_rights(merged, newer['date'].iloc[0]):
+                        logger.info(f"[{self.name}] {stock_code} 检测到除权除息，刷新复权因子")
+                        entry['factors'] = self._fetcher.get_adjust_factors(stock_code)
+                    entry['bars'] = merged
+                    changed += len(newer)
+                entry['updated_at'] = datetime.now()
+                dirty = True
+
+            if dirty:
+                self._save(stock_code, entry)
+            return changed
+
+    def append_snapshot(
+        self,
+        spot: pd.DataFrame,
+        day: Optional[date] = None,
+        codes: Optional[Iterable[str]] = None
+    ) -> int:
+        """
+        用全市场实时快照为已建库股票追加当日 K 线（收盘后调用，整个市场只需一次请求）
+
+        只处理缓存恰好截至上一个交易日的股票；停牌、缓存有缺口，
+        或快照昨收与缓存收盘不一致（当日除权，需刷新因子表）的股票留给 update 逐只处理。
+
+        Args:
+            spot: AkshareFetcher.get_spot_snapshot 的返回（收盘后即当日不复权 K 线）
+            day: 快照对应的交易日（默认最近一个已收盘交易日）
+            codes: 只处理这些代码（默认快照中的全部）
+
+        Returns:
+            追加了当日 K 线的股票数量
+        """
+        day = day or self.calendar.last_close().date()
+        today = pd.Timestamp(day)
+        prev_day = pd.Timestamp(self.calendar.last_trading_day(day, inclusive=False))
+        wanted = set(codes) if codes is not None else None
+
+        appended = 0
+        for row in spot.itertuples(index=False):
+            if wanted is not None and row.code not in wanted:
+                continue
+            if not (row.close > 0 and row.volume > 0 and row.prev_close > 0):
+                continue
+            with self._symbol_lock(row.code):
+                entry = self._load(row.code)
+                if entry is None or entry['bars'].empty or entry['bars']['date'].iloc[-1] != prev_day:
+                    continue
+                bars = entry['bars']
+                if abs(row.prev_close / float(bars['close'].iloc[-1]) - 1) > self.EX_RIGHTS_TOLERANCE:
+                    continue
+                bar = {
+                    'code': row.code,
+                    'date': today,
+                    'open': row.open,
+                    'high': row.high,
+                    'low': row.low,
+                    'close': row.close,
+                    'volume': row.volume,
+                    'amount': row.amount,
+                    'pct_chg': row.pct_chg,
+                }
+                new = pd.DataFrame([bar], columns=[col for col in bars.columns if col in bar])
+                entry['bars'] = self._merge_bars(bars, new)
+                entry['updated_at'] = datetime.now()
+                self._save(row.code, entry)
+                appended += 1
+        return appended
+
+    def is_current(self, stock_code: str) -> bool:
+        """缓存是否已包含最近一个交易日（无需网络请求）"""
+        entry = self._load(stock_code)
+        return entry is not None and self._is_fresh(entry)
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        """最近一次更新晚于最近一个交易日收盘，即无新数据可拉"""
+        return entry['updated_at'] >= self.calendar.last_close()
+
+    @classmethod
+    def _has_ex_rights(cls, bars: pd.DataFrame, since: pd.Timestamp) -> bool:
+        """
+        检测 since 及之后的 K 线是否发生除权除息
+
+        东财不复权数据的涨跌幅以交易所除权后昨收为基准：
+        反推昨收 = close / (1 + pct_chg / 100)，与上一根收盘价不一致即为除权日
+        """
+        if 'pct_chg' not in bars.columns or len(bars) < 2:
+            return False
+
+        close = bars['close'].values.astype(float)
+        pct_chg = bars['pct_chg'].values.astype(float)
+        implied_prev = close[1:] / (1 + pct_chg[1:] / 100)
+        prev_close = close[:-1]
+
+        mask = (bars['date'].values[1:] >= np.datetime64(since)) & (prev_close > 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            deviation = np.abs(implied_prev / prev_close - 1)
+        return bool(np.any(mask & (deviation > cls.EX_RIGHTS_TOLERANCE)))
+
+    @staticmethod
+    def _merge_bars(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+        """合并 K 线，同一日期以新数据为准"""
+        if old is None or old.empty:
+            return new.reset_index(drop=True)
+        if new is None or new.empty:
+            return old.reset_index(drop=True)
+        merged = pd.concat([old, new], ignore_index=True)
+        merged = merged.drop_duplicates(subset='date', keep='last')
+        return merged.sort_values('date', ascending=True).reset_index(drop=True)
+
+    # ========== 持久化 ==========
+
+    def _path(self, stock_code: str) -> Path:
+        return self._dir / f"{stock_code}.pkl"
+
+    def _load(self, stock_code: str) -> Optional[Dict[str, Any]]:
+        path = self._path(stock_code)
+        if not path.exists():
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            logger.warning(f"[{self.name}] 缓存文件损坏，将重建 {stock_code}: {e}")
+            return None
+
+    def _save(self, stock_code: str, entry: Dict[str, Any]) -> None:
+        """先写临时文件再原子替换，避免并发任务读到半截文件"""
+        write_pickle_atomic(self._path(stock_code), entry)
@@ -72,7 +72,7 @@ class BaseFetcher(ABC):
             raise DataFetchError(f"[{self.name}] {stock_code}: {str(e)}") from e
     
     def _clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
+        # 输入为 _normalize_data 新建的 DataFrame，原地清洗；已按日期升序时不再排序
         if 'date' in df.columns:
             df['date'] = pd.to_datetime(df['date'])
         
@@ -82,11 +82,12 @@ class BaseFetcher(ABC):
                 df[col] = pd.to_numeric(df[col], errors='coerce')
         
         df = df.dropna(subset=['close', 'volume'])
-        df = df.sort_values('date', ascending=True).reset_index(drop=True)
-        return df
+        if not df['date'].is_monotonic_increasing:
+            df = df.sort_values('date', ascending=True)
+        return df.reset_index(drop=True)
     
     def _calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
+        # 输入为 _clean_data / BarStore 生成的新 DataFrame，原地添加指标列
         df['ma5'] = df['close'].rolling(window=5, min_periods=1).mean()
         df['ma10'] = df['close'].rolling(window=10, min_periods=1).mean()
         df['ma20'] = df['close'].rolling(window=20, min_periods=1).mean()
@@ -106,8 +107,9 @@ class BaseFetcher(ABC):
 
 
 class DataFetcherManager:
-    def __init__(self, fetchers: Optional[List[BaseFetcher]] = None):
+    def __init__(self, fetchers: Optional[List[BaseFetcher]] = None, bar_store=None):
         self._fetchers: List[BaseFetcher] = []
+        self._bar_store = bar_store
         if fetchers:
             self._fetchers = sorted(fetchers, key=lambda f: f.priority)
         else:
@@ -127,6 +129,16 @@ class DataFetcherManager:
     ) -> Tuple[pd.DataFrame, str]:
         errors = []
         
+        # 优先走增量缓存，失败后退回全量 qfq 数据源
+        if self._bar_store is not None and self._bar_store.supports(stock_code):
+            try:
+                df = self._bar_store.get_daily_data(stock_code, start_date, end_date, days)
+                if df is not None and not df.empty:
+                    return df, self._bar_store.name
+            except Exception as e:
+                logger.warning(f"[{self._bar_store.name}] {stock_code} 缓存读取失败: {e}")
+                errors.append(f"[{self._bar_store.name}]: {str(e)}")
+        
         for fetcher in self._fetchers:
             try:
                 logger.info(f"尝试 [{fetcher.name}] 获取 {stock_code}...")
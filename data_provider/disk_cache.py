@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+磁盘缓存
+===================================
+
+用于跨运行、跨进程复用的小型数据（筹码分布、股票列表、交易日历等）。
+每个 key 一个 pickle 文件，写入采用"临时文件 + 原子替换"，并发任务不会读到半截文件。
+"""
+
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def write_pickle_atomic(path: Path, obj: Any) -> None:
+    """先写临时文件再原子替换"""
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    pd.to_pickle(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class DiskCache:
+    """
+    带过期判断的磁盘缓存
+
+    使用方式：
+        cache = DiskCache('cache', 'chip')
+        cache.set('600519', chip)
+        chip = cache.get('600519', fresh_after=calendar.last_close())
+    """
+
+    def __init__(self, cache_dir: str, namespace: str):
+        self._dir = Path(cache_dir) / namespace
+        self._dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        safe_key = re.sub(r'[^0-9A-Za-z_.-]', '_', key)
+        return self._dir / f"{safe_key}.pkl"
+
+    def get(
+        self,
+        key: str,
+        max_age: Optional[timedelta] = None,
+        fresh_after: Optional[datetime] = None
+    ) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+            max_age: 最大缓存时长
+            fresh_after: 写入时间须晚于该时刻（如最近一次收盘）
+
+        Returns:
+            缓存值，不存在或已过期返回 None
+        """
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            entry = pd.read_pickle(path)
+        except Exception as e:
+            logger.debug(f"[DiskCache] 读取 {path} 失败: {e}")
+            return None
+
+        saved_at = entry.get('saved_at')
+        if max_age is not None and saved_at < datetime.now() - max_age:
+            return None
+        if fresh_after is not None and saved_at < fresh_after:
+            return None
+        return entry.get('value')
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            write_pickle_atomic(self._path(key), {'saved_at': datetime.now(), 'value': value})
+        except Exception as e:
+            logger.warning(f"[DiskCache] 写入 {key} 失败: {e}")
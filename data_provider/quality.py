@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+日线数据质量检查
+===================================
+
+在 _clean_data 之后对整段日线做一次向量化检查：
+1. 数据过期：最后一根 K 线落后最近交易日（长期停牌、退市、数据源未更新）
+2. 停牌：最新 K 线零成交（含末尾连续零成交天数）
+3. 缺口：区间内缺失的交易日
+4. 非法值：价格非正、最高价低于最低价、收盘价越界、成交量为负、涨跌幅异常
+   （港股无涨跌幅限制、A 股新股上市初期不设限，这两种情况不检查涨跌幅）
+
+停牌、过期或最新 K 线非法的股票没有分析价值，调用方据此跳过
+实时行情、筹码、新闻搜索和大模型调用，节省 Token 与搜索额度。
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, List
+
+import numpy as np
+import pandas as pd
+
+from .akshare_fetcher import _is_hk_code
+from .trading_calendar import TradingCalendar
+
+logger = logging.getLogger(__name__)
+
+# 允许最后一根 K 线落后的交易日数（数据源偶有一天延迟）
+STALE_TOLERANCE_DAYS = 1
+
+# A 股单日涨跌幅上限（北交所 30%，留出余量）
+MAX_ABS_PCT_CHG = 35.0
+
+# A 股新股上市后不设涨跌幅限制的交易日数（科创板、创业板、主板注册制均为前 5 日）
+IPO_NO_LIMIT_DAYS = 5
+
+# 收盘价越界容忍度（复权计算的浮点误差）
+PRICE_EPSILON = 1e-6
+
+
+@dataclass
+class DataQualityReport:
+    """数据质量检查结果"""
+    code: str
+    last_date: str = ""
+    total_bars: int = 0
+
+    stale_days: int = 0              # 最后一根 K 线落后最近交易日的天数
+    is_stale: bool = False
+    is_suspended: bool = False       # 最新 K 线零成交
+    zero_volume_days: int = 0        # 末尾连续零成交天数
+    gap_count: int = 0               # 区间内缺失的交易日数量
+    invalid_rows: int = 0            # 含非法值的 K 线数量
+    last_bar_invalid: bool = False   # 最新 K 线本身含非法值
+
+    issues: List[str] = field(default_factory=list)
+
+    @property
+    def valid_bars(self) -> int:
+        return self.total_bars - self.invalid_rows
+
+    @property
+    def should_skip(self) -> bool:
+        """是否没有分析价值（跳过下游耗时环节）"""
+        return self.is_stale or self.is_suspended or self.last_bar_invalid or self.valid_bars <= 0
+
+    def summary(self) -> str:
+        return "；".join(self.issues) if self.issues else "数据正常"
+
+
+def check_data_quality(
+    df: pd.DataFrame,
+    code: str,
+    calendar: Optional[TradingCalendar] = None,
+    now: Optional[datetime] = None
+) -> DataQualityReport:
+    """
+    检查日线数据质量
+
+    Args:
+        df: 清洗后的日线（date/open/high/low/close/volume，可含 pct_chg）
+        code: 股票代码
+        calendar: 交易日历（默认按工作日近似）
+        now: 检查时刻（默认当前时间）
+
+    Returns:
+        DataQualityReport
+    """
+    report = DataQualityReport(code=code)
+    if df is None or df.empty:
+        report.is_stale = True
+        report.issues.append("无日线数据")
+        return report
+
+    calendar = calendar or TradingCalendar()
+    dates = pd.to_datetime(df['date']).values.astype('datetime64[D]')
+    report.total_bars = len(df)
+    last_date = dates.max()
+    report.last_date = str(last_date)
+
+    # 1. 数据过期：以最近一次已收盘的交易日为基准（盘中运行不要求当日 K 线）
+    expected = calendar.last_close(now).date()
+    report.stale_days = calendar.count_trading_days(last_date, expected)
+    # 日历获取失败或超出覆盖范围时按工作日近似，节假日也会计为落后（如国庆后首个交易日落后 5 天），只提示不跳过
+    calendar_reliable = calendar.covers(last_date) and calendar.covers(expected)
+    if report.stale_days > STALE_TOLERANCE_DAYS and not calendar_reliable:
+        report.issues.append(f"最新K线 {report.last_date} 按工作日计落后 {report.stale_days} 天（交易日历不可用，可能为节假日）")
+    elif report.stale_days > STALE_TOLERANCE_DAYS:
+        report.is_stale = True
+        report.issues.append(f"最新K线 {report.last_date} 已落后 {report.stale_days} 个交易日（疑似长期停牌）")
+    elif report.stale_days > 0:
+        report.issues.append(f"最新K线 {report.last_date} 落后 {report.stale_days} 个交易日")
+
+    # 2. 停牌：末尾连续零成交
+    volume = df['volume'].values.astype(float)
+    nonzero = np.flatnonzero(volume > 0)
+    report.zero_volume_days = len(volume) - (nonzero[-1] + 1) if len(nonzero) else len(volume)
+    if report.zero_volume_days > 0:
+        report.is_suspended = True
+        report.issues.append(f"最近 {report.zero_volume_days} 个交易日零成交（停牌）")
+
+    # 3. 缺口：区间内应有交易日与实际 K 线对比
+    expected_days = len(calendar.trading_days(dates.min(), last_date))
+    report.gap_count = max(expected_days - len(np.unique(dates)), 0)
+    if report.gap_count > 0:
+        report.issues.append(f"区间内缺失 {report.gap_count} 个交易日")
+
+    # 4. 非法值
+    open_ = df['open'].values.astype(float)
+    high = df['high'].values.astype(float)
+    low = df['low'].values.astype(float)
+    close = df['close'].values.astype(float)
+    with np.errstate(invalid='ignore'):
+        invalid = (
+            ~(close > 0) | ~(open_ > 0) | ~(low > 0)
+            | (high < low)
+            | (close > high * (1 + PRICE_EPSILON)) | (close < low * (1 - PRICE_EPSILON))
+            | (volume < 0)
+        )
+        if 'pct_chg' in df.columns and not _is_hk_code(code):
+            pct_chg = df['pct_chg'].values.astype(float)
+            abnormal_pct = np.abs(pct_chg) > MAX_ABS_PCT_CHG
+            # 最早的几根 K 线可能处于新股上市初期（不设涨跌幅限制），不计入；
+            # 历史数据不足 IPO_NO_LIMIT_DAYS 根时最新 K 线也在此列，次新股不会被误判跳过
+            abnormal_pct[np.argsort(dates, kind='stable')[:IPO_NO_LIMIT_DAYS]] = False
+            invalid |= abnormal_pct
+    report.invalid_rows = int(invalid.sum())
+    report.last_bar_invalid = bool(invalid[np.argmax(dates)])
+    if report.invalid_rows > 0:
+        report.issues.append(f"{report.invalid_rows} 根K线存在非法价格/成交量")
+    if report.last_bar_invalid:
+        report.issues.append("最新K线数据非法")
+
+    return report
+
+
+if __name__ == "__main__":
+    # 测试代码：港股大涨、科创板新股上市第 3 日大涨都不应判为非法
+    calendar = TradingCalendar()
+    now = datetime(2026, 1, 9, 16, 0)
+
+    def bars(days: int, pct_chg: float) -> pd.DataFrame:
+        df = pd.DataFrame({
+            'date': calendar.trading_days(np.datetime64('2025-12-01'), np.datetime64('2026-01-09'))[-days:],
+            'open': 10.0, 'high': 14.5, 'low': 9.5, 'close': 14.0, 'volume': 1e6,
+        })
+        df['pct_chg'] = 0.0
+        df.loc[df.index[-1], 'pct_chg'] = pct_chg
+        return df
+
+    hk = check_data_quality(bars(30, 40.0), '00700', calendar=calendar, now=now)
+    star_ipo = check_data_quality(bars(3, 45.0), '688999', calendar=calendar, now=now)
+    main_board = check_data_quality(bars(30, 40.0), '600519', calendar=calendar, now=now)
+    for report in (hk, star_ipo, main_board):
+        print(f"{report.code}: should_skip={report.should_skip} {report.summary()}")
+    assert not hk.last_bar_invalid and not hk.should_skip
+    assert not star_ipo.last_bar_invalid and not star_ipo.should_skip
+    assert main_board.last_bar_invalid and main_board.should_skip
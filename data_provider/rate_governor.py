@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+RateGovernor - 主机级请求节流
+===================================
+
+问题：
+原先每个 AkshareFetcher 实例各自记录 _last_request_time，
+同一次运行里有多个 fetcher 实例，青龙面板又可能并发运行多个任务，
+各自节流叠加在一起仍会触发东方财富的反爬封禁。
+
+方案：
+所有实例、线程、进程共享同一个状态文件（记录下一次允许请求的时间），
+通过 fcntl.flock 独占锁"预约"请求时间片，拿到时间片后释放锁再休眠，
+因此等待中的进程不会互相阻塞，整台主机对东财的请求间隔始终满足下限。
+"""
+
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows 无 fcntl，退化为进程内节流
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class RateGovernor:
+    """
+    跨进程请求节流器
+
+    使用方式：
+        governor = get_rate_governor('eastmoney')
+        governor.acquire(2.0, 5.0)   # 阻塞直到拿到时间片
+        ak.stock_zh_a_hist(...)
+    """
+
+    def __init__(
+        self,
+        name: str = "eastmoney",
+        state_dir: Optional[str] = None,
+        min_interval: float = 2.0,
+        max_interval: float = 5.0
+    ):
+        """
+        Args:
+            name: 节流对象名称（同名共享同一预算）
+            state_dir: 状态文件目录，默认 $RATE_GOVERNOR_DIR 或系统临时目录
+            min_interval: 两次请求之间的最小间隔（秒）
+            max_interval: 两次请求之间的最大间隔（秒），实际间隔在两者之间随机
+        """
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        state_dir = state_dir or os.environ.get('RATE_GOVERNOR_DIR') or \
+            os.path.join(tempfile.gettempdir(), 'stock_analysis_rate_governor')
+        Path(state_dir).mkdir(parents=True, exist_ok=True)
+        self._path = Path(state_dir) / f"{name}.state"
+
+        self._thread_lock = threading.Lock()
+        self._local_next_allowed = 0.0
+
+        if fcntl is None:
+            logger.warning(f"[RateGovernor] 当前平台不支持 fcntl，{name} 仅在进程内节流")
+
+    def acquire(self, min_interval: Optional[float] = None, max_interval: Optional[float] = None) -> float:
+        """
+        预约下一个请求时间片并等待到达
+
+        Args:
+            min_interval: 本次预约后与下一次请求的最小间隔（默认使用实例配置）
+            max_interval: 本次预约后与下一次请求的最大间隔
+
+        Returns:
+            实际等待的秒数
+        """
+        min_interval = self.min_interval if min_interval is None else min_interval
+        max_interval = self.max_interval if max_interval is None else max_interval
+        interval = random.uniform(min_interval, max(min_interval, max_interval))
+
+        with self._thread_lock:
+            if fcntl is None:
+                slot = max(time.time(), self._local_next_allowed)
+                self._local_next_allowed = slot + interval
+            else:
+                slot = self._reserve(interval)
+
+        wait = slot - time.time()
+        if wait > 0:
+            logger.debug(f"[RateGovernor] {self.name} 等待 {wait:.2f} 秒")
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+    def _reserve(self, interval: float) -> float:
+        """在文件锁保护下读取并推进 next_allowed，返回本次请求的时间片"""
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                raw = os.read(fd, 64).decode('ascii', errors='ignore').strip()
+                try:
+                    next_allowed = float(raw) if raw else 0.0
+                except ValueError:
+                    next_allowed = 0.0
+
+                now = time.time()
+                # 状态文件异常（如系统时间回拨）时不让请求无限期等待
+                if next_allowed - now > self.max_interval * 100:
+                    next_allowed = now
+
+                slot = max(now, next_allowed)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, f"{slot + interval:.6f}".encode('ascii'))
+                return slot
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+_governors: Dict[str, RateGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+def get_rate_governor(name: str = "eastmoney") -> RateGovernor:
+    """获取指定名称的共享节流器（进程内单例，进程间通过状态文件共享）"""
+    with _governors_lock:
+        if name not in _governors:
+            _governors[name] = RateGovernor(name)
+        return _governors[name]
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+A 股交易日历
+===================================
+
+数据来源：ak.tool_trade_date_hist_sina()（由 AkshareFetcher.get_trade_calendar 获取并缓存）
+未获取到日历时退化为"周一至周五均为交易日"。
+"""
+
+import logging
+from datetime import datetime, date
+from typing import Optional, Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DateLike = Union[date, datetime, str, np.datetime64, pd.Timestamp]
+
+# A 股收盘时间
+MARKET_CLOSE_HOUR = 15
+
+
+def _to_day(value: DateLike) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+class TradingCalendar:
+    """
+    交易日历
+
+    使用方式：
+        calendar = fetcher.get_trade_calendar()
+        calendar.last_trading_day(date.today())
+        calendar.count_trading_days('2026-01-05', '2026-01-09')
+    """
+
+    def __init__(self, trade_dates: Optional[Iterable[DateLike]] = None):
+        """
+        Args:
+            trade_dates: 交易日列表，None 表示使用工作日近似
+        """
+        if trade_dates is None:
+            self._dates = None
+        else:
+            self._dates = np.unique(np.array([_to_day(d) for d in trade_dates], dtype='datetime64[D]'))
+
+    @property
+    def is_fallback(self) -> bool:
+        """是否为工作日近似日历"""
+        return self._dates is None
+
+    def covers(self, day: DateLike) -> bool:
+        """日历数据是否覆盖该日期（新浪日历只包含到当年年底）"""
+        if self._dates is None or len(self._dates) == 0:
+            return False
+        d = _to_day(day)
+        return self._dates[0] <= d <= self._dates[-1]
+
+    def is_trading_day(self, day: DateLike) -> bool:
+        d = _to_day(day)
+        if not self.covers(d):
+            return bool(np.is_busday(d))
+        idx = np.searchsorted(self._dates, d)
+        return idx < len(self._dates) and self._dates[idx] == d
+
+    def last_trading_day(self, as_of: DateLike, inclusive: bool = True) -> date:
+        """返回 as_of 当日（inclusive=True）或之前最近的交易日"""
+        d = _to_day(as_of)
+        if not inclusive:
+            d = d - np.timedelta64(1, 'D')
+        if not self.covers(d):
+            return pd.Timestamp(np.busday_offset(d, 0, roll='backward')).date()
+        idx = np.searchsorted(self._dates, d, side='right') - 1
+        return pd.Timestamp(self._dates[max(idx, 0)]).date()
+
+    def last_close(self, now: Optional[datetime] = None) -> datetime:
+        """最近一个已收盘交易日的收盘时刻"""
+        now = now or datetime.now()
+        today_close = now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0)
+        inclusive = now >= today_close
+        day = self.last_trading_day(now.date(), inclusive=inclusive)
+        return datetime.combine(day, today_close.time())
+
+    def count_trading_days(self, start: DateLike, end: DateLike) -> int:
+        """(start, end] 区间内的交易日数量"""
+        s, e = _to_day(start), _to_day(end)
+        if e <= s:
+            return 0
+        if not (self.covers(s) and self.covers(e)):
+            return int(np.busday_count(s + np.timedelta64(1, 'D'), e + np.timedelta64(1, 'D')))
+        return int(np.searchsorted(self._dates, e, side='right') - np.searchsorted(self._dates, s, side='right'))
+
+    def trading_days(self, start: DateLike, end: DateLike) -> np.ndarray:
+        """[start, end] 区间内的交易日（datetime64[D] 数组）"""
+        s, e = _to_day(start), _to_day(end)
+        if not (self.covers(s) and self.covers(e)):
+            days = np.arange(s, e + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+            return days[np.is_busday(days)]
+        lo = np.searchsorted(self._dates, s, side='left')
+        hi = np.searchsorted(self._dates, e, side='right')
+        return self._dates[lo:hi]
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+大模型输出的容错 JSON 提取
+===================================
+
+原先的做法：去掉代码块标记 → 截取第一个 { 到最后一个 } → 多轮正则修补
+（删注释、删尾随逗号、全局把 True 替换成 true）→ json.loads。
+问题：
+1. 全局替换会改坏字符串内容（如 "True Value"、英文新闻标题）
+2. 删注释的正则不认字符串，会截断 URL 中的 //
+3. 响应被 max_tokens 截断时没有收尾，整段解析失败
+
+extract_json 用一个状态机单遍扫描，边扫描边输出规范 JSON，最后只调用一次 json.loads：
+- 从第一个 {（或 [）开始，到与之匹配的括号结束，前后的说明文字、代码块标记忽略
+- 字符串外的 // 与 /* */ 注释跳过，字符串内原样保留
+- 尾随逗号、重复逗号删除，缺失的逗号 / 冒号补齐
+- Python 字面量 True/False/None、单引号字符串、未加引号的键转为 JSON
+- 字符串内的裸换行、制表符转义
+- 末尾被截断时：未闭合的字符串值保留已收到的部分，悬空的键、不完整的数字/字面量丢弃，
+  再按嵌套顺序补齐右括号
+"""
+
+import json
+import re
+from typing import Any, List
+
+# 字符串外的词法单元：空白、注释、数字、标识符、其他单个字符
+_TOKEN = re.compile(
+    r'(?P<ws>\s+)'
+    r'|(?P<comment>//[^\n]*|#[^\n]*|/\*.*?(?:\*/|\Z))'
+    r'|(?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+    r'|(?P<word>[A-Za-z_][A-Za-z0-9_]*)'
+    r'|(?P<char>.)',
+    re.S,
+)
+# 字符串内需要特殊处理的字符（其余字符整段复制）
+_STRING_SPECIAL = {
+    '"': re.compile(r'["\\\n\r\t]'),
+    "'": re.compile(r'[\'"\\\n\r\t]'),
+}
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+_JSON_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?\Z')
+_LITERALS = {
+    'true': 'true', 'True': 'true', 'TRUE': 'true',
+    'false': 'false', 'False': 'false', 'FALSE': 'false',
+    'null': 'null', 'None': 'null', 'NULL': 'null', 'NaN': 'null', 'Infinity': 'null',
+}
+
+# 容器内的状态：对象 key → colon → value → comma；数组 value → comma
+_KEY, _COLON, _VALUE, _COMMA = 'key', 'colon', 'value', 'comma'
+
+
+def _normalize_number(raw: str):
+    """规范化数字（+5、.5、5.、01 等），无法成为合法 JSON 数字时返回 None"""
+    text = raw.lstrip('+')
+    if _JSON_NUMBER.match(text):
+        return text
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    if value != value or value in (float('inf'), float('-inf')):
+        return None
+    if value.is_integer() and not any(c in text for c in '.eE'):
+        return str(int(value))      # 01 → 1
+    return repr(value)              # 5. → 5.0
+
+
+def repair_json(text: str, start: str = '{[') -> str:
+    """
+    单遍扫描，把大模型输出中的第一个 JSON 对象 / 数组整理为合法 JSON 文本
+
+    Args:
+        text: 原始响应
+        start: 允许作为起点的括号（'{' 只找对象，'[' 只找数组，'{[' 取先出现者）
+
+    Returns:
+        可直接 json.loads 的文本
+
+    Raises:
+        ValueError: 文本中没有指定的起始括号
+    """
+    begin = min((i for i in (text.find(c) for c in start) if i >= 0), default=-1)
+    if begin < 0:
+        raise ValueError("响应中没有 JSON 对象")
+
+    out: List[str] = []
+    stack: List[List[str]] = []   # [括号, 状态]
+    safe = 0                      # 截断时可回退到的输出长度（完整值之后 / 左括号之后）
+    pending_comma = False
+    pos, n = begin, len(text)
+
+    def before_value() -> bool:
+        """放置一个值之前：补齐缺失的冒号 / 逗号；当前位置不能放值时返回 False"""
+        nonlocal pending_comma
+        frame = stack[-1]
+        if frame[0] == '{':
+            if frame[1] == _COLON:
+                out.append(':')
+            elif frame[1] != _VALUE:
+                return False
+        elif frame[1] == _COMMA:
+            out.append(',')
+        elif pending_comma:
+            out.append(',')
+        pending_comma = False
+        return True
+
+    def after_value() -> None:
+        nonlocal safe
+        if stack:
+            stack[-1][1] = _COMMA
+        safe = len(out)
+
+    def emit_key(key_json: str) -> None:
+        nonlocal pending_comma
+        frame = stack[-1]
+        if frame[1] == _COMMA or pending_comma:
+            out.append(',')
+        pending_comma = False
+        out.append(key_json)
+        frame[1] = _COLON
+
+    while pos < n:
+        ch = text[pos]
+
+        # ---------- 字符串 ----------
+        if ch == '"' or ch == "'":
+            quote = ch
+            is_key = bool(stack) and stack[-1][0] == '{' and stack[-1][1] in (_KEY, _COMMA)
+            piece = ['"']
+            pos += 1
+            special = _STRING_SPECIAL[quote]
+            closed = False
+            while pos < n:
+                m = special.search(text, pos)
+                if m is None:
+                    piece.append(text[pos:])
+                    pos = n
+                    break
+                piece.append(text[pos:m.start()])
+                c = m.group()
+                pos = m.end()
+                if c == quote:
+                    closed = True
+                    break
+                if c == '\\':
+                    if pos >= n:
+                        break
+                    nxt = text[pos]
+                    piece.append("'" if (nxt == "'" and quote == "'") else '\\' + nxt)
+                    pos += 1
+                elif c == '"':
+                    piece.append('\\"')      # 单引号字符串中的双引号
+                else:
+                    piece.append(_CONTROL_ESCAPES[c])
+            piece.append('"')
+            value = ''.join(piece)
+            if not stack:
+                break
+            if is_key:
+                if not closed:
+                    break                    # 键被截断：丢弃
+                emit_key(value)
+            elif before_value():
+                out.append(value)
+                after_value()
+            if not closed:
+                break
+            continue
+
+        m = _TOKEN.match(text, pos)
+        kind, token = m.lastgroup, m.group()
+        pos = m.end()
+
+        if kind in ('ws', 'comment'):
+            continue
+
+        if kind == 'char' and token in '{[':
+            if stack and not before_value():
+                continue
+            out.append(token)
+            stack.append([token, _KEY if token == '{' else _VALUE])
+            safe = len(out)
+            continue
+
+        if kind == 'char' and token in '}]':
+            if not stack:
+                break
+            frame = stack.pop()
+            if frame[1] in (_COLON, _VALUE) and frame[0] == '{':
+                del out[safe:]               # 悬空的键（"k": } 或 "k" }）
+            pending_comma = False
+            out.append('}' if frame[0] == '{' else ']')
+            if not stack:
+                return ''.join(out)
+            after_value()
+            continue
+
+        if not stack:
+            continue
+        frame = stack[-1]
+
+        if kind == 'char':
+            if token == ',':
+                if frame[1] == _COMMA:
+                    pending_comma = True
+                    frame[1] = _KEY if frame[0] == '{' else _VALUE
+            elif token == ':' and frame[1] == _COLON:
+                out.append(':')
+                frame[1] = _VALUE
+            continue
+
+        if kind == 'word' and frame[0] == '{' and frame[1] in (_KEY, _COMMA):
+            emit_key(json.dumps(token))     # 未加引号的键
+            continue
+
+        if kind == 'number' or kind == 'word':
+            if kind == 'number':
+                literal = _normalize_number(token)
+            else:
+                literal = _LITERALS.get(token)
+                if literal is None:
+                    literal = json.dumps(token)   # 未加引号的字符串值
+            # 末尾被截断的数字（72 截成 7）与未加引号的词都可能不完整，丢弃
+            at_end = pos >= n
+            if literal is None or (at_end and (kind == 'number' or token not in _LITERALS)):
+                continue
+            if before_value():
+                out.append(literal)
+                after_value()
+
+    # ---------- 截断收尾 ----------
+    if not stack:
+        return ''.join(out)
+    del out[safe:]
+    while stack:
+        out.append('}' if stack.pop()[0] == '{' else ']')
+    return ''.join(out)
+
+
+_decoder = json.JSONDecoder(parse_constant=lambda _: None)  # NaN/Infinity 与修补路径一致，记为 null
+
+
+def extract_json(text: str, start: str = '{[') -> Any:
+    """
+    从大模型输出中提取第一个 JSON 对象 / 数组
+
+    快速路径：从起始括号处直接 raw_decode，格式正确的响应（绝大多数）只解析一次、
+    不做任何修补；失败时再走 repair_json 单遍修补。
+
+    Raises:
+        ValueError: 没有找到 JSON，或整理后仍无法解析（json.JSONDecodeError 是其子类）
+    """
+    begin = min((i for i in (text.find(c) for c in start) if i >= 0), default=-1)
+    if begin >= 0:
+        try:
+            return _decoder.raw_decode(text, begin)[0]
+        except ValueError:
+            pass
+    return json.loads(repair_json(text, start))
+
+
+# ===================== 基准与容错语料 =====================
+
+def _legacy_extract(text: str) -> Any:
+    """原 _parse_response 的做法（用于基准对比）"""
+    cleaned = text.replace('```json', '').replace('```', '')
+    s, e = cleaned.find('{'), cleaned.rfind('}') + 1
+    json_str = cleaned[s:e]
+    json_str = re.sub(r'//.*?\n', '\n', json_str)
+    json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
+    json_str = re.sub(r',\s*}', '}', json_str)
+    json_str = re.sub(r',\s*]', ']', json_str)
+    json_str = json_str.replace('True', 'true').replace('False', 'false')
+    return json.loads(json_str)
+
+
+# (原始响应, 期望结果)：来自模型实际输出中常见的畸形形式
+MALFORMED_CORPUS = [
+    ('```json\n{"a": 1}\n```\n以上为分析结果。', {'a': 1}),
+    ('好的，以下是决策仪表盘：\n{"a": 1, "b": [1, 2,],}', {'a': 1, 'b': [1, 2]}),
+    ('{"is_bullish": True, "x": None, "y": False}', {'is_bullish': True, 'x': None, 'y': False}),
+    ('{"title": "True Value 与 False Alarm"}', {'title': 'True Value 与 False Alarm'}),
+    ('{"url": "https://example.com/a", // 注释\n "b": 2 /* 块注释 */}', {'url': 'https://example.com/a', 'b': 2}),
+    ("{'code': '600519', 'note': 'it\\'s \"ok\"'}", {'code': '600519', 'note': 'it\'s "ok"'}),
+    ('{"summary": "第一行\n第二行\t缩进"}', {'summary': '第一行\n第二行\t缩进'}),
+    ('{sentiment_score: 72, operation_advice: "买入"}', {'sentiment_score': 72, 'operation_advice': '买入'}),
+    ('{"a": 1 "b": 2}', {'a': 1, 'b': 2}),
+    ('{"a" 1, "b": +5, "c": .5}', {'a': 1, 'b': 5, 'c': 0.5}),
+    ('{"a": {"b": [1, 2, {"c": "未完', {'a': {'b': [1, 2, {'c': '未完'}]}}),
+    ('{"a": 1, "b": ', {'a': 1}),
+    ('{"a": 1, "b"', {'a': 1}),
+    ('{"a": 1, "b": tr', {'a': 1}),
+    ('{"a": [1, 2', {'a': [1]}),
+    ('{"a": [1, 2 ', {'a': [1, 2]}),
+    ('{"operation_advice": "买入", "sentiment_score": 7', {'operation_advice': '买入'}),
+    ('{"a": "x\\', {'a': 'x'}),
+    ('{"a": 1,, "b": 2}', {'a': 1, 'b': 2}),
+    ('{"a": 1}{"b": 2}', {'a': 1}),
+    ('[{"code": "600519"}, {"code": "000001"},]', [{'code': '600519'}, {'code': '000001'}]),
+    ('{"a": "}", "b": "{"}', {'a': '}', 'b': '{'}),
+    ('{"a": NaN, "b": -0.0, "c": 1e3}', {'a': None, 'b': -0.0, 'c': 1000.0}),
+]
+
+
+def _fuzz(rounds: int = 2000, seed: int = 7) -> int:
+    """随机结构 + 畸形改写 + 随机截断：改写后结果必须一致，截断后不得抛出未处理的异常"""
+    import random
+    rng = random.Random(seed)
+    words = ['看多', 'True', 'a,b', '}{', '// x', "it's", '"q"', '', 'https://x.cn/a']
+
+    def rand_value(depth: int = 0):
+        r = rng.random()
+        if depth > 3 or r < 0.4:
+            return rng.choice([rng.randint(-100, 100), rng.random(), True, False, None, rng.choice(words)])
+        if r < 0.7:
+            return [rand_value(depth + 1) for _ in range(rng.randint(0, 4))]
+        return {f"k{i}": rand_value(depth + 1) for i in range(rng.randint(0, 4))}
+
+    checked = 0
+    for _ in range(rounds):
+        obj = {f"f{i}": rand_value() for i in range(rng.randint(1, 5))}
+        text = json.dumps(obj, ensure_ascii=False)
+        for variant in (f"```json\n{text}\n```", f"前言 {text} 后记", json.dumps(obj, ensure_ascii=False, indent=2)):
+            assert extract_json(variant) == obj, variant
+            checked += 1
+        cut = text[:rng.randint(1, len(text))]
+        result = extract_json(cut)
+        assert isinstance(result, dict), cut
+        # 截断后保留下来的顶层数值必须与原值一致（不能把 72 截成 7）
+        for key, value in result.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                assert value == obj[key], cut
+        checked += 1
+    return checked
+
+
+if __name__ == "__main__":
+    import timeit
+
+    failures = 0
+    for raw, expected in MALFORMED_CORPUS:
+        try:
+            got = extract_json(raw)
+        except ValueError as e:
+            got = f"<{e}>"
+        if got != expected:
+            failures += 1
+            print(f"❌ {raw!r}\n   期望 {expected!r}\n   实际 {got!r}")
+    print(f"畸形语料: {len(MALFORMED_CORPUS) - failures}/{len(MALFORMED_CORPUS)} 通过")
+
+    legacy_ok = 0
+    for raw, expected in MALFORMED_CORPUS:
+        try:
+            legacy_ok += _legacy_extract(raw) == expected
+        except Exception:
+            pass
+    print(f"原正则修补方式: {legacy_ok}/{len(MALFORMED_CORPUS)} 通过")
+
+    print(f"随机模糊测试: {_fuzz()} 个用例通过")
+
+    # 基准：约 8KB 的典型决策仪表盘响应
+    sample_obj = {
+        'sentiment_score': 72, 'operation_advice': '买入',
+        'dashboard': {'core_conclusion': {'one_sentence': '回踩 MA5 低吸' * 5},
+                      'battle_plan': {'action_checklist': ['✅ 检查项：多头排列'] * 5}},
+        **{f'field_{i}': '走势分析内容，均线多头排列，量能温和放大。' * 8 for i in range(20)},
+    }
+    sample = "```json\n" + json.dumps(sample_obj, ensure_ascii=False, indent=2) + "\n```"
+    number = 500
+    broken = sample.replace('"买入"', '"买入",', 1).replace('\n```', '')[:-200]
+    t_new = timeit.timeit(lambda: extract_json(sample), number=number) / number
+    t_fix = timeit.timeit(lambda: extract_json(broken), number=number) / number
+    t_old = timeit.timeit(lambda: _legacy_extract(sample), number=number) / number
+    t_raw = timeit.timeit(lambda: json.loads(sample[8:-4]), number=number) / number
+    print(f"基准 ({len(sample)} 字符): extract_json {t_new * 1e3:.3f} ms, "
+          f"原正则修补 {t_old * 1e3:.3f} ms, 纯 json.loads {t_raw * 1e3:.3f} ms, "
+          f"畸形且截断时 extract_json {t_fix * 1e3:.3f} ms")
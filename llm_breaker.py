@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+大模型端点熔断器
+===================================
+
+每只股票独立重试时，服务商已经宕机或 Key 已失效的信息不会在股票之间传递，
+后面的每只股票都要重新经历一遍超时与退避。
+
+CircuitBreaker 按"服务商:模型"在进程内共享（与 LLMRateLimiter 相同的注册方式）：
+1. 关闭：正常放行；连续 failure_threshold 次可重试错误后打开
+2. 打开：直接拒绝（抛出 CircuitOpenError），不发请求；冷却时间到后进入半开
+   - 服务商给出 Retry-After 时按其时间打开
+   - 鉴权 / 余额错误打开该服务商下的所有端点，模型不存在打开该模型，直到运行结束
+3. 半开：只放行一个探测请求，成功则关闭，失败则重新打开（有 Retry-After 时按其时间，否则冷却时间加倍，上限 10 分钟）
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from llm_errors import SCOPE_MODEL, SCOPE_PROVIDER, ErrorInfo
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """端点已熔断，本次请求未发出"""
+
+    def __init__(self, message: str, retry_in: float):
+        super().__init__(message)
+        self.retry_in = retry_in   # 距离可再次请求的秒数（inf 表示本次运行内不再请求）
+
+
+class CircuitBreaker:
+    """
+    单个端点的熔断器（线程安全）
+
+    使用方式：
+        breaker = get_circuit_breaker('gemini', 'gemini-2.5-flash')
+        breaker.before_call()            # 已熔断时抛出 CircuitOpenError
+        try:
+            text = call_llm(prompt)
+        except Exception as e:
+            breaker.record_failure(classify_error(e))
+            raise
+        breaker.record_success()
+    """
+
+    MAX_COOLDOWN = 600.0
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.reason = ''
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._current_cooldown = cooldown
+        self._open_until = 0.0
+        self._probing = False
+
+    def before_call(self) -> None:
+        """请求前检查；打开状态（或半开时已有探测请求在途）抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == OPEN and now >= self._open_until:
+                self.state = HALF_OPEN
+                self._probing = False
+                logger.info(f"[熔断] {self.name} 冷却结束，放行一次探测请求")
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            remaining = max(self._open_until - now, 0.0)
+            detail = "本次运行不再请求" if remaining == float('inf') else f"约 {remaining:.0f} 秒后重试"
+            raise CircuitOpenError(f"{self.name} 已熔断（{self.reason}），{detail}", remaining)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"[熔断] {self.name} 探测成功，恢复正常")
+            self.state = CLOSED
+            self._failures = 0
+            self._current_cooldown = self.cooldown
+            self._probing = False
+
+    def record_failure(self, info: ErrorInfo) -> None:
+        """登记一次失败（仅影响本次请求的错误，如参数错误、内容拦截，不计入）"""
+        if not info.retryable:
+            if info.scope in (SCOPE_MODEL, SCOPE_PROVIDER):
+                self.trip(str(info))
+            else:
+                # 端点有正常应答，只是本次请求本身有问题
+                self.release(reachable=True)
+            return
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN and not info.retry_after:
+                self._current_cooldown = min(self._current_cooldown * 2, self.MAX_COOLDOWN)
+                self._open(self._current_cooldown, f"探测失败: {info}")
+            elif info.retry_after and (info.reason == 'rate_limit' or self.state == HALF_OPEN):
+                # 服务商明确给出等待时间：这段时间内所有股票都不必再试
+                self._open(info.retry_after, str(info))
+            elif self._failures >= self.failure_threshold:
+                self._open(self._current_cooldown, f"连续 {self._failures} 次失败: {info}")
+
+    def release(self, reachable: bool = False) -> None:
+        """请求没有得到可判断的结果（如被取消）时交还探测名额；reachable 时视为探测成功"""
+        with self._lock:
+            if self.state != HALF_OPEN:
+                return
+            self._probing = False
+        if reachable:
+            self.record_success()
+
+    def trip(self, reason: str) -> None:
+        """永久打开（本次运行内不再请求）"""
+        with self._lock:
+            self._open(float('inf'), reason)
+
+    def _open(self, seconds: float, reason: str) -> None:
+        self.state = OPEN
+        self.reason = reason
+        self._probing = False
+        self._open_until = time.monotonic() + seconds
+        if seconds == float('inf'):
+            logger.warning(f"[熔断] {self.name} 已熔断至运行结束: {reason}")
+        else:
+            logger.warning(f"[熔断] {self.name} 已熔断 {seconds:.0f} 秒: {reason}")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_dead_providers: Dict[str, str] = {}   # 鉴权 / 余额错误的服务商 → 原因
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str, model: Optional[str]) -> CircuitBreaker:
+    """获取指定服务商、模型的共享熔断器（进程内单例，参数取自 LLM_BREAKER_*）"""
+    name = f"{provider}:{model or 'default'}"
+    with _breakers_lock:
+        if name not in _breakers:
+            from config import get_config
+            config = get_config()
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=config.llm_breaker_failure_threshold,
+                cooldown=config.llm_breaker_cooldown_seconds,
+            )
+            if provider in _dead_providers:
+                breaker.trip(_dead_providers[provider])
+            _breakers[name] = breaker
+        return _breakers[name]
+
+
+def record_failure(provider: str, model: Optional[str], info: ErrorInfo) -> None:
+    """登记失败；服务商级错误（Key 无效、欠费）同时熔断该服务商下的所有端点"""
+    breaker = get_circuit_breaker(provider, model)
+    if info.retryable or info.scope != SCOPE_PROVIDER:
+        breaker.record_failure(info)
+        return
+    with _breakers_lock:
+        _dead_providers[provider] = str(info)
+        breakers = [b for name, b in _breakers.items() if name.startswith(f"{provider}:")]
+    for item in breakers:
+        item.trip(str(info))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+大模型响应缓存
+===================================
+
+同一天重跑、或崩溃后重试时，_format_prompt 生成的 prompt 往往逐字节相同，
+重复调用大模型既费钱又占用 RPM/TPM 配额。
+
+按内容寻址：键 = sha256(模型名 + 生成配置 + 系统提示词 + prompt)，
+每个键一个文件（临时文件 + 原子替换），命中时跳过网络请求和配额预约：
+1. TTL：写入超过 ttl 的条目视为失效并删除
+2. 容量：总大小超过 max_bytes 时按最近访问时间（mtime，命中时刷新）淘汰最旧条目
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from data_provider.disk_cache import write_pickle_atomic
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    大模型原始响应的磁盘缓存
+
+    使用方式：
+        cache = LLMResponseCache('cache', ttl_seconds=12 * 3600, max_bytes=200 << 20)
+        key = cache.make_key(model_name, generation_config, prompt, system_prompt)
+        text = cache.get(key)
+        if text is None:
+            text = call_llm(prompt)
+            cache.set(key, text)
+    """
+
+    def __init__(self, cache_dir: str = "cache", ttl_seconds: float = 12 * 3600, max_bytes: int = 200 << 20):
+        """
+        Args:
+            cache_dir: 缓存根目录（条目保存在 {cache_dir}/llm 下）
+            ttl_seconds: 条目有效期（秒）
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self._dir = Path(cache_dir) / "llm"
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None   # 首次写入时扫描目录，之后增量维护
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        model: str,
+        generation_config: Dict[str, Any],
+        prompt: str,
+        system_prompt: str = ""
+    ) -> str:
+        """请求指纹：任一输入变化即为不同的键"""
+        payload = json.dumps(
+            {'model': model, 'config': generation_config, 'system': system_prompt, 'prompt': prompt},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self._dir / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[str]:
+        """读取响应文本，不存在或已过期返回 None"""
+        path = self._path(key)
+        try:
+            entry = pd.read_pickle(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.debug(f"[LLM缓存] 读取 {path.name} 失败: {e}")
+            self.misses += 1
+            return None
+
+        if time.time() - entry.get('saved_at', 0) > self.ttl_seconds:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # 刷新访问时间，容量淘汰时按最近使用保留
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry.get('response')
+
+    def set(self, key: str, response: str, model: str = "") -> None:
+        path = self._path(key)
+        try:
+            write_pickle_atomic(path, {'saved_at': time.time(), 'model': model, 'response': response})
+        except Exception as e:
+            logger.warning(f"[LLM缓存] 写入失败: {e}")
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._dir.glob("*.pkl"))
+            else:
+                self._size += path.stat().st_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """删除过期条目，再按 mtime 从旧到新删除直到低于容量上限的 90%"""
+        entries = []
+        for p in self._dir.glob("*.pkl"):
+            try:
+                stat = p.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+
+        now = time.time()
+        size = sum(e[1] for e in entries)
+        removed = 0
+        for mtime, nbytes, p in entries:
+            if size <= self.max_bytes * 0.9 and now - mtime <= self.ttl_seconds:
+                break
+            self._remove(p)
+            size -= nbytes
+            removed += 1
+        self._size = size
+        if removed:
+            logger.info(f"[LLM缓存] 淘汰 {removed} 个条目，当前 {size / (1 << 20):.1f} MB")
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+大模型调用错误分类
+===================================
+
+原先所有异常一律按指数退避重试 gemini_max_retries 次，
+API Key 无效、模型不存在、内容被拦截这类永远不会成功的错误也要耗掉几分钟。
+
+classify_error 把异常分为：
+1. 不可重试：鉴权 / 权限 / 余额不足（整个服务商不可用）、模型不存在（该模型不可用）、
+   请求参数错误、内容被安全策略拦截（仅本次请求）
+2. 可重试：限流、超时、连接错误、5xx，以及无法识别的错误
+并从响应头（Retry-After / retry-after-ms）或错误信息（Gemini 的 retry_delay）中读取建议等待时间。
+
+兼容 openai、google-api-core 的异常类型，以及只有错误信息文本的情况（按状态码与关键词识别）。
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+# 影响范围
+SCOPE_REQUEST = 'request'     # 仅本次请求（换提示词可能成功）
+SCOPE_MODEL = 'model'         # 该模型不可用
+SCOPE_PROVIDER = 'provider'   # 整个服务商不可用（Key 无效、欠费）
+
+
+@dataclass
+class ErrorInfo:
+    """错误分类结果"""
+    reason: str                        # auth / not_found / bad_request / blocked / rate_limit / timeout / server / unknown
+    retryable: bool
+    scope: str = SCOPE_REQUEST         # 不可重试错误的影响范围
+    status: Optional[int] = None       # HTTP 状态码
+    retry_after: Optional[float] = None  # 服务商建议的等待秒数
+
+    def __str__(self) -> str:
+        parts = [self.reason, '可重试' if self.retryable else '不可重试']
+        if self.status:
+            parts.append(str(self.status))
+        if self.retry_after is not None:
+            parts.append(f"建议等待 {self.retry_after:.0f}s")
+        return '/'.join(parts)
+
+
+_FATAL_BY_STATUS = {
+    400: 'bad_request',
+    401: 'auth',
+    402: 'auth',
+    403: 'auth',
+    404: 'not_found',
+    422: 'bad_request',
+}
+
+# 异常类名（openai / google.api_core / google.generativeai）
+_CLASS_REASONS = {
+    'AuthenticationError': 'auth',
+    'PermissionDeniedError': 'auth',
+    'PermissionDenied': 'auth',
+    'Unauthenticated': 'auth',
+    'Unauthorized': 'auth',
+    'Forbidden': 'auth',
+    'NotFoundError': 'not_found',
+    'NotFound': 'not_found',
+    'BadRequestError': 'bad_request',
+    'BadRequest': 'bad_request',
+    'InvalidArgument': 'bad_request',
+    'UnprocessableEntityError': 'bad_request',
+    'BlockedPromptException': 'blocked',
+    'StopCandidateException': 'blocked',
+    'RateLimitError': 'rate_limit',
+    'ResourceExhausted': 'rate_limit',
+    'TooManyRequests': 'rate_limit',
+    'APITimeoutError': 'timeout',
+    'DeadlineExceeded': 'timeout',
+    'ReadTimeout': 'timeout',
+    'ConnectTimeout': 'timeout',
+    'TimeoutError': 'timeout',
+    'APIConnectionError': 'timeout',
+    'ConnectError': 'timeout',
+    'ConnectionError': 'timeout',
+    'ServiceUnavailable': 'server',
+    'InternalServerError': 'server',
+    'InternalServerErrorError': 'server',
+}
+
+_FATAL_REASONS = {
+    'auth': SCOPE_PROVIDER,
+    'not_found': SCOPE_MODEL,
+    'bad_request': SCOPE_REQUEST,
+    'blocked': SCOPE_REQUEST,
+}
+
+# 没有状态码与已知类型时按错误信息识别
+# 只认明确的 Key 无效 / 余额不足：Gemini 免费档的每分钟限流信息里也有 "quota" "billing" 字样
+_PROVIDER_FATAL = re.compile(
+    r'api[ _-]?key (?:not valid|invalid|expired)|invalid[ _-]api[ _-]key|incorrect api key'
+    r'|insufficient_quota|余额不足|欠费',
+    re.I,
+)
+# 带建议等待时间或按分钟 / 秒计的配额：稍后即可恢复的限流
+_TRANSIENT_QUOTA = re.compile(r'retry_delay|Per(?:Minute|Second)', re.I)
+_MESSAGE_PATTERNS = [
+    (re.compile(r'model.{0,40}(?:not found|does not exist|is not supported)', re.I), 'not_found'),
+    (re.compile(r'safety|blocked|content[_ ]filter|finish_reason.{0,5}(?:SAFETY|content_filter)', re.I), 'blocked'),
+    (re.compile(r'\b429\b|rate[ _-]?limit|quota|resource.?exhausted|too many requests', re.I), 'rate_limit'),
+    (re.compile(r'time[sd]? ?out|timed out|deadline', re.I), 'timeout'),
+    (re.compile(r'\b50[0-4]\b|unavailable|overloaded|internal error', re.I), 'server'),
+]
+
+_STATUS_IN_MESSAGE = re.compile(r'^\s*(\d{3})\b|error code:?\s*(\d{3})\b', re.I)
+_GEMINI_RETRY_DELAY = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)|retry in\s*([\d.]+)\s*(ms|s)\b', re.I)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for candidate in (
+        getattr(error, 'status_code', None),
+        getattr(error, 'code', None),
+        getattr(getattr(error, 'response', None), 'status_code', None),
+    ):
+        if isinstance(candidate, int) and not isinstance(candidate, bool) and 100 <= candidate < 600:
+            return candidate
+    match = _STATUS_IN_MESSAGE.search(str(error))
+    if match:
+        return int(match.group(1) or match.group(2))
+    return None
+
+
+def _header(headers: Any, name: str) -> Optional[str]:
+    if headers is None:
+        return None
+    try:
+        return headers.get(name)
+    except Exception:
+        return None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """服务商建议的等待时间（秒）；未提供时返回 None"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    value = _header(headers, 'retry-after-ms')
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = _header(headers, 'retry-after')
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    match = _GEMINI_RETRY_DELAY.search(str(error))
+    if match:
+        if match.group(1):
+            return float(match.group(1))
+        seconds = float(match.group(2))
+        return seconds / 1000 if match.group(3).lower() == 'ms' else seconds
+    return None
+
+
+def classify_error(error: Exception) -> ErrorInfo:
+    """判断大模型调用异常是否值得重试"""
+    status = _status_code(error)
+    retry_after = retry_after_seconds(error)
+    message = str(error)
+
+    reason = None
+    # Key 无效在 Gemini 上是 400、余额不足在 OpenAI 上是 429，都按鉴权错误处理（重试不会成功）
+    if _PROVIDER_FATAL.search(message) and not _TRANSIENT_QUOTA.search(message):
+        reason = 'auth'
+    elif status in _FATAL_BY_STATUS:
+        reason = _FATAL_BY_STATUS[status]
+    elif status == 429:
+        reason = 'rate_limit'
+    elif status is not None and status >= 500:
+        reason = 'server'
+    elif status in (408, 409):
+        reason = 'timeout'
+
+    if reason is None:
+        for cls in type(error).__mro__:
+            if cls.__name__ in _CLASS_REASONS:
+                reason = _CLASS_REASONS[cls.__name__]
+                break
+    if reason is None:
+        for pattern, candidate in _MESSAGE_PATTERNS:
+            if pattern.search(message):
+                reason = candidate
+                break
+    reason = reason or 'unknown'
+
+    if reason in _FATAL_REASONS:
+        return ErrorInfo(reason, retryable=False, scope=_FATAL_REASONS[reason], status=status)
+    return ErrorInfo(reason, retryable=True, status=status, retry_after=retry_after)
+
+
+if __name__ == "__main__":
+    class _Response:
+        def __init__(self, status_code, headers):
+            self.status_code = status_code
+            self.headers = headers
+
+    class RateLimitError(Exception):
+        def __init__(self, message, headers):
+            super().__init__(message)
+            self.response = _Response(429, headers)
+            self.status_code = 429
+
+    samples = [
+        Exception("400 API key not valid. Please pass a valid API key."),
+        Exception("Error code: 401 - {'error': {'message': 'Incorrect API key provided'}}"),
+        Exception("404 models/gemini-9 is not found for API version v1beta"),
+        Exception("429 Resource has been exhausted (e.g. check quota). retry_delay {\n  seconds: 17\n}"),
+        Exception(
+            "429 You exceeded your current quota, please check your plan and billing details. "
+            "For more information on this error, head to: https://ai.google.dev/gemini-api/docs/rate-limits. "
+            "[violations {\n  quota_metric: \"generativelanguage.googleapis.com/generate_content_free_tier_requests\"\n"
+            "  quota_id: \"GenerateRequestsPerMinutePerProjectPerModel-FreeTier\"\n}\n"
+            ", retry_delay {\n  seconds: 17\n}\n]"
+        ),
+        RateLimitError("Rate limit reached, Please try again in 20s", {'retry-after': '20'}),
+        RateLimitError("You exceeded your current quota: insufficient_quota", {}),
+        Exception("503 The model is overloaded. Please try again later."),
+        Exception("HTTPSConnectionPool(host='api.openai.com', port=443): Read timed out. (read timeout=120)"),
+        Exception("Gemini 返回空响应"),
+        ValueError("Invalid operation: The `response.text` quick accessor requires a valid Part, finish_reason is SAFETY"),
+    ]
+    for sample in samples:
+        print(f"{classify_error(sample)!s:<40} {str(sample)[:60]!r}")
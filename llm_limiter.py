@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+大模型请求配额控制（RPM / TPM）
+===================================
+
+原先每次调用前固定 sleep gemini_request_delay，批量分析之间再固定 sleep，
+大模型阶段被完全串行化，即使服务商配额还有大量余量。
+
+LLMRateLimiter 按"服务商 + 模型"记录最近 60 秒内的请求数与 token 数：
+1. 预约：在锁内找出满足 RPM、TPM 的最早时间点并登记，随即释放锁
+2. 等待：线程用 time.sleep，协程用 asyncio.sleep，等待期间不阻塞其他调用方
+3. 结算：响应返回后用实际 token 数修正预约时的估算
+
+配额有余量时请求立即放行，多线程 / 多协程可一直并发到真实配额上限。
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字及全角标点，约 1 字 1 token；其余字符约 4 字符 1 token
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估算文本的 token 数（用于配额预约，不要求精确）"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class LLMRateLimiter:
+    """
+    滑动窗口 RPM / TPM 限流器（线程安全、协程安全）
+
+    使用方式：
+        limiter = get_llm_limiter('gemini', 'gemini-2.5-flash')
+        reservation = limiter.acquire(estimate_tokens(prompt) + 2000)
+        text = call_llm(prompt)
+        limiter.settle(reservation, estimate_tokens(prompt) + estimate_tokens(text))
+
+        # 协程中
+        reservation = await limiter.acquire_async(tokens)
+    """
+
+    WINDOW = 60.0
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0):
+        """
+        Args:
+            name: 限流对象名称（服务商:模型）
+            rpm: 每分钟请求数上限，0 表示不限
+            tpm: 每分钟 token 数上限，0 表示不限
+        """
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        # 已放行 / 已预约的请求：[时间点, token 数]，时间点单调不减
+        self._events: Deque[List[float]] = deque()
+
+    def reserve(self, tokens: int) -> Tuple[float, List[float]]:
+        """
+        预约一次请求
+
+        Returns:
+            (需等待的秒数, 预约记录)
+        """
+        with self._lock:
+            now = time.time()
+            while self._events and self._events[0][0] <= now - self.WINDOW:
+                self._events.popleft()
+
+            tokens = min(tokens, self.tpm) if self.tpm > 0 else tokens
+            slot = max(now, self._events[-1][0]) if self._events else now
+
+            # RPM：窗口内已有 rpm 个请求时，等到倒数第 rpm 个请求滑出窗口
+            if self.rpm > 0 and len(self._events) >= self.rpm:
+                slot = max(slot, self._events[-self.rpm][0] + self.WINDOW)
+
+            # TPM：从最早的请求开始逐个滑出窗口，直到剩余 token 加上本次不超限
+            if self.tpm > 0:
+                in_window = [e for e in self._events if e[0] > slot - self.WINDOW]
+                used = sum(e[1] for e in in_window)
+                for event in in_window:
+                    if used + tokens <= self.tpm:
+                        break
+                    slot = max(slot, event[0] + self.WINDOW)
+                    used -= event[1]
+
+            reservation = [slot, float(tokens)]
+            self._events.append(reservation)
+
+        return max(slot - now, 0.0), reservation
+
+    def acquire(self, tokens: int) -> List[float]:
+        """阻塞直到配额允许（线程）"""
+        wait, reservation = self.reserve(tokens)
+        if wait > 0:
+            logger.info(f"[LLM限流] {self.name} 配额已满，等待 {wait:.1f} 秒")
+            time.sleep(wait)
+        return reservation
+
+    async def acquire_async(self, tokens: int) -> List[float]:
+        """等待直到配额允许（协程，不阻塞事件循环）"""
+        wait, reservation = self.reserve(tokens)
+        if wait > 0:
+            logger.info(f"[LLM限流] {self.name} 配额已满，等待 {wait:.1f} 秒")
+            await asyncio.sleep(wait)
+        return reservation
+
+    def settle(self, reservation: List[float], tokens: int) -> None:
+        """用实际 token 数修正预约"""
+        with self._lock:
+            reservation[1] = float(tokens)
+
+
+_limiters: Dict[str, LLMRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_llm_limiter(provider: str, model: Optional[str]) -> LLMRateLimiter:
+    """获取指定服务商、模型的共享限流器（进程内单例，配额取自 LLM_RPM / LLM_TPM）"""
+    name = f"{provider}:{model or 'default'}"
+    with _limiters_lock:
+        if name not in _limiters:
+            from config import get_config
+            config = get_config()
+            _limiters[name] = LLMRateLimiter(name, rpm=config.llm_rpm, tpm=config.llm_tpm)
+        return _limiters[name]
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+服务商侧提示词前缀缓存
+===================================
+
+GeminiAnalyzer.SYSTEM_PROMPT 约 2000 token，每次请求逐字相同。
+服务商对相同前缀提供缓存，命中部分的输入延迟与费用都显著降低：
+1. Gemini：显式创建 CachedContent（系统提示词），模型通过 from_cached_content 引用
+2. OpenAI 兼容 API：系统消息固定放在最前，由服务商自动做前缀缓存（无需额外参数）
+
+PrefixCacheStats 从响应的 usage 中读取缓存命中的 token 数，统计命中率。
+
+Gemini 的 CachedContent 在有效期内按存储时长计费，运行结束时由 close() 删除本次创建的缓存
+（同时注册 atexit 兜底），不等 TTL 到期。
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiPrefixCache:
+    """
+    Gemini 系统提示词的 CachedContent（每个模型一份）
+
+    使用方式：
+        prefix = GeminiPrefixCache(SYSTEM_PROMPT, ttl_seconds=3600)
+        model = prefix.create_model('gemini-2.5-flash')
+        ...
+        model = prefix.refresh('gemini-2.5-flash') or model   # 每次请求前调用，临近过期时续期
+        prefix.close()                                         # 运行结束时删除缓存
+    """
+
+    def __init__(self, system_instruction: str, ttl_seconds: float = 3600):
+        self.system_instruction = system_instruction
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._caches: Dict[str, Any] = {}          # 模型 → CachedContent
+        self._expires_at: Dict[str, float] = {}
+        self._failed_models = set()   # 不支持缓存（如低于最小 token 数）的模型不再重试
+        self._created: List[Any] = []  # 本次运行创建的全部缓存（含续期失败后重建前的旧缓存）
+        self._closed = False
+
+    def create_model(self, model_name: str):
+        """
+        为指定模型创建缓存并返回引用它的 GenerativeModel
+
+        创建失败（模型不支持、系统提示词低于最小缓存 token 数等）时
+        返回以 system_instruction 直接请求的普通 GenerativeModel。
+        """
+        import google.generativeai as genai
+
+        if model_name in self._failed_models or self._closed:
+            return self._plain_model(genai, model_name)
+        with self._lock:
+            try:
+                from google.generativeai import caching
+
+                cache = caching.CachedContent.create(
+                    model=model_name if model_name.startswith('models/') else f'models/{model_name}',
+                    display_name='stock-analyzer-system-prompt',
+                    system_instruction=self.system_instruction,
+                    ttl=timedelta(seconds=self.ttl_seconds),
+                )
+                if not self._created:
+                    atexit.register(self.close)
+                self._created.append(cache)
+                self._caches[model_name] = cache
+                self._expires_at[model_name] = time.time() + self.ttl_seconds
+                logger.info(f"[前缀缓存] Gemini 系统提示词已缓存 (模型: {model_name}, 有效期 {self.ttl_seconds / 60:.0f} 分钟)")
+                return genai.GenerativeModel.from_cached_content(cached_content=cache)
+            except Exception as e:
+                self._failed_models.add(model_name)
+                self._caches.pop(model_name, None)
+                logger.warning(f"[前缀缓存] {model_name} 创建 CachedContent 失败，使用普通请求: {e}")
+        return self._plain_model(genai, model_name)
+
+    def _plain_model(self, genai, model_name: str):
+        return genai.GenerativeModel(model_name=model_name, system_instruction=self.system_instruction)
+
+    def _due(self, model_name: str) -> bool:
+        return time.time() >= self._expires_at.get(model_name, 0.0) - self.ttl_seconds / 2
+
+    def refresh(self, model_name: str):
+        """
+        该模型的缓存剩余有效期不足一半时续期；续期失败则重新创建
+
+        Returns:
+            重新创建时返回新的 GenerativeModel，否则返回 None
+        """
+        if model_name not in self._caches or not self._due(model_name):
+            return None
+        with self._lock:
+            cache = self._caches.get(model_name)
+            if cache is None or not self._due(model_name):
+                return None
+            try:
+                cache.update(ttl=timedelta(seconds=self.ttl_seconds))
+                self._expires_at[model_name] = time.time() + self.ttl_seconds
+                logger.debug(f"[前缀缓存] {model_name} 已续期")
+                return None
+            except Exception as e:
+                logger.warning(f"[前缀缓存] {model_name} 续期失败，重新创建: {e}")
+        return self.create_model(model_name)
+
+    def close(self) -> None:
+        """删除本次运行创建的缓存（可重复调用）；之后新建的模型不再使用缓存"""
+        with self._lock:
+            self._closed = True
+            caches, self._created = self._created, []
+            self._caches.clear()
+            self._expires_at.clear()
+        deleted = 0
+        for cache in caches:
+            try:
+                cache.delete()
+                deleted += 1
+            except Exception as e:
+                # 已过期或已被删除
+                logger.debug(f"[前缀缓存] 删除 CachedContent 失败: {e}")
+        if deleted:
+            logger.info(f"[前缀缓存] 已删除本次运行创建的 {deleted} 个 Gemini 缓存")
+
+
+class PrefixCacheStats:
+    """前缀缓存命中统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0         # 带 usage 信息的请求数
+        self.hit_requests = 0     # 有缓存命中的请求数
+        self.prompt_tokens = 0    # 服务商计量的输入 token
+        self.cached_tokens = 0    # 其中命中缓存的 token
+
+    def record(self, prompt_tokens: int, cached_tokens: int) -> None:
+        if not prompt_tokens:
+            return
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            if cached_tokens:
+                self.hit_requests += 1
+
+    def summary(self) -> str:
+        with self._lock:
+            if not self.requests:
+                return "前缀缓存: 无 usage 数据"
+            ratio = self.cached_tokens / self.prompt_tokens
+            return (f"前缀缓存: {self.hit_requests}/{self.requests} 次请求命中，"
+                    f"缓存 {self.cached_tokens}/{self.prompt_tokens} 输入 tokens ({ratio:.0%})")
+
+
+def _field(obj: Any, name: str, default: Any = None) -> Any:
+    """兼容 SDK 对象与 dict 的属性读取"""
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def openai_prompt_usage(response: Any) -> Tuple[int, int]:
+    """
+    从 OpenAI 兼容响应中读取 (输入 tokens, 命中缓存的 tokens)
+
+    OpenAI: usage.prompt_tokens_details.cached_tokens
+    DeepSeek: usage.prompt_cache_hit_tokens
+    """
+    usage = _field(response, 'usage')
+    prompt_tokens = _field(usage, 'prompt_tokens') or 0
+    cached = _field(_field(usage, 'prompt_tokens_details'), 'cached_tokens')
+    if cached is None:
+        cached = _field(usage, 'prompt_cache_hit_tokens')
+    return int(prompt_tokens), int(cached or 0)
+
+
+def gemini_prompt_usage(response: Any) -> Tuple[int, int]:
+    """从 Gemini 响应（或流式分片）中读取 (输入 tokens, 命中缓存的 tokens)"""
+    usage = _field(response, 'usage_metadata')
+    prompt_tokens = _field(usage, 'prompt_token_count') or 0
+    cached = _field(usage, 'cached_content_token_count') or 0
+    return int(prompt_tokens), int(cached)
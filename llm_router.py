@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+按延迟选择大模型端点（含对冲请求）
+===================================
+
+原先的调用顺序是固定的：Gemini 主模型重试过半才切备选模型，Gemini 全部重试失败后
+才轮到 OpenAI 兼容 API，指数退避叠加下来，单只股票可能卡住数分钟。
+
+LLMRouter 为每个端点（服务商:模型）维护成功延迟与错误率的指数滑动平均（EWMA）：
+1. 排序：默认保持配置顺序（用户配置的主模型在前），错误率 EWMA 超过 failing_error_rate 的端点
+   移到末尾；latency_ranking=True 时改按"每次成功的期望耗时" = 延迟 EWMA / (1 - 错误率 EWMA)
+   从低到高，尚无数据的端点按已知最优延迟的 1.5 倍估计
+2. 失败：立即改用下一个端点，不做退避等待
+3. 对冲（可选）：首选端点超过其 p95 延迟仍未返回时，向排在后面的另一家服务商的端点再发一份请求，
+   先成功者胜出；同一服务商的端点共用配额与故障域，对冲过去只会加倍花费，没有另一家服务商时不对冲
+4. 重试：一轮内所有端点都失败后才退避等待，开始下一轮；错误均不可重试时不再等待
+5. 截止：整次调用（含所有轮次）超过截止时间不再等待，直接报错，单只股票的尾延迟有上界
+
+attempt 中等待本地 RPM/TPM 配额的部分用 admission_wait() 包裹：排队时间不计入端点延迟，
+对冲计时也从放行后开始，否则限流排队会抬高延迟 EWMA / p95 并让对冲请求过早发出。
+
+协程版本的落败请求会被取消；同步版本的落败请求无法中断，在后台完成后仅用于更新统计。
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """整次调用（含所有端点与轮次）超过截止时间"""
+
+
+class _AttemptClock:
+    """单次请求的计时：扣除排队等待本地配额的时间"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.waited = 0.0           # 已结束的配额排队时长合计
+        self.queued_since: Optional[float] = None
+
+    def elapsed(self) -> float:
+        """请求实际发出后的耗时（排队中不增长）"""
+        now = self.queued_since if self.queued_since is not None else time.monotonic()
+        return now - self.started - self.waited
+
+
+# 当前请求的计时（LLMRouter 在每个请求各自的上下文副本中设置）
+_clock: contextvars.ContextVar[Optional[_AttemptClock]] = contextvars.ContextVar('llm_route_clock', default=None)
+
+
+@contextmanager
+def admission_wait() -> Iterator[None]:
+    """
+    包裹 attempt 中等待本地配额（RPM/TPM 限流）的部分：期间不计入端点延迟，也不开始对冲计时
+
+    不在 LLMRouter 调用中时无作用。
+    """
+    clock = _clock.get()
+    if clock is None:
+        yield
+        return
+    clock.queued_since = time.monotonic()
+    try:
+        yield
+    finally:
+        clock.waited += time.monotonic() - clock.queued_since
+        clock.queued_since = None
+
+
+class EndpointStats:
+    """单个端点的延迟 / 错误率统计（由 LLMRouter 加锁访问）"""
+
+    def __init__(self, window: int = 50):
+        self.latency_ewma: Optional[float] = None   # 成功请求的延迟 EWMA（秒）
+        self.error_ewma = 0.0                       # 错误率 EWMA
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.hedge_wins = 0                         # 作为对冲请求胜出的次数
+
+    def record(self, latency: float, ok: bool, alpha: float) -> None:
+        self.calls += 1
+        self.error_ewma += alpha * ((0.0 if ok else 1.0) - self.error_ewma)
+        if not ok:
+            self.errors += 1
+            return
+        self.samples.append(latency)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += alpha * (latency - self.latency_ewma)
+
+    def record_censored(self, elapsed: float, alpha: float) -> None:
+        """被取消的请求：只知道延迟不低于 elapsed，仅在高于当前估计时上调延迟 EWMA"""
+        if self.latency_ewma is None:
+            self.latency_ewma = elapsed
+        elif elapsed > self.latency_ewma:
+            self.latency_ewma += alpha * (elapsed - self.latency_ewma)
+
+    def p95(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class LLMRouter:
+    """
+    延迟感知的端点路由器（线程安全）
+
+    使用方式：
+        router = LLMRouter(['gemini:gemini-3-flash-preview', 'openai:gpt-4o-mini'])
+        text = router.call(lambda endpoint: call_llm(endpoint, prompt))
+
+        # 协程中
+        text = await router.call_async(lambda endpoint: call_llm_async(endpoint, prompt))
+    """
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        hedge: bool = False,
+        hedge_delay: float = 30.0,
+        min_hedge_delay: float = 2.0,
+        deadline: float = 180.0,
+        alpha: float = 0.2,
+        min_samples: int = 5,
+        max_workers: int = 16,
+        latency_ranking: bool = False,
+        failing_error_rate: float = 0.5,
+    ):
+        """
+        Args:
+            endpoints: 端点名称（服务商:模型），按配置优先级排列
+            hedge: 是否启用对冲请求（只对冲到另一家服务商的端点）
+            hedge_delay: 样本不足 min_samples 时的对冲等待时间（秒）
+            min_hedge_delay: 对冲等待时间下限，避免 p95 很低时频繁重复请求
+            deadline: 单次调用的截止时间（秒），<=0 表示不限
+            alpha: EWMA 平滑系数
+            min_samples: 使用 p95 作为对冲等待时间所需的最少成功样本数
+            max_workers: 同步调用的请求线程数
+            latency_ranking: 是否按期望耗时排序端点（默认保持配置顺序）
+            failing_error_rate: 错误率 EWMA 达到该值的端点视为故障，排到末尾
+        """
+        self.endpoints = list(endpoints)
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.deadline = deadline
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.latency_ranking = latency_ranking
+        self.failing_error_rate = failing_error_rate
+        self._stats: Dict[str, EndpointStats] = {e: EndpointStats() for e in self.endpoints}
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ---------- 统计 ----------
+
+    def record(self, endpoint: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._stats[endpoint].record(latency, ok, self.alpha)
+
+    def ranked(self) -> List[str]:
+        """本次调用的端点顺序：配置顺序（故障端点排到末尾），或按每次成功的期望耗时"""
+        with self._lock:
+            if not self.latency_ranking:
+                # sorted 稳定，未故障的端点保持配置顺序
+                return sorted(self.endpoints, key=lambda e: self._stats[e].error_ewma >= self.failing_error_rate)
+            known = [s.latency_ewma for s in self._stats.values() if s.latency_ewma is not None]
+            prior = min(known) * 1.5 if known else 0.0
+
+            def expected(endpoint: str) -> float:
+                stats = self._stats[endpoint]
+                latency = stats.latency_ewma if stats.latency_ewma is not None else prior
+                return latency / max(1.0 - stats.error_ewma, 0.05)
+
+            # sorted 稳定，同分时保持配置顺序
+            return sorted(self.endpoints, key=expected)
+
+    def hedge_after(self, endpoint: str) -> float:
+        """首选端点发出多久后仍未返回时发起对冲请求"""
+        with self._lock:
+            stats = self._stats[endpoint]
+            delay = stats.p95() if len(stats.samples) >= self.min_samples else None
+        return max(self.min_hedge_delay, delay if delay is not None else self.hedge_delay)
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = []
+            for endpoint in self.endpoints:
+                s = self._stats[endpoint]
+                if not s.calls:
+                    continue
+                latency = f"{s.latency_ewma:.1f}s" if s.latency_ewma is not None else "-"
+                p95 = s.p95()
+                parts.append(
+                    f"{endpoint} {s.calls} 次/失败 {s.errors}/延迟 {latency}"
+                    f"{f'/p95 {p95:.1f}s' if p95 is not None else ''}"
+                    f"{f'/对冲胜出 {s.hedge_wins}' if s.hedge_wins else ''}"
+                )
+        return "路由: " + ("; ".join(parts) if parts else "无请求")
+
+    def _note_win(self, endpoint: str, hedged: bool) -> None:
+        if hedged:
+            with self._lock:
+                self._stats[endpoint].hedge_wins += 1
+
+    def _remaining(self, start: float) -> Optional[float]:
+        if self.deadline <= 0:
+            return None
+        return self.deadline - (time.monotonic() - start)
+
+    def _check_deadline(self, start: float, last_error: Optional[Exception], wait_seconds: float = 0.0) -> None:
+        remaining = self._remaining(start)
+        if remaining is not None and remaining <= wait_seconds:
+            detail = f"，最后一次错误: {last_error}" if last_error else ""
+            raise DeadlineExceeded(f"LLM 调用超过 {self.deadline:.0f} 秒截止时间{detail}")
+
+    def _wait_timeout(
+        self,
+        start: float,
+        can_hedge: bool,
+        current: str,
+        launched: Dict[str, _AttemptClock]
+    ) -> Optional[float]:
+        """本次等待的超时：截止时间与对冲时间点中较早者（None 表示一直等待）"""
+        timeout = self._remaining(start)
+        if can_hedge:
+            # 排队等配额时对冲时间点未知，先按整段对冲等待时间后再检查
+            hedge_in = self.hedge_after(current) - launched[current].elapsed()
+            timeout = hedge_in if timeout is None else min(timeout, hedge_in)
+        return max(timeout, 0.0) if timeout is not None else None
+
+    @staticmethod
+    def _hedge_target(current: str, queue: List[str]) -> Optional[str]:
+        """对冲目标：队列中第一个与 current 不同服务商的端点"""
+        provider = current.split(':', 1)[0]
+        return next((e for e in queue if e.split(':', 1)[0] != provider), None)
+
+    def _hedge_due(self, current: str, launched: Dict[str, _AttemptClock]) -> bool:
+        clock = launched[current]
+        return clock.queued_since is None and clock.elapsed() >= self.hedge_after(current)
+
+    # ---------- 同步调用 ----------
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="llm_route")
+            return self._executor
+
+    def _timed(self, attempt: Callable[[str], Any], endpoint: str, clock: _AttemptClock) -> Any:
+        # 在请求自己的上下文副本中执行，设置的计时不会泄漏给调用方
+        clock.started = time.monotonic()
+        _clock.set(clock)
+        try:
+            result = attempt(endpoint)
+        except Exception:
+            self.record(endpoint, clock.elapsed(), ok=False)
+            raise
+        self.record(endpoint, clock.elapsed(), ok=True)
+        return result
+
+    def call(
+        self,
+        attempt: Callable[[str], Any],
+        rounds: int = 1,
+        backoff: Optional[Callable[[int, List[Exception]], float]] = None,
+        retryable: Optional[Callable[[Exception], bool]] = None
+    ) -> Any:
+        """
+        依次 / 对冲地调用端点，返回第一个成功结果
+
+        Args:
+            attempt: 以端点名称为参数发起一次请求（不含重试）的函数
+            rounds: 最多轮数，一轮内每个端点至多请求一次
+            backoff: 第 n 轮（从 1 起）开始前的等待秒数，参数为 (n, 上一轮的错误列表)
+            retryable: 判断错误是否值得下一轮重试；一轮的错误都不值得重试时直接抛出
+
+        Raises:
+            DeadlineExceeded: 超过截止时间
+            Exception: 所有轮次都失败（或错误均不可重试）时抛出最后一个错误
+        """
+        start = time.monotonic()
+        last_error: Optional[Exception] = None
+        errors: List[Exception] = []
+        for round_index in range(max(rounds, 1)):
+            if round_index > 0:
+                if retryable is not None and not any(retryable(e) for e in errors):
+                    logger.warning("[LLM路由] 所有端点的错误均不可重试，放弃")
+                    break
+                delay = backoff(round_index, errors) if backoff else 0.0
+                self._check_deadline(start, last_error, delay)
+                logger.info(f"[LLM路由] 所有端点均失败，{delay:.1f} 秒后第 {round_index + 1} 轮")
+                time.sleep(delay)
+            errors = []
+            try:
+                return self._call_round(attempt, start, errors)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def _call_round(self, attempt: Callable[[str], Any], start: float, errors: List[Exception]) -> Any:
+        queue = self.ranked()
+        executor = self._get_executor()
+        inflight: Dict[Any, str] = {}
+        launched: Dict[str, _AttemptClock] = {}
+        hedged_endpoint = None
+        last_error: Optional[Exception] = None
+
+        def launch(endpoint: Optional[str] = None) -> None:
+            endpoint = endpoint or queue[0]
+            queue.remove(endpoint)
+            # 在调用方的上下文副本中执行（保留 contextvars，如按股票的用量统计）
+            context = contextvars.copy_context()
+            launched[endpoint] = _AttemptClock()
+            inflight[executor.submit(context.run, self._timed, attempt, endpoint, launched[endpoint])] = endpoint
+
+        launch()
+        while inflight:
+            current = next(iter(inflight.values()))
+            target = self._hedge_target(current, queue) if self.hedge and hedged_endpoint is None else None
+            can_hedge = target is not None and len(inflight) == 1
+            done, _ = wait(list(inflight), timeout=self._wait_timeout(start, can_hedge, current, launched),
+                           return_when=FIRST_COMPLETED)
+
+            if not done:
+                self._check_deadline(start, last_error)
+                if can_hedge and self._hedge_due(current, launched):
+                    logger.info(f"[LLM路由] {current} 超过 p95 仍未返回，对冲请求 {target}")
+                    hedged_endpoint = target
+                    launch(target)
+                continue
+
+            for future in done:
+                endpoint = inflight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    errors.append(e)
+                    logger.warning(f"[LLM路由] {endpoint} 失败: {str(e)[:100]}")
+                    continue
+                self._note_win(endpoint, endpoint == hedged_endpoint)
+                return result
+
+            # 在途请求全部失败：立即换下一个端点
+            if not inflight and queue:
+                self._check_deadline(start, last_error)
+                logger.info(f"[LLM路由] 改用 {queue[0]}")
+                launch()
+
+        raise last_error or Exception("没有可用的 LLM 端点")
+
+    # ---------- 协程调用 ----------
+
+    async def _timed_async(self, attempt: Callable[[str], Awaitable[Any]], endpoint: str, clock: _AttemptClock) -> Any:
+        # 每个 Task 拥有独立的上下文副本
+        clock.started = time.monotonic()
+        _clock.set(clock)
+        try:
+            result = await attempt(endpoint)
+        except asyncio.CancelledError:
+            # 仍在排队等配额时被取消：请求尚未发出，不计入延迟
+            if clock.queued_since is None:
+                with self._lock:
+                    self._stats[endpoint].record_censored(clock.elapsed(), self.alpha)
+            raise
+        except Exception:
+            self.record(endpoint, clock.elapsed(), ok=False)
+            raise
+        self.record(endpoint, clock.elapsed(), ok=True)
+        return result
+
+    async def call_async(
+        self,
+        attempt: Callable[[str], Awaitable[Any]],
+        rounds: int = 1,
+        backoff: Optional[Callable[[int, List[Exception]], float]] = None,
+        retryable: Optional[Callable[[Exception], bool]] = None
+    ) -> Any:
+        """call 的协程版本：返回或超时时取消仍在途的请求"""
+        start = time.monotonic()
+        last_error: Optional[Exception] = None
+        errors: List[Exception] = []
+        for round_index in range(max(rounds, 1)):
+            if round_index > 0:
+                if retryable is not None and not any(retryable(e) for e in errors):
+                    logger.warning("[LLM路由] 所有端点的错误均不可重试，放弃")
+                    break
+                delay = backoff(round_index, errors) if backoff else 0.0
+                self._check_deadline(start, last_error, delay)
+                logger.info(f"[LLM路由] 所有端点均失败，{delay:.1f} 秒后第 {round_index + 1} 轮")
+                await asyncio.sleep(delay)
+            errors = []
+            try:
+                return await self._call_round_async(attempt, start, errors)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def _call_round_async(
+        self,
+        attempt: Callable[[str], Awaitable[Any]],
+        start: float,
+        errors: List[Exception]
+    ) -> Any:
+        queue = self.ranked()
+        inflight: Dict[asyncio.Future, str] = {}
+        launched: Dict[str, _AttemptClock] = {}
+        hedged_endpoint = None
+        last_error: Optional[Exception] = None
+
+        def launch(endpoint: Optional[str] = None) -> None:
+            endpoint = endpoint or queue[0]
+            queue.remove(endpoint)
+            launched[endpoint] = _AttemptClock()
+            inflight[asyncio.ensure_future(self._timed_async(attempt, endpoint, launched[endpoint]))] = endpoint
+
+        launch()
+        try:
+            while inflight:
+                current = next(iter(inflight.values()))
+                target = self._hedge_target(current, queue) if self.hedge and hedged_endpoint is None else None
+                can_hedge = target is not None and len(inflight) == 1
+                done, _ = await asyncio.wait(list(inflight), timeout=self._wait_timeout(start, can_hedge, current, launched),
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    self._check_deadline(start, last_error)
+                    if can_hedge and self._hedge_due(current, launched):
+                        logger.info(f"[LLM路由] {current} 超过 p95 仍未返回，对冲请求 {target}")
+                        hedged_endpoint = target
+                        launch(target)
+                    continue
+
+                for task in done:
+                    endpoint = inflight.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        errors.append(e)
+                        logger.warning(f"[LLM路由] {endpoint} 失败: {str(e)[:100]}")
+                        continue
+                    self._note_win(endpoint, endpoint == hedged_endpoint)
+                    return result
+
+                if not inflight and queue:
+                    self._check_deadline(start, last_error)
+                    logger.info(f"[LLM路由] 改用 {queue[0]}")
+                    launch()
+        finally:
+            # 已有结果或超时：取消落败 / 未完成的请求
+            for task in inflight:
+                task.cancel()
+
+        raise last_error or Exception("没有可用的 LLM 端点")
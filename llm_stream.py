@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+大模型流式响应的增量 JSON 解析
+===================================
+
+决策仪表盘响应最长可达 8192 token，整段返回后才解析，
+而日报和推送只用到前半部分字段（评分、建议、仪表盘、操作理由），
+后面的长文本分析字段既拖慢出结果的时间，又白白计费。
+
+JSONFieldScanner 随流式分片逐字符扫描顶层 JSON 对象：
+1. 跳过 ```json 等前导文本，从第一个 { 开始
+2. 记录顶层每个键的值在文本中的起止位置，值闭合时立即 json.loads 填入 fields
+3. 调用方发现所需字段都已就绪时即可中断请求，用 to_json() 作为响应文本
+
+单次扫描、只保存状态机，所有分片总计 O(n)。
+"""
+
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JSONFieldScanner:
+    """
+    顶层 JSON 对象的增量字段扫描器
+
+    使用方式：
+        scanner = JSONFieldScanner()
+        for chunk in stream:
+            scanner.feed(chunk)
+            if scanner.has_fields(('sentiment_score', 'dashboard')):
+                break
+        text = scanner.to_json() if scanner.has_fields(...) else scanner.text
+    """
+
+    def __init__(self):
+        self.text = ""                      # 已收到的全部文本
+        self.fields: Dict[str, Any] = {}    # 已闭合的顶层字段
+        self.finished = False               # 顶层对象已闭合
+        self._pos = 0                       # 下一个待扫描字符
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._key: Optional[str] = None     # 当前顶层键
+        self._expect = 'key'                # 顶层状态：key / colon / value / scalar / nested / comma
+        self._value_start = -1
+
+    def feed(self, chunk: str) -> None:
+        """追加一段流式文本并继续扫描"""
+        if not chunk or self.finished:
+            return
+        self.text += chunk
+        text = self.text
+        i = self._pos
+        n = len(text)
+
+        while i < n:
+            ch = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._close_top_string(i)
+                i += 1
+                continue
+
+            if self._depth == 0:
+                # 尚未进入顶层对象（或已结束）：跳过前导文本
+                if ch == '{':
+                    self._depth = 1
+                    self._expect = 'key'
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._depth == 1 and self._expect == 'value':
+                    self._value_start = i
+            elif ch in '{[':
+                if self._depth == 1 and self._expect == 'value':
+                    self._value_start = i
+                    self._expect = 'nested'
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._expect == 'nested':
+                    self._store(i + 1)
+                elif self._depth == 0:
+                    if self._expect == 'scalar':
+                        self._store(i)
+                    self.finished = True
+                    break
+            elif self._depth == 1:
+                if ch == ':' and self._expect == 'colon':
+                    self._expect = 'value'
+                elif ch == ',':
+                    if self._expect == 'scalar':
+                        self._store(i)
+                    self._expect = 'key'
+                elif self._expect == 'value' and not ch.isspace():
+                    # 数字、true/false/null：遇到 , 或 } 时闭合
+                    self._value_start = i
+                    self._expect = 'scalar'
+            i += 1
+
+        self._pos = i
+
+    def _close_top_string(self, end: int) -> None:
+        """顶层字符串闭合：可能是键，也可能是字符串值"""
+        if self._expect == 'key':
+            try:
+                self._key = json.loads(self.text[self._string_start:end + 1])
+            except ValueError:
+                self._key = None
+            self._expect = 'colon'
+        elif self._expect == 'value':
+            self._store(end + 1)
+
+    def _store(self, end: int) -> None:
+        raw = self.text[self._value_start:end].strip()
+        self._expect = 'comma'
+        if self._key is None:
+            return
+        try:
+            self.fields[self._key] = json.loads(raw)
+        except ValueError:
+            # 单个字段格式异常时不登记，调用方会读完整响应再整体解析
+            logger.debug(f"[流式解析] 字段 {self._key} 无法解析: {raw[:50]}")
+
+    def has_fields(self, names: Iterable[str]) -> bool:
+        return all(name in self.fields for name in names)
+
+    def to_json(self) -> str:
+        """已解析字段重新序列化为完整 JSON（用于提前中断后的响应文本）"""
+        return json.dumps(self.fields, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    sample = '```json\n{"sentiment_score": 72, "operation_advice": "买入", "dashboard": {"core_conclusion": {"one_sentence": "回踩 MA5 \\"低吸\\""}, "x": [1, {"y": "}"}]}, "ok": true, "trend_analysis": "很长'
+    scanner = JSONFieldScanner()
+    for k in range(0, len(sample), 7):
+        scanner.feed(sample[k:k + 7])
+        if scanner.has_fields(('sentiment_score', 'operation_advice', 'dashboard', 'ok')):
+            print(f"第 {k + 7} 个字符处字段就绪，可中断")
+            break
+    print(scanner.to_json())
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+大模型用量与费用统计
+===================================
+
+原先只在本地按提示词长度估算 token，服务商返回的 usage 没有记录，
+提示词裁剪、批量打包、前缀缓存等优化的效果只能靠"Prompt 长度"字符数判断。
+
+UsageRecorder 记录每次实际请求（含对冲请求、定向修复请求）的：
+- 输入 / 输出 / 命中缓存的 tokens（优先取服务商返回的 usage，没有时用本地估算并标记；
+  流式提前结束的请求收不到最后附带 usage 的分片，单独计数）
+- 请求耗时
+- 按价格表估算的费用（美元）
+并按三个层级汇总：单次调用 → 单只股票（track() 作用域，挂到 AnalysisResult.llm_usage）→ 整次运行。
+
+价格为各服务商公开的每百万 tokens 标价，会随时间调整，可用 LLM_PRICING 覆盖：
+    LLM_PRICING=gemini-2.5-flash=0.3/2.5/0.075,deepseek-chat=0.28/0.42/0.028
+    （模型名=输入/输出[/缓存命中输入]，按最长前缀匹配模型名）
+"""
+
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from llm_prefix_cache import _field, gemini_prompt_usage, openai_prompt_usage
+
+logger = logging.getLogger(__name__)
+
+# 模型名前缀 → (输入, 输出, 缓存命中输入) 美元 / 百万 tokens
+DEFAULT_PRICING: Dict[str, Tuple[float, float, float]] = {
+    'gemini-3-pro': (2.00, 12.00, 0.20),
+    'gemini-3-flash': (0.50, 3.00, 0.05),
+    'gemini-2.5-pro': (1.25, 10.00, 0.125),
+    'gemini-2.5-flash-lite': (0.10, 0.40, 0.01),
+    'gemini-2.5-flash': (0.30, 2.50, 0.03),
+    'gemini-2.0-flash': (0.10, 0.40, 0.025),
+    'gpt-4o-mini': (0.15, 0.60, 0.075),
+    'gpt-4o': (2.50, 10.00, 1.25),
+    'gpt-4.1-mini': (0.40, 1.60, 0.10),
+    'gpt-4.1': (2.00, 8.00, 0.50),
+    'deepseek-chat': (0.28, 0.42, 0.028),
+    'deepseek-reasoner': (0.28, 0.42, 0.028),
+}
+
+
+def parse_pricing(spec: str) -> Dict[str, Tuple[float, float, float]]:
+    """解析 LLM_PRICING（模型名=输入/输出[/缓存命中输入]，逗号分隔），格式错误的条目忽略"""
+    pricing = {}
+    for item in (spec or '').split(','):
+        model, _, prices = item.partition('=')
+        try:
+            values = [float(p) for p in prices.split('/')]
+        except ValueError:
+            values = []
+        if not model.strip() or len(values) not in (2, 3):
+            if item.strip():
+                logger.warning(f"[LLM费用] 忽略无法解析的价格配置: {item.strip()}")
+            continue
+        input_price, output_price = values[0], values[1]
+        pricing[model.strip().lower()] = (input_price, output_price, values[2] if len(values) == 3 else input_price)
+    return pricing
+
+
+@dataclass
+class CallUsage:
+    """单次请求的用量"""
+    provider: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int = 0
+    latency: float = 0.0               # 秒（不含配额等待）
+    estimated: bool = False            # 服务商未返回 usage，tokens 为本地估算
+    cost: Optional[float] = None       # 美元；模型不在价格表中时为 None
+    cutoff: bool = False               # 因流式提前结束收不到 usage 而估算
+
+
+@dataclass
+class UsageTotals:
+    """用量汇总（单只股票或整次运行）"""
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    max_prompt_tokens: int = 0
+    latency: float = 0.0
+    cost: float = 0.0
+    estimated_calls: int = 0           # tokens 为本地估算的请求数
+    unpriced_calls: int = 0            # 未计入费用的请求数（价格未知）
+    cutoff_calls: int = 0              # 估算的请求中因流式提前结束收不到 usage 的次数
+
+    def add(self, call: CallUsage) -> None:
+        self.calls += 1
+        self.prompt_tokens += call.prompt_tokens
+        self.completion_tokens += call.completion_tokens
+        self.cached_tokens += call.cached_tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, call.prompt_tokens)
+        self.latency += call.latency
+        self.estimated_calls += call.estimated
+        self.cutoff_calls += call.cutoff
+        if call.cost is None:
+            self.unpriced_calls += 1
+        else:
+            self.cost += call.cost
+
+    def merge(self, other: 'UsageTotals') -> None:
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cached_tokens += other.cached_tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, other.max_prompt_tokens)
+        self.latency += other.latency
+        self.cost += other.cost
+        self.estimated_calls += other.estimated_calls
+        self.unpriced_calls += other.unpriced_calls
+        self.cutoff_calls += other.cutoff_calls
+
+    def share(self, parts: int) -> 'UsageTotals':
+        """平均分摊给 parts 只股票（批量请求由多只股票共用，调用次数不分摊）"""
+        parts = max(parts, 1)
+        return UsageTotals(
+            calls=self.calls,
+            prompt_tokens=self.prompt_tokens // parts,
+            completion_tokens=self.completion_tokens // parts,
+            cached_tokens=self.cached_tokens // parts,
+            max_prompt_tokens=self.max_prompt_tokens,
+            latency=self.latency / parts,
+            cost=self.cost / parts,
+            estimated_calls=self.estimated_calls,
+            unpriced_calls=self.unpriced_calls,
+            cutoff_calls=self.cutoff_calls,
+        )
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_tokens': self.cached_tokens,
+            'latency': round(self.latency, 3),
+            'cost_usd': round(self.cost, 6),
+            'estimated_calls': self.estimated_calls,
+            'unpriced_calls': self.unpriced_calls,
+            'cutoff_calls': self.cutoff_calls,
+        }
+
+    def brief(self) -> str:
+        """一行摘要：调用次数、tokens、耗时、费用"""
+        cached = f"（缓存 {self.cached_tokens}）" if self.cached_tokens else ""
+        return (f"{self.calls} 次调用，输入 {self.prompt_tokens}{cached} / 输出 {self.completion_tokens} tokens，"
+                f"耗时 {self.latency:.1f}s，{self.cost_text()}")
+
+    def cost_text(self) -> str:
+        text = f"约 ${self.cost:.4f}"
+        if self.unpriced_calls:
+            text += f"（{self.unpriced_calls} 次调用价格未知未计入）"
+        return text
+
+
+# 当前股票的用量作用域；线程池中执行的请求需通过 contextvars.copy_context() 继承
+_scope: contextvars.ContextVar[Optional[UsageTotals]] = contextvars.ContextVar('llm_usage_scope', default=None)
+
+
+class UsageRecorder:
+    """
+    请求用量记录器（线程安全）
+
+    使用方式：
+        recorder = UsageRecorder()
+        with recorder.track() as usage:      # 单只股票的作用域（协程中同样适用）
+            ...                              # 期间的每次请求调用 recorder.record(...)
+        result.llm_usage = usage
+        recorder.summary()                   # 整次运行的汇总
+    """
+
+    def __init__(self, pricing: Optional[Dict[str, Tuple[float, float, float]]] = None):
+        self._lock = threading.Lock()
+        self._pricing = {**DEFAULT_PRICING, **(pricing or {})}
+        self.total = UsageTotals()
+        self.by_model: Dict[str, UsageTotals] = {}
+
+    def price(self, model: str) -> Optional[Tuple[float, float, float]]:
+        """按最长前缀匹配价格（忽略 models/ 前缀与大小写）"""
+        name = (model or '').lower().split('/')[-1]
+        matches = [key for key in self._pricing if name.startswith(key)]
+        return self._pricing[max(matches, key=len)] if matches else None
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+        prices = self.price(model)
+        if prices is None:
+            return None
+        input_price, output_price, cached_price = prices
+        uncached = max(prompt_tokens - cached_tokens, 0)
+        return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1e6
+
+    def record(
+        self,
+        provider: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        latency: float = 0.0,
+        estimated: bool = False,
+        cutoff: bool = False,
+    ) -> CallUsage:
+        """登记一次请求，计入整次运行、按模型汇总以及当前股票的作用域"""
+        call = CallUsage(
+            provider, model, prompt_tokens, completion_tokens, cached_tokens, latency, estimated,
+            self.cost(model, prompt_tokens, completion_tokens, cached_tokens), cutoff,
+        )
+        scope = _scope.get()
+        with self._lock:
+            self.total.add(call)
+            self.by_model.setdefault(f"{provider}:{model}", UsageTotals()).add(call)
+            if scope is not None:
+                scope.add(call)
+        cost = '价格未知' if call.cost is None else f"${call.cost:.5f}"
+        logger.info(f"[LLM用量] {provider}:{model} 输入 {prompt_tokens} (缓存 {cached_tokens}) / 输出 {completion_tokens} tokens"
+                    f"{('（估算，流式提前结束）' if cutoff else '（估算）') if estimated else ''}, 耗时 {latency:.2f}s, {cost}")
+        return call
+
+    @contextmanager
+    def track(self) -> Iterator[UsageTotals]:
+        """统计作用域内（含嵌套调用、对冲线程）的全部请求；嵌套作用域的用量同时计入外层"""
+        outer = _scope.get()
+        usage = UsageTotals()
+        token = _scope.set(usage)
+        try:
+            yield usage
+        finally:
+            _scope.reset(token)
+            if outer is not None:
+                with self._lock:
+                    outer.merge(usage)
+
+    def snapshot(self) -> UsageTotals:
+        """整次运行汇总的副本"""
+        with self._lock:
+            return replace(self.total)
+
+    def summary(self) -> str:
+        """整次运行的汇总（按模型列出费用）"""
+        with self._lock:
+            total = self.total
+            if not total.calls:
+                return "无实际请求"
+            models = "，".join(
+                f"{name} {item.calls} 次 {item.cost_text()}" for name, item in
+                sorted(self.by_model.items(), key=lambda kv: -kv[1].cost)
+            )
+            estimated = f"，其中 {total.estimated_calls} 次无 usage 按估算" if total.estimated_calls else ""
+            if total.cutoff_calls:
+                estimated += f"（{total.cutoff_calls} 次因流式提前结束）"
+            return (f"实际请求 {total.calls} 次{estimated}，输入 {total.prompt_tokens}（缓存 {total.cached_tokens}）"
+                    f" / 输出 {total.completion_tokens} tokens，请求耗时合计 {total.latency:.1f}s，"
+                    f"费用{total.cost_text()}（{models}）")
+
+
+def openai_usage(response: Any) -> Optional[Tuple[int, int, int]]:
+    """OpenAI 兼容响应（或带 usage 的流式分片）的 (输入, 输出, 命中缓存) tokens，无 usage 时返回 None"""
+    usage = _field(response, 'usage')
+    if usage is None:
+        return None
+    prompt_tokens, cached = openai_prompt_usage(response)
+    completion = int(_field(usage, 'completion_tokens') or 0)
+    if not prompt_tokens and not completion:
+        return None
+    return prompt_tokens, completion, cached
+
+
+def gemini_usage(response: Any) -> Optional[Tuple[int, int, int]]:
+    """Gemini 响应（或流式分片）的 (输入, 输出, 命中缓存) tokens；思考 tokens 按输出计费"""
+    usage = _field(response, 'usage_metadata')
+    if usage is None:
+        return None
+    prompt_tokens, cached = gemini_prompt_usage(response)
+    completion = int(_field(usage, 'candidates_token_count') or 0) + int(_field(usage, 'thoughts_token_count') or 0)
+    if not prompt_tokens and not completion:
+        return None
+    return prompt_tokens, completion, cached
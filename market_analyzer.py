@@ -19,6 +19,7 @@ import akshare as ak
 import pandas as pd
 
 from config import get_config
+from data_provider.rate_governor import get_rate_governor
 from search_service import SearchService
 
 logger = logging.getLogger(__name__)
@@ -183,6 +184,7 @@ class MarketAnalyzer:
             logger.info("[大盘] 获取市场涨跌统计...")
             
             # 获取全部A股实时行情
+            get_rate_governor('eastmoney').acquire()
             df = ak.stock_zh_a_spot_em()
             
             if df is not None and not df.empty:
@@ -217,6 +219,7 @@ class MarketAnalyzer:
             logger.info("[大盘] 获取板块涨跌榜...")
             
             # 获取行业板块行情
+            get_rate_governor('eastmoney').acquire()
             df = ak.stock_board_industry_name_em()
             
             if df is not None and not df.empty:
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+趋势分析参数寻优
+===================================
+
+对 StockTrendAnalyzer 的阈值（BIAS_THRESHOLD、VOLUME_SHRINK_RATIO、VOLUME_HEAVY_RATIO、
+MA_SUPPORT_TOLERANCE）和评分权重（TREND_SCORES、BIAS_SCORES、VOLUME_SCORES、SUPPORT_SCORE）
+做网格 / 随机搜索：
+
+1. 面板数组放入共享内存，子进程按名称挂载，不随每个任务 pickle
+2. 每组参数用 compute_signals 向量化算出全部信号，统计买入信号的未来收益
+3. 进程池铺满所有 CPU 核心
+
+参数写法：阈值直接用属性名；权重表的单项用"表名.键"，如
+TREND_SCORES.STRONG_BULL、VOLUME_SCORES.SHRINK_VOLUME_DOWN、BIAS_SCORES.2
+
+使用方式：
+    python param_sweep.py --mode grid --horizon 5
+    python param_sweep.py --mode random --samples 500 --workers 8
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Sequence, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest import forward_stats, load_panel
+from stock_analyzer import StockTrendAnalyzer, PricePanel, BuySignal, SIGNAL_CODES
+
+logger = logging.getLogger(__name__)
+
+# 阈值搜索空间（网格模式默认）
+THRESHOLD_SPACE: Dict[str, List[Any]] = {
+    'BIAS_THRESHOLD': [3.0, 4.0, 5.0, 6.0, 8.0],
+    'VOLUME_SHRINK_RATIO': [0.5, 0.6, 0.7, 0.8],
+    'VOLUME_HEAVY_RATIO': [1.3, 1.5, 2.0],
+    'MA_SUPPORT_TOLERANCE': [0.01, 0.02, 0.03],
+}
+
+# 评分权重搜索空间（随机模式默认与阈值一起采样）
+WEIGHT_SPACE: Dict[str, List[Any]] = {
+    'TREND_SCORES.STRONG_BULL': [30, 40, 50],
+    'TREND_SCORES.BULL': [25, 35, 45],
+    'BIAS_SCORES.2': [20, 30, 40],
+    'BIAS_SCORES.3': [20, 28, 35],
+    'VOLUME_SCORES.SHRINK_VOLUME_DOWN': [10, 20, 30],
+    'VOLUME_SCORES.HEAVY_VOLUME_UP': [5, 15, 25],
+    'SUPPORT_SCORE': [0, 5, 10],
+}
+
+# 统计收益的信号
+BUY_CODES = [SIGNAL_CODES[BuySignal.STRONG_BUY], SIGNAL_CODES[BuySignal.BUY]]
+
+PANEL_FIELDS = ('dates', 'close', 'high', 'volume', 'lengths')
+
+
+def make_analyzer(params: Dict[str, Any]) -> StockTrendAnalyzer:
+    """按参数覆盖实例属性（类常量不变，各组参数互不影响）"""
+    analyzer = StockTrendAnalyzer()
+    for key, value in params.items():
+        attr, _, item = key.partition('.')
+        if not hasattr(StockTrendAnalyzer, attr):
+            raise ValueError(f"未知参数: {key}")
+        if not item:
+            setattr(analyzer, attr, value)
+            continue
+
+        table = getattr(analyzer, attr)
+        if isinstance(table, dict):
+            enum_cls = type(next(iter(table)))
+            table = dict(table)
+            table[enum_cls[item]] = value
+        else:
+            table = list(table)
+            table[int(item)] = value
+            table = tuple(table)
+        setattr(analyzer, attr, table)
+    return analyzer
+
+
+def grid(space: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """网格搜索：全部组合"""
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_samples(space: Dict[str, Sequence[Any]], n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """随机搜索：每个参数独立均匀抽取，去重"""
+    rng = random.Random(seed)
+    seen, samples = set(), []
+    total = int(np.prod([len(v) for v in space.values()]))
+    while len(samples) < min(n, total):
+        params = {k: rng.choice(list(v)) for k, v in space.items()}
+        key = tuple(params.values())
+        if key not in seen:
+            seen.add(key)
+            samples.append(params)
+    return samples
+
+
+class SharedPanel:
+    """
+    放在共享内存中的 PricePanel
+
+    使用方式：
+        with SharedPanel(panel) as shared:
+            # 把 shared.spec（只有名称和形状）传给子进程
+            panel, blocks = attach_panel(shared.spec)
+    """
+
+    def __init__(self, panel: PricePanel):
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self.spec: Dict[str, Any] = {'codes': panel.codes, 'arrays': {}}
+        for name in PANEL_FIELDS:
+            array = np.ascontiguousarray(getattr(panel, name))
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            self._blocks.append(shm)
+            self.spec['arrays'][name] = (shm.name, array.shape, array.dtype.str)
+
+    def close(self) -> None:
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self) -> 'SharedPanel':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def attach_panel(spec: Dict[str, Any]) -> Tuple[PricePanel, List[shared_memory.SharedMemory]]:
+    """
+    按名称挂载共享内存中的面板（零拷贝）
+
+    Returns:
+        (面板, 共享内存句柄)；句柄须在面板使用期间保持引用
+    """
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in spec['arrays'].items():
+        # 进程池子进程与父进程共用同一个 resource_tracker，挂载时的重复登记不会导致提前释放
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return PricePanel(codes=list(spec['codes']), **arrays), blocks
+
+
+# ========== 子进程 ==========
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(spec: Dict[str, Any], horizon: int) -> None:
+    panel, blocks = attach_panel(spec)
+    returns, _ = forward_stats(panel.close, horizon)
+    _worker_state.update(panel=panel, blocks=blocks, returns=returns)
+
+
+def _evaluate(params: Dict[str, Any]) -> Dict[str, Any]:
+    """单组参数：买入信号的样本数、平均收益、胜率，以及评分与收益的秩相关系数"""
+    panel, returns = _worker_state['panel'], _worker_state['returns']
+    signals = make_analyzer(params).compute_signals(panel)
+    valid = signals['valid'] & ~np.isnan(returns)
+
+    buy = valid & np.isin(signals['buy_signal'], BUY_CODES)
+    buy_returns = returns[buy]
+    row = dict(params)
+    row['n'] = int(buy.sum())
+    row['mean'] = float(buy_returns.mean()) if len(buy_returns) else np.nan
+    row['hit'] = float((buy_returns > 0).mean()) if len(buy_returns) else np.nan
+    row['score_ic'] = _rank_corr(signals['score'][valid], returns[valid])
+    return row
+
+
+def _rank_corr(x: np.ndarray, y: np.ndarray) -> float:
+    """Spearman 秩相关系数（不依赖 scipy）"""
+    if len(x) < 2:
+        return np.nan
+    rx = pd.Series(x).rank().values
+    ry = pd.Series(y).rank().values
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return float(np.corrcoef(rx, ry)[0, 1])
+
+
+def run_sweep(
+    panel: PricePanel,
+    param_sets: List[Dict[str, Any]],
+    horizon: int = 5,
+    workers: Optional[int] = None,
+    min_samples: int = 100
+) -> pd.DataFrame:
+    """
+    并行评估多组参数
+
+    Args:
+        panel: 日线面板（前复权）
+        param_sets: 参数组列表（空字典即默认参数）
+        horizon: 统计收益的持有期（交易日）
+        workers: 进程数，默认 CPU 核心数；1 表示在当前进程内运行
+        min_samples: 买入信号样本数低于此值的参数组排在最后
+
+    Returns:
+        每组参数一行，按平均收益降序
+    """
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"参数寻优: {len(param_sets)} 组参数, 面板 {panel.shape[1]} 只 × {panel.shape[0]} 根, {workers} 进程")
+
+    with SharedPanel(panel) as shared:
+        if workers <= 1:
+            _init_worker(shared.spec, horizon)
+            rows = [_evaluate(params) for params in param_sets]
+            _worker_state.clear()
+        else:
+            chunksize = max(1, len(param_sets) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shared.spec, horizon)) as pool:
+                rows = list(pool.map(_evaluate, param_sets, chunksize=chunksize))
+
+    metrics = ['n', 'mean', 'hit', 'score_ic']
+    df = pd.DataFrame(rows)
+    df = df[[c for c in df.columns if c not in metrics] + metrics]
+    df['enough'] = df['n'] >= min_samples
+    df = df.sort_values(['enough', 'mean'], ascending=[False, False]).drop(columns='enough')
+    return df.reset_index(drop=True)
+
+
+def main():
+    from config import get_config
+    from data_provider import BarStore
+
+    parser = argparse.ArgumentParser(description="趋势分析参数寻优（基于日线缓存）")
+    parser.add_argument('--mode', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--samples', type=int, default=200, help="随机搜索的参数组数")
+    parser.add_argument('--horizon', type=int, default=5, help="持有期（交易日，≥ 1）")
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认 CPU 核心数")
+    parser.add_argument('--codes', default='', help="股票代码（逗号分隔），默认全部已缓存股票")
+    parser.add_argument('--start', default=None, help="开始日期 YYYY-MM-DD")
+    parser.add_argument('--top', type=int, default=20, help="输出前 N 组")
+    args = parser.parse_args()
+    if args.horizon < 1:
+        parser.error(f"--horizon 须为 ≥ 1 的交易日数: {args.horizon}")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    config = get_config()
+    codes = [c.strip() for c in args.codes.split(',') if c.strip()] or None
+    panel = load_panel(BarStore(fetcher=None, cache_dir=config.cache_dir), codes, start_date=args.start)
+    if not panel.codes:
+        logger.error("没有可用的缓存数据，请先运行 ql_warmup.py 或 ql_main.py 建立日线缓存")
+        return
+
+    if args.mode == 'grid':
+        param_sets = grid(THRESHOLD_SPACE)
+    else:
+        param_sets = random_samples({**THRESHOLD_SPACE, **WEIGHT_SPACE}, args.samples)
+    # 第一组为当前默认参数，便于对照
+    param_sets = [{}] + param_sets
+
+    result = run_sweep(panel, param_sets, horizon=args.horizon, workers=args.workers)
+    with pd.option_context('display.width', 200, 'display.max_columns', 50):
+        print(result.head(args.top).to_string())
+        params = result.columns[:-4]
+        baseline = result[result[params].isna().all(axis=1)]
+        print("\n默认参数:")
+        print(baseline.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+提示词 token 预算
+===================================
+
+_format_prompt 原先把各数据表、趋势理由和完整新闻直接拼接，没有任何长度控制，
+新闻一多 prompt 就随之膨胀，延迟与费用都不可预期。
+
+这里把提示词拆成带优先级的段落，按 token 预算组装：
+1. 计数：安装了 tiktoken 时用本地分词器，否则用 llm_limiter.estimate_tokens 估算
+2. 新闻：先压到独立的新闻预算内，按"序号靠后 → 日期较早"的顺序整条删除
+3. 总量超限时，从优先级最低的段落开始，能缩短的缩短到下限，不能缩短的整段删除
+4. 必需段落（基础信息、今日行情）永不裁剪
+
+未超预算时各段落原样拼接，输出与不做预算控制时逐字节相同。
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from llm_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+REQUIRED = 1 << 30  # 必需段落的优先级
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    """懒加载 tiktoken 编码器（可选依赖，未安装时返回 None）"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.debug(f"[Prompt预算] tiktoken 不可用，使用估算: {e}")
+    return _encoder
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """统计文本 token 数（tiktoken 优先，否则估算）"""
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "\n……（已截断）") -> str:
+    """按 token 上限截断文本（结果含 suffix，不超过 max_tokens）"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    limit = max_tokens - count_tokens(suffix)
+    if limit <= 0:
+        return ""
+    # 二分最长的不超限前缀
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= limit:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + suffix
+
+
+_ITEM_PATTERN = re.compile(r'^\s*(\d+)\.\s')
+_DATE_PATTERN = re.compile(r'\d{4}-\d{1,2}-\d{1,2}')
+
+
+def trim_news(news: str, max_tokens: int) -> str:
+    """
+    把新闻文本压到 max_tokens 以内
+
+    以"  1. 标题 [日期]"开头、后接缩进摘要行的为一条新闻（format_intel_report 格式）。
+    先按序号从大到小、同序号日期从早到晚整条删除；每个分类至少保留第一条，
+    仍超限时按 token 截断尾部。
+    """
+    if count_tokens(news) <= max_tokens:
+        return news
+
+    lines = news.split('\n')
+    items = []   # (序号, 日期, 起始行, 结束行)
+    i = 0
+    while i < len(lines):
+        match = _ITEM_PATTERN.match(lines[i])
+        if not match:
+            i += 1
+            continue
+        start = i
+        i += 1
+        while i < len(lines) and lines[i].startswith('     ') and not _ITEM_PATTERN.match(lines[i]):
+            i += 1
+        date = _DATE_PATTERN.search(lines[start])
+        items.append((int(match.group(1)), date.group(0) if date else '', start, i))
+
+    removed = set()
+    for rank, date, start, end in sorted(items, key=lambda x: (-x[0], x[1])):
+        if rank <= 1:
+            break
+        removed.update(range(start, end))
+        text = '\n'.join(line for k, line in enumerate(lines) if k not in removed)
+        if count_tokens(text) <= max_tokens:
+            return text
+
+    text = '\n'.join(line for k, line in enumerate(lines) if k not in removed)
+    return truncate_to_tokens(text, max_tokens)
+
+
+@dataclass
+class PromptSection:
+    """
+    提示词段落
+
+    priority 越小越先被裁剪，REQUIRED 永不裁剪；
+    提供 shrink 的段落先缩短到 min_tokens，仍超限时保留下限，不再删除。
+    """
+    name: str
+    text: str
+    priority: int = REQUIRED
+    shrink: Optional[Callable[[int], str]] = None
+    min_tokens: int = 0
+    tokens: int = field(init=False)
+
+    def __post_init__(self):
+        self.tokens = count_tokens(self.text)
+
+
+def assemble_prompt(sections: List[PromptSection], budget: int) -> Tuple[str, List[str]]:
+    """
+    按预算组装段落
+
+    Args:
+        sections: 按输出顺序排列的段落
+        budget: 总 token 上限（<=0 表示不限）
+
+    Returns:
+        (提示词, 被裁剪段落的说明列表)
+    """
+    notes = []
+    total = sum(s.tokens for s in sections)
+    if budget > 0 and total > budget:
+        kept = list(sections)
+        for section in sorted(sections, key=lambda s: s.priority):
+            if total <= budget or section.priority >= REQUIRED:
+                break
+            if section.shrink is not None:
+                target = max(section.min_tokens, section.tokens - (total - budget))
+                if target >= section.tokens:
+                    continue
+                before = section.tokens
+                section.text = section.shrink(target)
+                section.tokens = count_tokens(section.text)
+                total -= before - section.tokens
+                notes.append(f"{section.name} {before}→{section.tokens}")
+            else:
+                kept.remove(section)
+                total -= section.tokens
+                notes.append(f"{section.name} 删除({section.tokens})")
+        sections = kept
+    return ''.join(s.text for s in sections), notes
+
+
+if __name__ == "__main__":
+    news = "【贵州茅台 情报搜索结果】\n\n📰 最新消息 (来源: Tavily):\n" + "\n".join(
+        f"  {i}. 新闻标题{i} [2026-01-0{i}]\n     {'摘要内容' * 30}..." for i in range(1, 4)
+    ) + "\n\n⚠️ 风险排查 (来源: Tavily):\n" + "\n".join(
+        f"  {i}. 风险{i}\n     {'风险描述' * 30}..." for i in range(1, 4)
+    )
+    print(f"原始 {count_tokens(news)} tokens")
+    trimmed = trim_news(news, 400)
+    print(f"压缩后 {count_tokens(trimmed)} tokens:\n{trimmed}")
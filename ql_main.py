@@ -9,7 +9,8 @@ import os
 import sys
 import time
 import logging
-from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 
@@ -64,13 +65,13 @@ def get_env_list(key: str) -> List[str]:
     return [v.strip() for v in value.split(',') if v.strip()] if value else []
 
 
-def build_context(code: str, df, realtime_quote, chip_data) -> Optional[Dict[str, Any]]:
-    if df is None or df.empty:
-        return None
-    df = df.sort_values('date', ascending=False).reset_index(drop=True)
-    today_row = df.iloc[0] if len(df) > 0 else None
-    if today_row is None:
+def build_context(code: str, bars, realtime_quote, chip_data) -> Optional[Dict[str, Any]]:
+    from data_provider import BarSeries
+    
+    bars = BarSeries.from_frame(bars)
+    if bars.empty:
         return None
+    today_row = bars.row(-1)
     
     context = {
         'code': code,
@@ -89,8 +90,8 @@ def build_context(code: str, df, realtime_quote, chip_data) -> Optional[Dict[str
         }
     }
     
-    if len(df) > 1:
-        yesterday = df.iloc[1]
+    if len(bars) > 1:
+        yesterday = bars.row(-2)
         context['yesterday'] = {'close': yesterday.get('close'), 'volume': yesterday.get('volume')}
         if yesterday.get('volume') and yesterday['volume'] > 0:
             context['volume_change_ratio'] = round(today_row.get('volume', 0) / yesterday['volume'], 2)
@@ -129,6 +130,41 @@ def build_context(code: str, df, realtime_quote, chip_data) -> Optional[Dict[str
     return context
 
 
+def build_skipped_result(code: str, stock_name: str, quality):
+    """
+    数据质量检查未通过（停牌/过期/数据非法）时的模板化结果
+    
+    不调用实时行情、筹码、新闻搜索和大模型，直接给出观望结论
+    """
+    from analyzer import AnalysisResult
+    
+    summary = quality.summary()
+    return AnalysisResult(
+        code=code,
+        name=stock_name,
+        sentiment_score=50,
+        trend_prediction='震荡',
+        operation_advice='观望',
+        confidence_level='低',
+        dashboard={'core_conclusion': {'one_sentence': f"数据异常，暂不分析：{summary}"[:60]}},
+        analysis_summary=f"数据质量检查未通过，跳过AI分析：{summary}",
+        risk_warning=summary,
+        data_sources='数据质量检查',
+    )
+
+
+def summarize_llm_usage(results: List) -> str:
+    """各股票大模型用量的合计（tokens 与估算费用）"""
+    usages = [r.llm_usage for r in results if getattr(r, 'llm_usage', None)]
+    if not usages:
+        return ""
+    prompt_tokens = sum(u.prompt_tokens for u in usages)
+    completion_tokens = sum(u.completion_tokens for u in usages)
+    cost = sum(u.cost for u in usages)
+    unpriced = "，部分模型价格未知未计入" if any(u.unpriced_calls for u in usages) else ""
+    return f"🤖 LLM 输入 {prompt_tokens} / 输出 {completion_tokens} tokens，约 ${cost:.4f}{unpriced}"
+
+
 def generate_report(results: List, report_date: str) -> str:
     buy_count = sum(1 for r in results if r.operation_advice in ['买入', '加仓', '强烈买入'])
     sell_count = sum(1 for r in results if r.operation_advice in ['卖出', '减仓', '强烈卖出'])
@@ -189,22 +225,34 @@ def generate_report(results: List, report_date: str) -> str:
         lines.append("---")
         lines.append("")
     
+    usage = summarize_llm_usage(results)
+    if usage:
+        lines.append(f"*{usage}*")
+        lines.append("")
     lines.append(f"*生成时间: {datetime.now().strftime('%H:%M:%S')}*")
     return "\n".join(lines)
 
 
 def run_stock_analysis(stock_list: List[str]) -> List:
     from config import Config, get_config
-    from data_provider import DataFetcherManager
+    from data_provider import DataFetcherManager, BarStore, BarSeries
     from data_provider.akshare_fetcher import AkshareFetcher
+    from data_provider.quality import check_data_quality
     from analyzer import GeminiAnalyzer
     from search_service import SearchService
-    from stock_analyzer import StockTrendAnalyzer
+    from stock_analyzer import StockTrendAnalyzer, describe_signal_transition
+    from support_resistance import find_key_levels, DEFAULT_LOOKBACK_DAYS
     
     Config.reset_instance()
+    config = get_config()
     
-    fetcher_manager = DataFetcherManager()
-    akshare_fetcher = AkshareFetcher()
+    akshare_fetcher = AkshareFetcher(cache_dir=config.cache_dir)
+    calendar = akshare_fetcher.get_trade_calendar()
+    bar_store = None
+    if config.bar_cache_enabled:
+        bar_store = BarStore(akshare_fetcher, cache_dir=config.cache_dir,
+                             history_days=config.bar_cache_history_days, calendar=calendar)
+    fetcher_manager = DataFetcherManager(bar_store=bar_store)
     trend_analyzer = StockTrendAnalyzer()
     analyzer = GeminiAnalyzer()
     search_service = SearchService(
@@ -212,7 +260,29 @@ def run_stock_analysis(stock_list: List[str]) -> List:
         serpapi_keys=get_env_list('SERPAPI_API_KEYS'),
     )
     
+    if config.screener_enabled:
+        if bar_store is None:
+            logger.warning("选股需要日线缓存（BAR_CACHE_ENABLED=true），跳过选股")
+        else:
+            from screener import MarketScreener
+            screener = MarketScreener(akshare_fetcher, bar_store, trend_analyzer=trend_analyzer, calendar=calendar)
+            candidates = screener.screen(top_n=config.screener_top_n, min_score=config.screener_min_score,
+                                         exclude=stock_list)
+            stock_list = stock_list + [c.code for c in candidates]
+    
     results = []
+    # 大模型调用提交到线程池，与后续股票的数据采集并行；请求节奏由 RPM/TPM 配额控制。
+    # LLM_BATCH_SIZE > 1 时每凑满一批就打包成一次请求
+    llm_pool = ThreadPoolExecutor(max_workers=max(1, config.max_workers))
+    batch_size = max(1, config.llm_batch_size)
+    batch, pending = [], []
+    
+    def submit_batch():
+        if batch:
+            contexts = [item[2] for item in batch]
+            news = [item[3] for item in batch]
+            pending.append((list(batch), llm_pool.submit(analyzer.analyze_packed, contexts, news)))
+            batch.clear()
     
     for i, code in enumerate(stock_list, 1):
         logger.info(f"\n[{i}/{len(stock_list)}] 处理: {code}")
@@ -223,6 +293,17 @@ def run_stock_analysis(stock_list: List[str]) -> List:
                 logger.warning(f"[{code}] 数据为空")
                 continue
             logger.info(f"[{code}] 数据获取成功 ({source})")
+            # 后续各环节共用同一份只读序列（不再各自排序、复制）
+            bars = BarSeries.from_frame(df)
+            
+            quality = check_data_quality(bars.frame, code, calendar=calendar)
+            if quality.should_skip:
+                stock_name = akshare_fetcher.get_stock_name(code) or f'股票{code}'
+                logger.warning(f"[{code}] 数据质量检查未通过，跳过后续分析: {quality.summary()}")
+                results.append(build_skipped_result(code, stock_name, quality))
+                continue
+            if quality.issues:
+                logger.info(f"[{code}] 数据质量提示: {quality.summary()}")
             
             realtime_quote = None
             stock_name = f'股票{code}'
@@ -233,6 +314,8 @@ def run_stock_analysis(stock_list: List[str]) -> List:
                     logger.info(f"[{code}] {stock_name} 价格: {realtime_quote.price}")
             except Exception as e:
                 logger.warning(f"[{code}] 实时行情失败: {e}")
+            if stock_name.startswith('股票'):
+                stock_name = akshare_fetcher.get_stock_name(code) or stock_name
             
             chip_data = None
             try:
@@ -242,7 +325,9 @@ def run_stock_analysis(stock_list: List[str]) -> List:
             
             trend_result = None
             try:
-                trend_result = trend_analyzer.analyze(df, code)
+                trend_result = trend_analyzer.analyze(bars, code)
+                trend_result.signal_transition = describe_signal_transition(
+                    trend_analyzer.analyze_series(bars, code))
             except:
                 pass
             
@@ -255,8 +340,9 @@ def run_stock_analysis(stock_list: List[str]) -> List:
                 except Exception as e:
                     logger.warning(f"[{code}] 新闻搜索失败: {e}")
             
-            context = build_context(code, df, realtime_quote, chip_data)
+            context = build_context(code, bars, realtime_quote, chip_data)
             if context:
+                context.setdefault('stock_name', stock_name)
                 if trend_result:
                     context['trend_analysis'] = {
                         'trend_status': trend_result.trend_status.value,
@@ -265,20 +351,48 @@ def run_stock_analysis(stock_list: List[str]) -> List:
                         'bias_ma10': trend_result.bias_ma10,
                         'buy_signal': trend_result.buy_signal.value,
                         'signal_score': trend_result.signal_score,
+                        'signal_transition': trend_result.signal_transition,
                         'signal_reasons': trend_result.signal_reasons,
                         'risk_factors': trend_result.risk_factors,
                     }
                 
+                # 关键价位：优先使用日线缓存中的长周期历史（只读磁盘）
+                try:
+                    history = bars
+                    if bar_store is not None and bar_store.supports(code):
+                        start = (datetime.now() - timedelta(days=DEFAULT_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+                        cached = bar_store.get_adjusted(code, start_date=start)
+                        if len(cached) > len(bars):
+                            history = cached
+                    price = realtime_quote.price if realtime_quote and realtime_quote.price else None
+                    context['key_levels'] = find_key_levels(history, current_price=price).to_dict()
+                except Exception as e:
+                    logger.warning(f"[{code}] 关键价位计算失败: {e}")
+                
                 logger.info(f"[{code}] AI分析中...")
-                result = analyzer.analyze(context, news_context=news_context)
-                if result:
-                    results.append(result)
-                    logger.info(f"[{code}] ✅ {result.operation_advice} 评分{result.sentiment_score}")
+                # 先占位，保持结果顺序与股票列表一致
+                batch.append((code, len(results), context, news_context))
+                results.append(None)
+                if len(batch) >= batch_size:
+                    submit_batch()
         
         except Exception as e:
             logger.error(f"[{code}] 处理失败: {e}")
+    submit_batch()
+    
+    for items, future in pending:
+        try:
+            for (code, index, _, _), result in zip(items, future.result()):
+                results[index] = result
+                usage = f" | LLM {result.llm_usage.brief()}" if result.llm_usage else ""
+                logger.info(f"[{code}] ✅ {result.operation_advice} 评分{result.sentiment_score}{usage}")
+        except Exception as e:
+            logger.error(f"[{', '.join(item[0] for item in items)}] AI分析失败: {e}")
+    llm_pool.shutdown()
+    logger.info(f"[LLM统计] {analyzer.token_summary()}")
+    analyzer.close()
     
-    return results
+    return [r for r in results if r is not None]
 
 
 def run_market_review() -> Optional[str]:
@@ -297,6 +411,7 @@ def run_market_review() -> Optional[str]:
     
     market = MarketAnalyzer(search_service=search_service, analyzer=analyzer)
     report = market.run_daily_review()
+    analyzer.close()
     
     if report:
         logger.info("大盘复盘完成")
@@ -319,10 +434,13 @@ def main():
     print("=" * 50)
     
     stock_list = get_env_list('STOCK_LIST')
-    if not stock_list:
+    screener_enabled = os.environ.get('SCREENER_ENABLED', '').lower() in ('true', '1', 'yes')
+    if not stock_list and not screener_enabled:
         logger.error("❌ 未配置 STOCK_LIST")
         sys.exit(1)
-    logger.info(f"✅ 自选股: {', '.join(stock_list)}")
+    logger.info(f"✅ 自选股: {', '.join(stock_list) or '无'}")
+    if screener_enabled:
+        logger.info(f"✅ 全市场选股: 前 {os.environ.get('SCREENER_TOP_N', '10')} 只")
     
     openai_key = os.environ.get('OPENAI_API_KEY', '')
     gemini_key = os.environ.get('GEMINI_API_KEY', '')
@@ -360,6 +478,9 @@ def main():
             ]
             for r in sorted(results, key=lambda x: x.sentiment_score, reverse=True):
                 summary_lines.append(f"{r.get_emoji()} {r.name}({r.code}): {r.operation_advice} {r.sentiment_score}分")
+            usage = summarize_llm_usage(results)
+            if usage:
+                summary_lines.extend(["", usage])
             summary = "\n".join(summary_lines)
     
     market_enabled = os.environ.get('MARKET_REVIEW_ENABLED', 'true').lower() in ('true', '1', 'yes')
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cron: 0 16 * * 1-5
+new Env('A股缓存预热')
+"""
+
+# 错峰预热缓存，让 18:00 的 ql_main 主任务几乎全部命中缓存，时间预算留给大模型：
+# 1. 交易日历、A 股代码-名称列表
+# 2. 自选股日线（BarStore 增量更新）
+# 3. 自选股筹码分布
+# 4. 开启全市场选股（SCREENER_ENABLED）时，全部 A 股日线（供 screener 只读使用）：
+#    收盘后用一次全市场快照请求追加当日 K 线；首次建库、停牌复牌、除权的股票逐只补齐，
+#    限时 WARMUP_BACKFILL_MINUTES（默认 90 分钟，保证在 18:00 主任务前结束），未完成的下次预热接着补
+#
+# 推荐收盘后运行（当日 K 线与筹码已定型）；盘前运行同样可以补齐历史与参考数据。
+# 预热任务使用更宽松的请求间隔（WARMUP_SLEEP_MIN/WARMUP_SLEEP_MAX），
+# 仍与其他青龙任务共享主机级请求预算（RateGovernor）。
+
+import os
+import sys
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+os.chdir(SCRIPT_DIR)
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+for lib in ['urllib3', 'httpx', 'httpcore']:
+    logging.getLogger(lib).setLevel(logging.WARNING)
+
+
+def warm_up() -> dict:
+    from config import get_config
+    from data_provider import BarStore
+    from data_provider.akshare_fetcher import AkshareFetcher
+
+    config = get_config()
+    fetcher = AkshareFetcher(
+        sleep_min=config.warmup_sleep_min,
+        sleep_max=config.warmup_sleep_max,
+        cache_dir=config.cache_dir,
+    )
+    stats = {'bars': 0, 'chips': 0, 'snapshot': 0, 'failed': []}
+    deadline = time.monotonic() + config.warmup_backfill_minutes * 60
+
+    calendar = fetcher.get_trade_calendar(refresh=True)
+    logger.info(f"✅ 交易日历: {'工作日近似' if calendar.is_fallback else '已更新'}")
+
+    names = fetcher.get_symbol_master(refresh=True)
+    logger.info(f"✅ 股票列表: {len(names)} 只")
+
+    bar_store = None
+    if config.bar_cache_enabled:
+        bar_store = BarStore(fetcher, cache_dir=config.cache_dir,
+                             history_days=config.bar_cache_history_days, calendar=calendar)
+
+    for i, code in enumerate(config.stock_list, 1):
+        logger.info(f"[{i}/{len(config.stock_list)}] 预热: {code}")
+        try:
+            if bar_store is not None and bar_store.supports(code):
+                stats['bars'] += bar_store.update(code)
+            if fetcher.get_chip_distribution(code, refresh=True) is not None:
+                stats['chips'] += 1
+        except Exception as e:
+            logger.warning(f"[{code}] 预热失败: {e}")
+            stats['failed'].append(code)
+
+    if config.screener_enabled and bar_store is not None:
+        watchlist = set(config.stock_list)
+        universe = [c for c in names if c not in watchlist and bar_store.supports(c)]
+        logger.info(f"🔍 全市场日线预热: {len(universe)} 只")
+
+        # 收盘后的全市场快照即当日 K 线：一次请求更新所有缓存连续的股票
+        if calendar.last_close().date() == datetime.now().date():
+            stats['snapshot'] = bar_store.append_snapshot(fetcher.get_spot_snapshot(), codes=universe)
+            logger.info(f"🔍 快照追加当日K线: {stats['snapshot']} 只")
+
+        # 其余股票逐只请求（首次建库每只 2 次请求），限时结束，已更新的股票下次不会重复请求
+        pending = [c for c in universe if not bar_store.is_current(c)]
+        logger.info(f"🔍 逐只补齐: {len(pending)} 只，限时 {config.warmup_backfill_minutes:.0f} 分钟")
+        for i, code in enumerate(pending, 1):
+            if time.monotonic() >= deadline:
+                logger.warning(f"🔍 补齐已到时限，剩余 {len(pending) - i + 1} 只留待下次预热")
+                break
+            try:
+                stats['bars'] += bar_store.update(code)
+            except Exception as e:
+                logger.warning(f"[{code}] 预热失败: {e}")
+                stats['failed'].append(code)
+            if i % 500 == 0:
+                logger.info(f"🔍 全市场日线补齐进度: {i}/{len(pending)}")
+
+    return stats
+
+
+def main():
+    print("=" * 50)
+    print("🔥 A股缓存预热 - 青龙版")
+    print(f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 50)
+
+    start_time = time.time()
+    stats = warm_up()
+    elapsed = time.time() - start_time
+
+    logger.info(f"✅ 预热完成! 新增K线 {stats['bars']} 根, 快照追加 {stats['snapshot']} 只, "
+                f"筹码 {stats['chips']} 只, 耗时 {elapsed:.1f}秒")
+    if stats['failed']:
+        logger.warning(f"⚠️ 预热失败: {', '.join(stats['failed'])}")
+
+
+if __name__ == "__main__":
+    main()
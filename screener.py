@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+全市场技术面选股
+===================================
+
+在全部 A 股上运行 StockTrendAnalyzer 的评分规则，只把评分最高的少数候选交给大模型：
+1. 实时快照（ak.stock_zh_a_spot_em，一次请求覆盖全市场）提供当日 K 线
+2. BarStore 缓存提供历史 K 线（只读磁盘，由 ql_warmup 错峰维护）
+3. analyze_table 向量化评分（紧凑结果表），按 signal_score 取前 N 名
+
+选股只依赖一次网络请求，全市场评分在数秒内完成，大模型调用量与 SCREENER_TOP_N 成正比。
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional, Iterable, Dict
+
+import pandas as pd
+
+from data_provider import BarStore, TradingCalendar
+from stock_analyzer import StockTrendAnalyzer, TrendAnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScreenCandidate:
+    """选股候选"""
+    code: str
+    name: str
+    trend: TrendAnalysisResult
+    amount: float = 0.0          # 当日成交额（元）
+
+    def describe(self) -> str:
+        return (f"{self.name}({self.code}) {self.trend.trend_status.value} "
+                f"评分{self.trend.signal_score} 乖离{self.trend.bias_ma5:+.1f}% {self.trend.volume_status.value}")
+
+
+class MarketScreener:
+    """
+    全市场技术面选股器
+
+    使用方式：
+        screener = MarketScreener(fetcher, bar_store, calendar=calendar)
+        candidates = screener.screen(top_n=10, exclude=stock_list)
+    """
+
+    # 与 ql_main 中 get_daily_data(days=30) 的取数窗口一致（30×2 自然日），
+    # 保证选股评分与逐只分析时的评分相同
+    LOOKBACK_DAYS = 60
+
+    def __init__(
+        self,
+        fetcher,
+        bar_store: BarStore,
+        trend_analyzer: Optional[StockTrendAnalyzer] = None,
+        calendar: Optional[TradingCalendar] = None
+    ):
+        """
+        Args:
+            fetcher: AkshareFetcher 实例（提供 get_spot_snapshot）
+            bar_store: 日线缓存
+            trend_analyzer: 趋势分析器（默认新建）
+            calendar: 交易日历（默认按工作日近似）
+        """
+        self._fetcher = fetcher
+        self._bar_store = bar_store
+        self._analyzer = trend_analyzer or StockTrendAnalyzer()
+        self._calendar = calendar or TradingCalendar()
+
+    def screen(
+        self,
+        top_n: int = 10,
+        min_score: int = 65,
+        exclude: Optional[Iterable[str]] = None
+    ) -> List[ScreenCandidate]:
+        """
+        选出评分最高的候选
+
+        Args:
+            top_n: 候选数量上限
+            min_score: 最低 signal_score（默认 65，即"买入"信号的评分门槛）
+            exclude: 不参与选股的代码（如已在自选股中）
+
+        Returns:
+            按 signal_score 降序、|乖离率| 升序排列的候选列表
+        """
+        spot = self._fetcher.get_spot_snapshot()
+        if spot.empty:
+            logger.warning("[选股] 实时快照为空，跳过选股")
+            return []
+
+        spot = self._filter_spot(spot, exclude)
+        cached = set(self._bar_store.cached_codes())
+        spot = spot[spot['code'].isin(cached)]
+        if spot.empty:
+            logger.warning("[选股] 没有可用的历史缓存，请先运行 ql_warmup.py（SCREENER_ENABLED=true）")
+            return []
+
+        spot_day = self._calendar.last_trading_day(date.today())
+        start_date = (spot_day - timedelta(days=self.LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+
+        frames: Dict[str, pd.DataFrame] = {}
+        for row in spot.itertuples(index=False):
+            history = self._bar_store.get_adjusted(row.code, start_date=start_date)
+            df = self._append_spot_bar(history, row, spot_day)
+            if df is not None:
+                frames[row.code] = df
+        stale = len(spot) - len(frames)
+
+        # 全市场只保留紧凑结果表，仅为入选的前 N 只重建结果对象
+        table = self._analyzer.analyze_table(frames)
+        ranked = [table.result(i) for i in table.top(top_n, min_score=min_score)]
+        qualified = int((table.records['score'] >= min_score).sum())
+
+        spot = spot.set_index('code')
+        candidates = [
+            ScreenCandidate(
+                code=r.code,
+                name=str(spot.at[r.code, 'name']),
+                trend=r,
+                amount=float(spot.at[r.code, 'amount'] or 0),
+            )
+            for r in ranked
+        ]
+
+        logger.info(f"[选股] 全市场 {len(spot)} 只（缓存过期 {stale} 只），"
+                    f"评分≥{min_score} 共 {qualified} 只，"
+                    f"取前 {len(candidates)} 只")
+        for c in candidates:
+            logger.info(f"[选股] {c.describe()}")
+        return candidates
+
+    def _filter_spot(self, spot: pd.DataFrame, exclude: Optional[Iterable[str]]) -> pd.DataFrame:
+        """剔除停牌、ST、退市整理及排除列表中的股票"""
+        excluded = set(exclude or [])
+        names = spot['name'].astype(str)
+        mask = (
+            (spot['close'] > 0)
+            & (spot['volume'] > 0)
+            & ~names.str.contains('ST', regex=False)
+            & ~names.str.contains('退', regex=False)
+            & ~spot['code'].isin(excluded)
+            & spot['code'].map(self._bar_store.supports)
+        )
+        return spot[mask]
+
+    def _append_spot_bar(self, history: pd.DataFrame, row, spot_day: date) -> Optional[pd.DataFrame]:
+        """
+        把快照作为最新一根 K 线接到历史之后
+
+        历史须连续到上一个交易日（否则均线会跨缺口计算，直接放弃该股票）；
+        快照昨收与缓存最后收盘不一致时说明当日除权，按比例前复权历史价格。
+
+        Returns:
+            前复权日线（含当日），历史不可用时返回 None
+        """
+        if history.empty:
+            return None
+
+        # 盘中预热时缓存可能已有当日未完成的 K 线，以快照为准
+        history = history[history['date'] < pd.Timestamp(spot_day)]
+        if history.empty or self._calendar.count_trading_days(history['date'].iloc[-1], spot_day) != 1:
+            return None
+
+        last_close = float(history['close'].iloc[-1])
+        prev_close = row.prev_close
+        if prev_close > 0 and last_close > 0 and abs(prev_close / last_close - 1) > BarStore.EX_RIGHTS_TOLERANCE:
+            history = history.copy()
+            for col in ('open', 'high', 'low', 'close'):
+                history[col] = history[col].values * (prev_close / last_close)
+
+        today = pd.DataFrame([{
+            'date': pd.Timestamp(spot_day),
+            'open': row.open,
+            'high': row.high,
+            'low': row.low,
+            'close': row.close,
+            'volume': row.volume,
+            'amount': row.amount,
+            'pct_chg': row.pct_chg,
+        }])
+        return pd.concat([history, today], ignore_index=True)
@@ -17,13 +17,16 @@
 """
 
 import logging
+import sys
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Union
 from enum import Enum
 
 import pandas as pd
 import numpy as np
 
+from data_provider.bar_series import BarSeries
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,6 +60,55 @@ class BuySignal(Enum):
     STRONG_SELL = "强烈卖出"      # 趋势破坏
 
 
+# 向量化计算中枚举以整数编码表示，编码即在下列列表中的位置
+TREND_STATUSES: List[TrendStatus] = list(TrendStatus)
+VOLUME_STATUSES: List[VolumeStatus] = list(VolumeStatus)
+BUY_SIGNALS: List[BuySignal] = list(BuySignal)
+
+TREND_CODES: Dict[TrendStatus, int] = {s: i for i, s in enumerate(TREND_STATUSES)}
+VOLUME_CODES: Dict[VolumeStatus, int] = {s: i for i, s in enumerate(VOLUME_STATUSES)}
+SIGNAL_CODES: Dict[BuySignal, int] = {s: i for i, s in enumerate(BUY_SIGNALS)}
+
+# 趋势分析所需的最少 K 线数量
+MIN_BARS = 20
+
+# 逐根 K 线信号序列（analyze_series 的返回值），枚举字段为编码
+SIGNAL_SERIES_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('close', 'f8'),
+    ('trend', 'i1'),
+    ('bias_ma5', 'f4'),
+    ('volume_status', 'i1'),
+    ('volume_ratio', 'f4'),
+    ('support_ma5', '?'),
+    ('support_ma10', '?'),
+    ('score', 'i2'),
+    ('buy_signal', 'i1'),
+])
+
+# 批量结果表（TrendResultTable）的记录字段（code 字段按最长代码定长），枚举字段为编码；
+# 理由/风险文本不存储，重建结果对象时按记录生成
+RESULT_FIELDS = [
+    ('date', 'datetime64[D]'),
+    ('close', 'f8'),
+    ('ma5', 'f8'),
+    ('ma10', 'f8'),
+    ('ma20', 'f8'),
+    ('ma60', 'f8'),
+    ('bias_ma5', 'f8'),
+    ('bias_ma10', 'f8'),
+    ('bias_ma20', 'f8'),
+    ('trend', 'i1'),
+    ('volume_status', 'i1'),
+    ('volume_ratio', 'f8'),
+    ('support_ma5', '?'),
+    ('support_ma10', '?'),
+    ('recent_high', 'f8'),
+    ('score', 'i2'),
+    ('buy_signal', 'i1'),
+]
+
+
 @dataclass
 class TrendAnalysisResult:
     """趋势分析结果"""
@@ -95,6 +147,7 @@ class TrendAnalysisResult:
     signal_score: int = 0            # 综合评分 0-100
     signal_reasons: List[str] = field(default_factory=list)
     risk_factors: List[str] = field(default_factory=list)
+    signal_transition: str = ""      # 信号变化描述，如"3天前由持有转为买入"
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -119,9 +172,92 @@ class TrendAnalysisResult:
             'signal_score': self.signal_score,
             'signal_reasons': self.signal_reasons,
             'risk_factors': self.risk_factors,
+            'signal_transition': self.signal_transition,
         }
 
 
+@dataclass
+class PricePanel:
+    """
+    多只股票的日线面板（向量化分析的输入）
+
+    各数组形状为 (T, N)：行为时间、列为股票。每列按日期升序右对齐，
+    历史较短的股票在顶部以 NaN 填充，因此最后一行就是各股票的最新 K 线。
+    每列保留完整历史：滚动均值的浮点累加依赖整段序列，截断会与逐只分析产生末位误差。
+    """
+    codes: List[str]
+    dates: np.ndarray      # datetime64[D]，填充位置为 NaT
+    close: np.ndarray
+    high: np.ndarray
+    volume: np.ndarray
+    lengths: np.ndarray    # 各股票的 K 线数量
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.close.shape
+
+    def bar_counts(self) -> np.ndarray:
+        """(T, N) 数组：截至每一行（含）各股票已有的 K 线数量，填充位置为 0"""
+        rows = np.arange(self.shape[0])[:, None]
+        return np.clip(rows - (self.shape[0] - self.lengths)[None, :] + 1, 0, None)
+
+    @classmethod
+    def _allocate(cls, codes: List[str], lengths: np.ndarray) -> 'PricePanel':
+        T = int(lengths.max()) if len(lengths) else 0
+        N = len(codes)
+        return cls(
+            codes=codes,
+            dates=np.full((T, N), np.datetime64('NaT'), dtype='datetime64[D]'),
+            close=np.full((T, N), np.nan),
+            high=np.full((T, N), np.nan),
+            volume=np.full((T, N), np.nan),
+            lengths=lengths,
+        )
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, Union[pd.DataFrame, BarSeries]]) -> 'PricePanel':
+        """由 {股票代码: 日线 DataFrame 或 BarSeries} 构建"""
+        codes = list(frames)
+        series = [BarSeries.from_frame(frames[code]) for code in codes]
+
+        lengths = np.array([len(bars) for bars in series], dtype=np.int64)
+        panel = cls._allocate(codes, lengths)
+        T = panel.shape[0]
+        for j, bars in enumerate(series):
+            if bars.empty:
+                continue
+            rows = slice(T - len(bars), T)
+            panel.dates[rows, j] = pd.to_datetime(bars.column('date')).values.astype('datetime64[D]')
+            panel.close[rows, j] = bars.column('close')
+            panel.high[rows, j] = bars.column('high')
+            panel.volume[rows, j] = bars.column('volume')
+        return panel
+
+    @classmethod
+    def from_long(cls, df: pd.DataFrame, code_col: str = 'code') -> 'PricePanel':
+        """由长表（每行一只股票的一根 K 线，含 code 列）构建"""
+        df = df.assign(**{code_col: df[code_col].astype(str)}).sort_values([code_col, 'date'], kind='mergesort')
+        codes, starts, counts = np.unique(df[code_col].values, return_index=True, return_counts=True)
+        panel = cls._allocate(list(codes), counts.astype(np.int64))
+        T = panel.shape[0]
+
+        cols = np.repeat(np.arange(len(codes)), counts)
+        rows = T - np.repeat(counts, counts) + (np.arange(len(df)) - np.repeat(starts, counts))
+        panel.dates[rows, cols] = pd.to_datetime(df['date']).values.astype('datetime64[D]')
+        panel.close[rows, cols] = df['close'].values
+        panel.high[rows, cols] = df['high'].values
+        panel.volume[rows, cols] = df['volume'].values
+        return panel
+
+
+def _shift_rows(a: np.ndarray, k: int) -> np.ndarray:
+    """沿时间轴后移 k 行（第 t 行得到第 t-k 行的值），空出的位置填 NaN"""
+    out = np.full_like(a, np.nan)
+    if k < len(a):
+        out[k:] = a[:len(a) - k]
+    return out
+
+
 class StockTrendAnalyzer:
     """
     股票趋势分析器
@@ -139,16 +275,61 @@ class StockTrendAnalyzer:
     VOLUME_HEAVY_RATIO = 1.5    # 放量判断阈值
     MA_SUPPORT_TOLERANCE = 0.02  # MA 支撑判断容忍度（2%）
     
+    # 趋势状态 -> (均线排列描述, 趋势强度)
+    TREND_PROFILES = {
+        TrendStatus.STRONG_BULL: ("强势多头排列，均线发散上行", 90),
+        TrendStatus.BULL: ("多头排列 MA5>MA10>MA20", 75),
+        TrendStatus.WEAK_BULL: ("弱势多头，MA5>MA10 但 MA10≤MA20", 55),
+        TrendStatus.CONSOLIDATION: ("均线缠绕，趋势不明", 50),
+        TrendStatus.WEAK_BEAR: ("弱势空头，MA5<MA10 但 MA10≥MA20", 40),
+        TrendStatus.BEAR: ("空头排列 MA5<MA10<MA20", 25),
+        TrendStatus.STRONG_BEAR: ("强势空头排列，均线发散下行", 10),
+    }
+    
+    # 量能状态 -> 量能趋势描述
+    VOLUME_TRENDS = {
+        VolumeStatus.HEAVY_VOLUME_UP: "放量上涨，多头力量强劲",
+        VolumeStatus.HEAVY_VOLUME_DOWN: "放量下跌，注意风险",
+        VolumeStatus.SHRINK_VOLUME_UP: "缩量上涨，上攻动能不足",
+        VolumeStatus.SHRINK_VOLUME_DOWN: "缩量回调，洗盘特征明显（好）",
+        VolumeStatus.NORMAL: "量能正常",
+    }
+    
+    # === 评分权重 ===
+    # 趋势评分（40分）
+    TREND_SCORES = {
+        TrendStatus.STRONG_BULL: 40,
+        TrendStatus.BULL: 35,
+        TrendStatus.WEAK_BULL: 25,
+        TrendStatus.CONSOLIDATION: 15,
+        TrendStatus.WEAK_BEAR: 10,
+        TrendStatus.BEAR: 5,
+        TrendStatus.STRONG_BEAR: 0,
+    }
+    # 乖离率评分（30分），按区间编码（见 _bias_band）：
+    # 深度破位 / 回踩MA5 / 略低于MA5 / 贴近MA5 / 略高于MA5 / 乖离过高
+    BIAS_SCORES = (10, 25, 30, 28, 20, 5)
+    # 量能评分（20分）
+    VOLUME_SCORES = {
+        VolumeStatus.SHRINK_VOLUME_DOWN: 20,  # 缩量回调最佳
+        VolumeStatus.HEAVY_VOLUME_UP: 15,     # 放量上涨次之
+        VolumeStatus.NORMAL: 12,
+        VolumeStatus.SHRINK_VOLUME_UP: 8,     # 无量上涨较差
+        VolumeStatus.HEAVY_VOLUME_DOWN: 0,    # 放量下跌最差
+    }
+    # 支撑评分（10分）：MA5、MA10 支撑各得分
+    SUPPORT_SCORE = 5
+    
     def __init__(self):
         """初始化分析器"""
         pass
     
-    def analyze(self, df: pd.DataFrame, code: str) -> TrendAnalysisResult:
+    def analyze(self, df: Union[pd.DataFrame, BarSeries], code: str) -> TrendAnalysisResult:
         """
         分析股票趋势
         
         Args:
-            df: 包含 OHLCV 数据的 DataFrame
+            df: 包含 OHLCV 数据的 DataFrame 或 BarSeries（传入 BarSeries 时复用其缓存的均线）
             code: 股票代码
             
         Returns:
@@ -156,55 +337,285 @@ class StockTrendAnalyzer:
         """
         result = TrendAnalysisResult(code=code)
         
-        if df is None or df.empty or len(df) < 20:
+        if df is None or len(df) < MIN_BARS:
             logger.warning(f"{code} 数据不足，无法进行趋势分析")
             result.risk_factors.append("数据不足，无法完成分析")
             return result
         
-        # 确保数据按日期排序
-        df = df.sort_values('date').reset_index(drop=True)
+        # 按日期升序的只读序列（已有序时不排序、不复制）
+        bars = BarSeries.from_frame(df)
         
         # 计算均线
-        df = self._calculate_mas(df)
+        mas = self._calculate_mas(bars)
         
         # 获取最新数据
-        latest = df.iloc[-1]
-        result.current_price = float(latest['close'])
-        result.ma5 = float(latest['MA5'])
-        result.ma10 = float(latest['MA10'])
-        result.ma20 = float(latest['MA20'])
-        result.ma60 = float(latest.get('MA60', 0))
+        result.current_price = float(bars.column('close')[-1])
+        result.ma5 = float(mas['MA5'][-1])
+        result.ma10 = float(mas['MA10'][-1])
+        result.ma20 = float(mas['MA20'][-1])
+        result.ma60 = float(mas['MA60'][-1])
         
         # 1. 趋势判断
-        self._analyze_trend(df, result)
+        self._analyze_trend(mas, result)
         
         # 2. 乖离率计算
         self._calculate_bias(result)
         
         # 3. 量能分析
-        self._analyze_volume(df, result)
+        self._analyze_volume(bars, result)
         
         # 4. 支撑压力分析
-        self._analyze_support_resistance(df, result)
+        self._analyze_support_resistance(bars, result)
         
         # 5. 生成买入信号
         self._generate_signal(result)
         
         return result
     
-    def _calculate_mas(self, df: pd.DataFrame) -> pd.DataFrame:
-        """计算均线"""
-        df = df.copy()
-        df['MA5'] = df['close'].rolling(window=5).mean()
-        df['MA10'] = df['close'].rolling(window=10).mean()
-        df['MA20'] = df['close'].rolling(window=20).mean()
-        if len(df) >= 60:
-            df['MA60'] = df['close'].rolling(window=60).mean()
+    def analyze_many(
+        self,
+        data: Union[PricePanel, Dict[str, pd.DataFrame], pd.DataFrame]
+    ) -> Dict[str, TrendAnalysisResult]:
+        """
+        批量分析多只股票（向量化）
+        
+        所有股票的趋势、乖离率、量能、支撑与评分在 (T, N) 数组上一次算完，
+        只为每只股票的最新 K 线生成结果对象，结果与逐只调用 analyze 完全一致。
+        
+        Args:
+            data: PricePanel、{股票代码: 日线 DataFrame} 或含 code 列的长表
+            
+        Returns:
+            {股票代码: TrendAnalysisResult}，顺序与面板列一致
+        """
+        panel = self._to_panel(data)
+        table = TrendResultTable.from_signals(panel, self.compute_signals(panel), self)
+        index = {code: i for i, code in enumerate(table.records['code'])}
+        
+        results = {}
+        for code in panel.codes:
+            if code in index:
+                results[code] = table.result(index[code])
+            else:
+                result = TrendAnalysisResult(code=code)
+                result.risk_factors.append("数据不足，无法完成分析")
+                results[code] = result
+        
+        short = len(panel.codes) - len(table)
+        if short:
+            logger.warning(f"批量趋势分析: {short}/{len(panel.codes)} 只股票数据不足")
+        return results
+    
+    def analyze_table(
+        self,
+        data: Union[PricePanel, Dict[str, pd.DataFrame], pd.DataFrame],
+        latest_only: bool = True
+    ) -> 'TrendResultTable':
+        """
+        批量分析并以紧凑结果表返回（不创建逐只结果对象）
+        
+        Args:
+            data: 同 analyze_many
+            latest_only: True 只保留各股票最新 K 线，False 保留每根有效 K 线
+            
+        Returns:
+            TrendResultTable（数据不足的股票不在表中）
+        """
+        panel = self._to_panel(data)
+        return TrendResultTable.from_signals(panel, self.compute_signals(panel), self, latest_only=latest_only)
+    
+    @staticmethod
+    def _to_panel(data: Union[PricePanel, Dict[str, pd.DataFrame], pd.DataFrame]) -> PricePanel:
+        if isinstance(data, PricePanel):
+            return data
+        if isinstance(data, pd.DataFrame):
+            return PricePanel.from_long(data)
+        return PricePanel.from_frames(data)
+    
+    def analyze_series(self, df: Union[pd.DataFrame, BarSeries], code: str = "") -> np.ndarray:
+        """
+        计算每根 K 线的趋势信号序列
+        
+        第 k 行与 analyze(截至该 K 线的历史) 的趋势、乖离率、量能、评分与信号一致，
+        整段历史一次向量化算完。
+        
+        Args:
+            df: 包含 OHLCV 数据的 DataFrame 或 BarSeries
+            code: 股票代码
+            
+        Returns:
+            SIGNAL_SERIES_DTYPE 结构化数组，自第 MIN_BARS 根 K 线起每根一行，按日期升序；
+            数据不足时返回空数组
+        """
+        if df is None or len(df) < MIN_BARS:
+            return np.empty(0, dtype=SIGNAL_SERIES_DTYPE)
+        panel = PricePanel.from_frames({code: df})
+        return self._pack_series(panel, self.compute_signals(panel), 0)
+    
+    @staticmethod
+    def _pack_series(panel: PricePanel, signals: Dict[str, np.ndarray], j: int) -> np.ndarray:
+        """把 compute_signals 第 j 列的有效行打包为 SIGNAL_SERIES_DTYPE 数组"""
+        rows = signals['valid'][:, j]
+        series = np.empty(int(rows.sum()), dtype=SIGNAL_SERIES_DTYPE)
+        series['date'] = panel.dates[rows, j]
+        series['close'] = panel.close[rows, j]
+        series['volume_ratio'] = signals['volume_ratio'][rows, j]
+        for name in ('trend', 'bias_ma5', 'volume_status', 'support_ma5', 'support_ma10', 'score', 'buy_signal'):
+            series[name] = signals[name][rows, j]
+        return series
+    
+    def compute_signals(self, panel: PricePanel) -> Dict[str, np.ndarray]:
+        """
+        在整块面板上计算全部指标与信号
+        
+        每个位置 (t, j) 的值等同于把股票 j 截至第 t 行的历史交给 analyze 的结果；
+        K 线不足 MIN_BARS 的位置 valid 为 False，其余字段无意义。
+        
+        Returns:
+            名称 -> (T, N) 数组；trend/volume_status/buy_signal 为枚举编码
+            （TREND_STATUSES / VOLUME_STATUSES / BUY_SIGNALS 中的位置）
+        """
+        close, high, volume = panel.close, panel.high, panel.volume
+        n_bars = panel.bar_counts()
+        
+        # 逐列滚动，与单只股票 Series.rolling 的累加顺序一致
+        close_df = pd.DataFrame(close)
+        ma5 = close_df.rolling(window=5).mean().values
+        ma10 = close_df.rolling(window=10).mean().values
+        ma20 = close_df.rolling(window=20).mean().values
+        ma60 = np.where(n_bars >= 60, close_df.rolling(window=60).mean().values, ma20)
+        recent_high = pd.DataFrame(high).rolling(window=20, min_periods=1).max().values
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # 1. 趋势判断（与 5 根 K 线前的均线间距比较）
+            prev_ma5, prev_ma20 = _shift_rows(ma5, 4), _shift_rows(ma20, 4)
+            bull = (ma5 > ma10) & (ma10 > ma20)
+            bear = (ma5 < ma10) & (ma10 < ma20)
+            bull_prev = np.where(prev_ma20 > 0, (prev_ma5 - prev_ma20) / prev_ma20 * 100, 0)
+            bull_curr = np.where(ma20 > 0, (ma5 - ma20) / ma20 * 100, 0)
+            bear_prev = np.where(prev_ma5 > 0, (prev_ma20 - prev_ma5) / prev_ma5 * 100, 0)
+            bear_curr = np.where(ma5 > 0, (ma20 - ma5) / ma5 * 100, 0)
+            trend = np.select(
+                [
+                    bull & (bull_curr > bull_prev) & (bull_curr > 5),
+                    bull,
+                    (ma5 > ma10) & (ma10 <= ma20),
+                    bear & (bear_curr > bear_prev) & (bear_curr > 5),
+                    bear,
+                    (ma5 < ma10) & (ma10 >= ma20),
+                ],
+                [
+                    TREND_CODES[TrendStatus.STRONG_BULL],
+                    TREND_CODES[TrendStatus.BULL],
+                    TREND_CODES[TrendStatus.WEAK_BULL],
+                    TREND_CODES[TrendStatus.STRONG_BEAR],
+                    TREND_CODES[TrendStatus.BEAR],
+                    TREND_CODES[TrendStatus.WEAK_BEAR],
+                ],
+                default=TREND_CODES[TrendStatus.CONSOLIDATION],
+            ).astype(np.int8)
+            
+            # 2. 乖离率
+            bias_ma5 = np.where(ma5 > 0, (close - ma5) / ma5 * 100, 0.0)
+            bias_ma10 = np.where(ma10 > 0, (close - ma10) / ma10 * 100, 0.0)
+            bias_ma20 = np.where(ma20 > 0, (close - ma20) / ma20 * 100, 0.0)
+            
+            # 3. 量能：当日量 / 前 5 日均量（按时间顺序逐项累加，与 Series.mean 一致）
+            vol_sum = _shift_rows(volume, 5)
+            for k in (4, 3, 2, 1):
+                vol_sum = vol_sum + _shift_rows(volume, k)
+            vol_5d_avg = vol_sum / 5
+            volume_ratio = np.where(vol_5d_avg > 0, volume / vol_5d_avg, 0.0)
+            prev_close = _shift_rows(close, 1)
+            up = (close - prev_close) / prev_close * 100 > 0
+            heavy = volume_ratio >= self.VOLUME_HEAVY_RATIO
+            shrink = volume_ratio <= self.VOLUME_SHRINK_RATIO
+            volume_status = np.select(
+                [heavy & up, heavy, shrink & up, shrink],
+                [
+                    VOLUME_CODES[VolumeStatus.HEAVY_VOLUME_UP],
+                    VOLUME_CODES[VolumeStatus.HEAVY_VOLUME_DOWN],
+                    VOLUME_CODES[VolumeStatus.SHRINK_VOLUME_UP],
+                    VOLUME_CODES[VolumeStatus.SHRINK_VOLUME_DOWN],
+                ],
+                default=VOLUME_CODES[VolumeStatus.NORMAL],
+            ).astype(np.int8)
+            
+            # 4. 均线支撑
+            support_ma5 = (ma5 > 0) & (np.abs(close - ma5) / ma5 <= self.MA_SUPPORT_TOLERANCE) & (close >= ma5)
+            support_ma10 = (ma10 > 0) & (np.abs(close - ma10) / ma10 <= self.MA_SUPPORT_TOLERANCE) & (close >= ma10)
+        
+        # 5. 评分与信号
+        trend_points = np.array([self.TREND_SCORES.get(s, 15) for s in TREND_STATUSES])
+        volume_points = np.array([self.VOLUME_SCORES.get(s, 10) for s in VOLUME_STATUSES])
+        score = (
+            trend_points[trend]
+            + np.asarray(self.BIAS_SCORES)[self._bias_band(bias_ma5)]
+            + volume_points[volume_status]
+            + self.SUPPORT_SCORE * support_ma5
+            + self.SUPPORT_SCORE * support_ma10
+        )
+        
+        return {
+            'valid': n_bars >= MIN_BARS,
+            'close': close,
+            'ma5': ma5,
+            'ma10': ma10,
+            'ma20': ma20,
+            'ma60': ma60,
+            'trend': trend,
+            'bias_ma5': bias_ma5,
+            'bias_ma10': bias_ma10,
+            'bias_ma20': bias_ma20,
+            'volume_status': volume_status,
+            'volume_ratio': volume_ratio,
+            'support_ma5': support_ma5,
+            'support_ma10': support_ma10,
+            'recent_high': recent_high,
+            'score': score,
+            'buy_signal': self._classify_signal(score, trend),
+        }
+    
+    def _result_from_record(self, record: np.void) -> TrendAnalysisResult:
+        """由 TrendResultTable 的一条记录重建结果对象"""
+        trend_status = TREND_STATUSES[record['trend']]
+        volume_status = VOLUME_STATUSES[record['volume_status']]
+        ma_alignment, trend_strength = self.TREND_PROFILES[trend_status]
+        result = TrendAnalysisResult(
+            code=str(record['code']),
+            trend_status=trend_status,
+            ma_alignment=ma_alignment,
+            trend_strength=trend_strength,
+            ma5=float(record['ma5']),
+            ma10=float(record['ma10']),
+            ma20=float(record['ma20']),
+            ma60=float(record['ma60']),
+            current_price=float(record['close']),
+            bias_ma5=float(record['bias_ma5']),
+            bias_ma10=float(record['bias_ma10']),
+            bias_ma20=float(record['bias_ma20']),
+            volume_status=volume_status,
+            volume_ratio_5d=float(record['volume_ratio']),
+            volume_trend=self.VOLUME_TRENDS[volume_status],
+            support_ma5=bool(record['support_ma5']),
+            support_ma10=bool(record['support_ma10']),
+            buy_signal=BUY_SIGNALS[record['buy_signal']],
+            signal_score=int(record['score']),
+        )
+        self._collect_levels(result, float(record['recent_high']))
+        result.signal_reasons, result.risk_factors = self._describe_signal(result)
+        return result
+    
+    def _calculate_mas(self, bars: BarSeries) -> Dict[str, np.ndarray]:
+        """计算均线（由 BarSeries 缓存，同一序列只算一次）"""
+        mas = {f'MA{w}': bars.rolling_mean('close', w) for w in (5, 10, 20)}
+        if len(bars) >= 60:
+            mas['MA60'] = bars.rolling_mean('close', 60)
         else:
-            df['MA60'] = df['MA20']  # 数据不足时使用 MA20 替代
-        return df
+            mas['MA60'] = mas['MA20']  # 数据不足时使用 MA20 替代
+        return mas
     
-    def _analyze_trend(self, df: pd.DataFrame, result: TrendAnalysisResult) -> None:
+    def _analyze_trend(self, mas: Dict[str, np.ndarray], result: TrendAnalysisResult) -> None:
         """
         分析趋势状态
         
@@ -215,47 +626,37 @@ class StockTrendAnalyzer:
         # 判断均线排列
         if ma5 > ma10 > ma20:
             # 检查间距是否在扩大（强势）
-            prev = df.iloc[-5] if len(df) >= 5 else df.iloc[-1]
-            prev_spread = (prev['MA5'] - prev['MA20']) / prev['MA20'] * 100 if prev['MA20'] > 0 else 0
+            prev = -5 if len(mas['MA5']) >= 5 else -1
+            prev_ma5, prev_ma20 = mas['MA5'][prev], mas['MA20'][prev]
+            prev_spread = (prev_ma5 - prev_ma20) / prev_ma20 * 100 if prev_ma20 > 0 else 0
             curr_spread = (ma5 - ma20) / ma20 * 100 if ma20 > 0 else 0
             
             if curr_spread > prev_spread and curr_spread > 5:
                 result.trend_status = TrendStatus.STRONG_BULL
-                result.ma_alignment = "强势多头排列，均线发散上行"
-                result.trend_strength = 90
             else:
                 result.trend_status = TrendStatus.BULL
-                result.ma_alignment = "多头排列 MA5>MA10>MA20"
-                result.trend_strength = 75
                 
         elif ma5 > ma10 and ma10 <= ma20:
             result.trend_status = TrendStatus.WEAK_BULL
-            result.ma_alignment = "弱势多头，MA5>MA10 但 MA10≤MA20"
-            result.trend_strength = 55
             
         elif ma5 < ma10 < ma20:
-            prev = df.iloc[-5] if len(df) >= 5 else df.iloc[-1]
-            prev_spread = (prev['MA20'] - prev['MA5']) / prev['MA5'] * 100 if prev['MA5'] > 0 else 0
+            prev = -5 if len(mas['MA5']) >= 5 else -1
+            prev_ma5, prev_ma20 = mas['MA5'][prev], mas['MA20'][prev]
+            prev_spread = (prev_ma20 - prev_ma5) / prev_ma5 * 100 if prev_ma5 > 0 else 0
             curr_spread = (ma20 - ma5) / ma5 * 100 if ma5 > 0 else 0
             
             if curr_spread > prev_spread and curr_spread > 5:
                 result.trend_status = TrendStatus.STRONG_BEAR
-                result.ma_alignment = "强势空头排列，均线发散下行"
-                result.trend_strength = 10
             else:
                 result.trend_status = TrendStatus.BEAR
-                result.ma_alignment = "空头排列 MA5<MA10<MA20"
-                result.trend_strength = 25
                 
         elif ma5 < ma10 and ma10 >= ma20:
             result.trend_status = TrendStatus.WEAK_BEAR
-            result.ma_alignment = "弱势空头，MA5<MA10 但 MA10≥MA20"
-            result.trend_strength = 40
             
         else:
             result.trend_status = TrendStatus.CONSOLIDATION
-            result.ma_alignment = "均线缠绕，趋势不明"
-            result.trend_strength = 50
+        
+        result.ma_alignment, result.trend_strength = self.TREND_PROFILES[result.trend_status]
     
     def _calculate_bias(self, result: TrendAnalysisResult) -> None:
         """
@@ -274,45 +675,43 @@ class StockTrendAnalyzer:
         if result.ma20 > 0:
             result.bias_ma20 = (price - result.ma20) / result.ma20 * 100
     
-    def _analyze_volume(self, df: pd.DataFrame, result: TrendAnalysisResult) -> None:
+    def _analyze_volume(self, bars: BarSeries, result: TrendAnalysisResult) -> None:
         """
         分析量能
         
         偏好：缩量回调 > 放量上涨 > 缩量上涨 > 放量下跌
         """
-        if len(df) < 5:
+        if len(bars) < 5:
             return
         
-        latest = df.iloc[-1]
-        vol_5d_avg = df['volume'].iloc[-6:-1].mean()
+        volume = bars.column('volume')
+        close = bars.column('close')
+        vol_5d_avg = volume[-6:-1].mean()
         
         if vol_5d_avg > 0:
-            result.volume_ratio_5d = float(latest['volume']) / vol_5d_avg
+            result.volume_ratio_5d = float(volume[-1]) / vol_5d_avg
         
         # 判断价格变化
-        prev_close = df.iloc[-2]['close']
-        price_change = (latest['close'] - prev_close) / prev_close * 100
+        prev_close = close[-2]
+        price_change = (close[-1] - prev_close) / prev_close * 100
         
         # 量能状态判断
         if result.volume_ratio_5d >= self.VOLUME_HEAVY_RATIO:
             if price_change > 0:
                 result.volume_status = VolumeStatus.HEAVY_VOLUME_UP
-                result.volume_trend = "放量上涨，多头力量强劲"
             else:
                 result.volume_status = VolumeStatus.HEAVY_VOLUME_DOWN
-                result.volume_trend = "放量下跌，注意风险"
         elif result.volume_ratio_5d <= self.VOLUME_SHRINK_RATIO:
             if price_change > 0:
                 result.volume_status = VolumeStatus.SHRINK_VOLUME_UP
-                result.volume_trend = "缩量上涨，上攻动能不足"
             else:
                 result.volume_status = VolumeStatus.SHRINK_VOLUME_DOWN
-                result.volume_trend = "缩量回调，洗盘特征明显（好）"
         else:
             result.volume_status = VolumeStatus.NORMAL
-            result.volume_trend = "量能正常"
+        
+        result.volume_trend = self.VOLUME_TRENDS[result.volume_status]
     
-    def _analyze_support_resistance(self, df: pd.DataFrame, result: TrendAnalysisResult) -> None:
+    def _analyze_support_resistance(self, bars: BarSeries, result: TrendAnalysisResult) -> None:
         """
         分析支撑压力位
         
@@ -325,25 +724,63 @@ class StockTrendAnalyzer:
             ma5_distance = abs(price - result.ma5) / result.ma5
             if ma5_distance <= self.MA_SUPPORT_TOLERANCE and price >= result.ma5:
                 result.support_ma5 = True
-                result.support_levels.append(result.ma5)
         
         # 检查是否在 MA10 附近获得支撑
         if result.ma10 > 0:
             ma10_distance = abs(price - result.ma10) / result.ma10
             if ma10_distance <= self.MA_SUPPORT_TOLERANCE and price >= result.ma10:
                 result.support_ma10 = True
-                if result.ma10 not in result.support_levels:
-                    result.support_levels.append(result.ma10)
+        
+        recent_high = float(bars.column('high')[-20:].max()) if len(bars) >= 20 else None
+        self._collect_levels(result, recent_high)
+    
+    @staticmethod
+    def _collect_levels(result: TrendAnalysisResult, recent_high: Optional[float]) -> None:
+        """根据均线支撑判断与近期高点填充支撑位/压力位"""
+        price = result.current_price
+        
+        if result.support_ma5:
+            result.support_levels.append(result.ma5)
+        if result.support_ma10 and result.ma10 not in result.support_levels:
+            result.support_levels.append(result.ma10)
         
         # MA20 作为重要支撑
         if result.ma20 > 0 and price >= result.ma20:
             result.support_levels.append(result.ma20)
         
         # 近期高点作为压力
-        if len(df) >= 20:
-            recent_high = df['high'].iloc[-20:].max()
-            if recent_high > price:
-                result.resistance_levels.append(recent_high)
+        if recent_high is not None and recent_high > price:
+            result.resistance_levels.append(recent_high)
+    
+    def _bias_band(self, bias):
+        """
+        乖离率区间编码（标量与数组通用），对应 BIAS_SCORES 的下标：
+        0: ≤-5%  1: (-5%, -3%]  2: (-3%, 0)  3: [0, 2%)  4: [2%, 阈值)  5: ≥阈值
+        """
+        bias = np.asarray(bias, dtype=float)
+        return np.select(
+            [bias <= -5, bias <= -3, bias < 0, bias < 2, bias < self.BIAS_THRESHOLD],
+            [0, 1, 2, 3, 4],
+            default=5,
+        )
+    
+    def _classify_signal(self, score, trend):
+        """由综合评分与趋势编码得到买入信号编码（标量与数组通用）"""
+        score, trend = np.asarray(score), np.asarray(trend)
+        strong_bull = np.isin(trend, [TREND_CODES[TrendStatus.STRONG_BULL], TREND_CODES[TrendStatus.BULL]])
+        bullish = strong_bull | (trend == TREND_CODES[TrendStatus.WEAK_BULL])
+        bearish = np.isin(trend, [TREND_CODES[TrendStatus.BEAR], TREND_CODES[TrendStatus.STRONG_BEAR]])
+        return np.select(
+            [(score >= 80) & strong_bull, (score >= 65) & bullish, score >= 50, score >= 35, bearish],
+            [
+                SIGNAL_CODES[BuySignal.STRONG_BUY],
+                SIGNAL_CODES[BuySignal.BUY],
+                SIGNAL_CODES[BuySignal.HOLD],
+                SIGNAL_CODES[BuySignal.WAIT],
+                SIGNAL_CODES[BuySignal.STRONG_SELL],
+            ],
+            default=SIGNAL_CODES[BuySignal.SELL],
+        ).astype(np.int8)
     
     def _generate_signal(self, result: TrendAnalysisResult) -> None:
         """
@@ -355,93 +792,55 @@ class StockTrendAnalyzer:
         - 量能（20分）：缩量回调得分高
         - 支撑（10分）：获得均线支撑得分高
         """
-        score = 0
+        score = self.TREND_SCORES.get(result.trend_status, 15)
+        score += self.BIAS_SCORES[int(self._bias_band(result.bias_ma5))]
+        score += self.VOLUME_SCORES.get(result.volume_status, 10)
+        if result.support_ma5:
+            score += self.SUPPORT_SCORE
+        if result.support_ma10:
+            score += self.SUPPORT_SCORE
+        
+        result.signal_score = score
+        result.signal_reasons, result.risk_factors = self._describe_signal(result)
+        result.buy_signal = BUY_SIGNALS[int(self._classify_signal(score, TREND_CODES[result.trend_status]))]
+    
+    def _describe_signal(self, result: TrendAnalysisResult) -> Tuple[List[str], List[str]]:
+        """生成买入理由与风险因素（依次为趋势、乖离率、量能、支撑）"""
         reasons = []
         risks = []
         
-        # === 趋势评分（40分）===
-        trend_scores = {
-            TrendStatus.STRONG_BULL: 40,
-            TrendStatus.BULL: 35,
-            TrendStatus.WEAK_BULL: 25,
-            TrendStatus.CONSOLIDATION: 15,
-            TrendStatus.WEAK_BEAR: 10,
-            TrendStatus.BEAR: 5,
-            TrendStatus.STRONG_BEAR: 0,
-        }
-        trend_score = trend_scores.get(result.trend_status, 15)
-        score += trend_score
-        
         if result.trend_status in [TrendStatus.STRONG_BULL, TrendStatus.BULL]:
             reasons.append(f"✅ {result.trend_status.value}，顺势做多")
         elif result.trend_status in [TrendStatus.BEAR, TrendStatus.STRONG_BEAR]:
             risks.append(f"⚠️ {result.trend_status.value}，不宜做多")
         
-        # === 乖离率评分（30分）===
         bias = result.bias_ma5
-        if bias < 0:
-            # 价格在 MA5 下方（回调中）
-            if bias > -3:
-                score += 30
-                reasons.append(f"✅ 价格略低于MA5({bias:.1f}%)，回踩买点")
-            elif bias > -5:
-                score += 25
-                reasons.append(f"✅ 价格回踩MA5({bias:.1f}%)，观察支撑")
-            else:
-                score += 10
-                risks.append(f"⚠️ 乖离率过大({bias:.1f}%)，可能破位")
-        elif bias < 2:
-            score += 28
+        band = int(self._bias_band(bias))
+        if band == 0:
+            risks.append(f"⚠️ 乖离率过大({bias:.1f}%)，可能破位")
+        elif band == 1:
+            reasons.append(f"✅ 价格回踩MA5({bias:.1f}%)，观察支撑")
+        elif band == 2:
+            reasons.append(f"✅ 价格略低于MA5({bias:.1f}%)，回踩买点")
+        elif band == 3:
             reasons.append(f"✅ 价格贴近MA5({bias:.1f}%)，介入好时机")
-        elif bias < self.BIAS_THRESHOLD:
-            score += 20
+        elif band == 4:
             reasons.append(f"⚡ 价格略高于MA5({bias:.1f}%)，可小仓介入")
         else:
-            score += 5
             risks.append(f"❌ 乖离率过高({bias:.1f}%>5%)，严禁追高！")
         
-        # === 量能评分（20分）===
-        volume_scores = {
-            VolumeStatus.SHRINK_VOLUME_DOWN: 20,  # 缩量回调最佳
-            VolumeStatus.HEAVY_VOLUME_UP: 15,     # 放量上涨次之
-            VolumeStatus.NORMAL: 12,
-            VolumeStatus.SHRINK_VOLUME_UP: 8,     # 无量上涨较差
-            VolumeStatus.HEAVY_VOLUME_DOWN: 0,    # 放量下跌最差
-        }
-        vol_score = volume_scores.get(result.volume_status, 10)
-        score += vol_score
-        
         if result.volume_status == VolumeStatus.SHRINK_VOLUME_DOWN:
             reasons.append("✅ 缩量回调，主力洗盘")
         elif result.volume_status == VolumeStatus.HEAVY_VOLUME_DOWN:
             risks.append("⚠️ 放量下跌，注意风险")
         
-        # === 支撑评分（10分）===
         if result.support_ma5:
-            score += 5
             reasons.append("✅ MA5支撑有效")
         if result.support_ma10:
-            score += 5
             reasons.append("✅ MA10支撑有效")
         
-        # === 综合判断 ===
-        result.signal_score = score
-        result.signal_reasons = reasons
-        result.risk_factors = risks
-        
-        # 生成买入信号
-        if score >= 80 and result.trend_status in [TrendStatus.STRONG_BULL, TrendStatus.BULL]:
-            result.buy_signal = BuySignal.STRONG_BUY
-        elif score >= 65 and result.trend_status in [TrendStatus.STRONG_BULL, TrendStatus.BULL, TrendStatus.WEAK_BULL]:
-            result.buy_signal = BuySignal.BUY
-        elif score >= 50:
-            result.buy_signal = BuySignal.HOLD
-        elif score >= 35:
-            result.buy_signal = BuySignal.WAIT
-        elif result.trend_status in [TrendStatus.BEAR, TrendStatus.STRONG_BEAR]:
-            result.buy_signal = BuySignal.STRONG_SELL
-        else:
-            result.buy_signal = BuySignal.SELL
+        # 批量重建时大量结果共用同一批文本
+        return [sys.intern(r) for r in reasons], [sys.intern(r) for r in risks]
     
     def format_analysis(self, result: TrendAnalysisResult) -> str:
         """
@@ -474,6 +873,9 @@ class StockTrendAnalyzer:
             f"   综合评分: {result.signal_score}/100",
         ]
         
+        if result.signal_transition:
+            lines.append(f"   信号变化: {result.signal_transition}")
+        
         if result.signal_reasons:
             lines.append(f"")
             lines.append(f"✅ 买入理由:")
@@ -489,6 +891,112 @@ class StockTrendAnalyzer:
         return "\n".join(lines)
 
 
+class TrendResultTable:
+    """
+    批量趋势分析结果（NumPy 结构化数组）
+    
+    每条记录约 130 字节、无逐条对象开销，适合全市场选股与回测；
+    需要展示时按记录重建 TrendAnalysisResult（与 analyze 的结果一致）。
+    
+    使用方式：
+        table = analyzer.analyze_table(frames)
+        for i in table.top(10, min_score=65):
+            print(analyzer.format_analysis(table.result(i)))
+    """
+    
+    def __init__(self, records: np.ndarray, analyzer: Optional[StockTrendAnalyzer] = None):
+        self.records = records
+        self._analyzer = analyzer or StockTrendAnalyzer()
+    
+    @classmethod
+    def from_signals(
+        cls,
+        panel: PricePanel,
+        signals: Dict[str, np.ndarray],
+        analyzer: Optional[StockTrendAnalyzer] = None,
+        latest_only: bool = True
+    ) -> 'TrendResultTable':
+        """
+        由 compute_signals 的输出构建（按股票、再按日期排列）
+        
+        Args:
+            panel: 计算信号所用的面板
+            signals: compute_signals 的返回值
+            analyzer: 重建结果对象所用的分析器（需与计算信号时的参数一致）
+            latest_only: 只保留各股票最新 K 线
+        """
+        mask = signals['valid']
+        if latest_only:
+            mask = mask.copy()
+            mask[:-1] = False
+        cols, rows = np.nonzero(mask.T)
+        
+        code_len = max([8] + [len(c) for c in panel.codes])
+        records = np.empty(len(rows), dtype=[('code', f'U{code_len}')] + RESULT_FIELDS)
+        records['code'] = np.asarray(panel.codes, dtype=f'U{code_len}')[cols]
+        records['date'] = panel.dates[rows, cols]
+        for name, _ in RESULT_FIELDS[1:]:
+            records[name] = signals[name][rows, cols]
+        return cls(records, analyzer)
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def result(self, i: int) -> TrendAnalysisResult:
+        """重建第 i 条记录的结果对象"""
+        return self._analyzer._result_from_record(self.records[i])
+    
+    def find(self, code: str, day: Optional[Any] = None) -> Optional[int]:
+        """查找记录下标（day 为空时返回该股票最新一条）"""
+        hits = np.flatnonzero(self.records['code'] == code)
+        if day is not None:
+            hits = hits[self.records['date'][hits] == np.datetime64(pd.Timestamp(day).date(), 'D')]
+        return int(hits[-1]) if len(hits) else None
+    
+    def top(self, n: int, min_score: int = 0) -> np.ndarray:
+        """评分最高的 n 条记录下标（同分时乖离率绝对值小者优先）"""
+        candidates = np.flatnonzero(self.records['score'] >= min_score)
+        order = np.lexsort((
+            np.abs(self.records['bias_ma5'][candidates]),
+            -self.records['score'][candidates].astype(np.int32),
+        ))
+        return candidates[order[:n]]
+    
+    def to_frame(self) -> pd.DataFrame:
+        """转为 DataFrame（枚举编码还原为中文描述）"""
+        df = pd.DataFrame(self.records)
+        df['trend'] = np.array([s.value for s in TREND_STATUSES], dtype=object)[self.records['trend']]
+        df['volume_status'] = np.array([s.value for s in VOLUME_STATUSES], dtype=object)[self.records['volume_status']]
+        df['buy_signal'] = np.array([s.value for s in BUY_SIGNALS], dtype=object)[self.records['buy_signal']]
+        return df
+
+
+def describe_signal_transition(series: np.ndarray) -> str:
+    """
+    描述信号序列最近一次变化
+    
+    Args:
+        series: analyze_series 的返回值
+        
+    Returns:
+        如"3天前由持有转为买入"、"近20个交易日均为观望"，空序列返回空字符串
+    """
+    if len(series) == 0:
+        return ""
+    
+    signals = series['buy_signal']
+    current = BUY_SIGNALS[signals[-1]].value
+    changes = np.flatnonzero(signals[1:] != signals[:-1])
+    if len(changes) == 0:
+        return f"近{len(series)}个交易日均为{current}"
+    
+    start = changes[-1] + 1
+    days_ago = len(series) - 1 - start
+    previous = BUY_SIGNALS[signals[start - 1]].value
+    when = "今日" if days_ago == 0 else f"{days_ago}天前"
+    return f"{when}由{previous}转为{current}"
+
+
 def analyze_stock(df: pd.DataFrame, code: str) -> TrendAnalysisResult:
     """
     便捷函数：分析单只股票
@@ -532,4 +1040,5 @@ if __name__ == "__main__":
     
     analyzer = StockTrendAnalyzer()
     result = analyzer.analyze(df, '000001')
+    result.signal_transition = describe_signal_transition(analyzer.analyze_series(df, '000001'))
     print(analyzer.format_analysis(result))
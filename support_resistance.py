@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+关键价位识别（支撑 / 压力）
+===================================
+
+StockTrendAnalyzer 的支撑压力只看均线和近 20 日最高价，这里在 1~3 年的缓存日线上
+寻找更可靠的关键价位，供大模型给出狙击点位（sniper_points）：
+
+1. 波段高低点：以 swing_window 为半径的滑动窗口极值（向量化峰值检测）
+2. 成交密集区：按典型价 (H+L+C)/3 分箱、以成交量加权的成交量分布，取局部峰值
+3. 价位聚类：候选价位排序后按相对间距切分，簇内按强度加权得到价位
+
+强度 = Σ波段点（越近权重越高，0.5~1.0）+ Σ成交密集区（按成交量占比，最高 2.0）。
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, Union
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data_provider.bar_series import BarSeries
+
+logger = logging.getLogger(__name__)
+
+# 默认回看的自然日数（受 BAR_CACHE_HISTORY_DAYS 限制）
+DEFAULT_LOOKBACK_DAYS = 730
+
+# 价位来源位标记
+SOURCE_SWING_HIGH = 1
+SOURCE_SWING_LOW = 2
+SOURCE_VOLUME = 4
+
+SOURCE_NAMES = {
+    SOURCE_SWING_HIGH: "波段高点",
+    SOURCE_SWING_LOW: "波段低点",
+    SOURCE_VOLUME: "成交密集区",
+}
+
+
+@dataclass
+class PriceLevel:
+    """关键价位"""
+    price: float
+    strength: float           # 综合强度
+    touches: int              # 簇内波段高低点数量
+    sources: int              # 来源位标记（SOURCE_*）
+
+    @property
+    def source_text(self) -> str:
+        return "/".join(name for flag, name in SOURCE_NAMES.items() if self.sources & flag)
+
+
+@dataclass
+class KeyLevels:
+    """当前价位上下的关键支撑与压力"""
+    current_price: float = 0.0
+    bars: int = 0
+    supports: List[PriceLevel] = field(default_factory=list)       # 由近及远
+    resistances: List[PriceLevel] = field(default_factory=list)    # 由近及远
+
+    def to_dict(self) -> Dict[str, Any]:
+        def encode(level: PriceLevel) -> Dict[str, Any]:
+            return {
+                'price': round(level.price, 2),
+                'distance_pct': round((level.price / self.current_price - 1) * 100, 2) if self.current_price else None,
+                'strength': round(level.strength, 2),
+                'touches': level.touches,
+                'sources': level.source_text,
+            }
+
+        return {
+            'bars': self.bars,
+            'supports': [encode(l) for l in self.supports],
+            'resistances': [encode(l) for l in self.resistances],
+        }
+
+
+def _swing_points(values: np.ndarray, window: int, highs: bool) -> np.ndarray:
+    """半径为 window 的滑动窗口极值点下标（平台取首个）"""
+    size = 2 * window + 1
+    if len(values) < size:
+        return np.empty(0, dtype=np.int64)
+    windows = sliding_window_view(values, size)
+    center = values[window:len(values) - window]
+    extreme = windows.max(axis=1) if highs else windows.min(axis=1)
+    is_extreme = center == extreme
+    # 平台（相邻多根等值极值）只保留第一根
+    is_extreme[1:] &= center[1:] != center[:-1]
+    return np.flatnonzero(is_extreme) + window
+
+
+def _volume_nodes(typical: np.ndarray, volume: np.ndarray, bins: int, percentile: float):
+    """
+    成交量分布的局部峰值
+
+    Returns:
+        (价位, 成交量占比)
+    """
+    hist, edges = np.histogram(typical, bins=bins, weights=volume)
+    total = hist.sum()
+    if total <= 0:
+        return np.empty(0), np.empty(0)
+    padded = np.r_[-np.inf, hist, -np.inf]
+    is_peak = (hist > padded[:-2]) & (hist >= padded[2:]) & (hist >= np.percentile(hist, percentile))
+    centers = (edges[:-1] + edges[1:]) / 2
+    return centers[is_peak], hist[is_peak] / total
+
+
+def find_key_levels(
+    df: Union[pd.DataFrame, BarSeries],
+    current_price: Optional[float] = None,
+    swing_window: int = 5,
+    bins: int = 60,
+    volume_percentile: float = 70.0,
+    tolerance: float = 0.015,
+    max_levels: int = 3
+) -> KeyLevels:
+    """
+    识别关键支撑与压力位
+
+    Args:
+        df: 前复权日线 DataFrame 或 BarSeries（date/high/low/close/volume），建议 1~3 年
+        current_price: 当前价，默认最后一根收盘价
+        swing_window: 波段高低点的左右确认根数
+        bins: 成交量分布的价格分箱数
+        volume_percentile: 成交密集区须高于该分位的箱
+        tolerance: 聚类相对间距（1.5% 内的价位合并为一个）
+        max_levels: 支撑、压力各保留的数量（按强度挑选，再由近及远排列）
+
+    Returns:
+        KeyLevels
+    """
+    bars = BarSeries.from_frame(df)
+    if bars.empty:
+        return KeyLevels()
+
+    high = bars.column('high').astype(float, copy=False)
+    low = bars.column('low').astype(float, copy=False)
+    close = bars.column('close').astype(float, copy=False)
+    volume = bars.column('volume').astype(float, copy=False)
+    n = len(close)
+    price = float(current_price) if current_price else float(close[-1])
+    levels = KeyLevels(current_price=price, bars=n)
+
+    # 1. 波段高低点（越近期权重越高）
+    high_idx = _swing_points(high, swing_window, highs=True)
+    low_idx = _swing_points(low, swing_window, highs=False)
+    recency = 0.5 + 0.5 * np.arange(n) / max(n - 1, 1)
+
+    # 2. 成交密集区
+    node_prices, node_shares = _volume_nodes((high + low + close) / 3, volume, bins, volume_percentile)
+    node_weights = 2.0 * node_shares / node_shares.max() if len(node_shares) else node_shares
+
+    prices = np.concatenate([high[high_idx], low[low_idx], node_prices])
+    if len(prices) == 0:
+        return levels
+    weights = np.concatenate([recency[high_idx], recency[low_idx], node_weights])
+    touches = np.concatenate([np.ones(len(high_idx) + len(low_idx), dtype=np.int64),
+                              np.zeros(len(node_prices), dtype=np.int64)])
+    sources = np.concatenate([np.full(len(high_idx), SOURCE_SWING_HIGH),
+                              np.full(len(low_idx), SOURCE_SWING_LOW),
+                              np.full(len(node_prices), SOURCE_VOLUME)]).astype(np.int64)
+
+    # 3. 聚类：排序后相邻间距超过 tolerance 处切分
+    order = np.argsort(prices)
+    prices, weights, touches, sources = prices[order], weights[order], touches[order], sources[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(prices) / prices[:-1] > tolerance) + 1]
+    strength = np.add.reduceat(weights, starts)
+    cluster_price = np.add.reduceat(prices * weights, starts) / strength
+    cluster_touches = np.add.reduceat(touches, starts)
+    cluster_sources = np.bitwise_or.reduceat(sources, starts)
+
+    def pick(mask: np.ndarray) -> List[PriceLevel]:
+        idx = np.flatnonzero(mask)
+        idx = idx[np.argsort(-strength[idx], kind='stable')[:max_levels]]
+        idx = idx[np.argsort(np.abs(cluster_price[idx] - price))]
+        return [PriceLevel(float(cluster_price[i]), float(strength[i]), int(cluster_touches[i]),
+                           int(cluster_sources[i])) for i in idx]
+
+    levels.supports = pick(cluster_price < price)
+    levels.resistances = pick(cluster_price > price)
+    return levels
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(7)
+    n = 500
+    close = 10 * np.cumprod(1 + rng.normal(0.0005, 0.02, n))
+    df = pd.DataFrame({
+        'date': pd.bdate_range('2024-01-01', periods=n),
+        'high': close * (1 + rng.uniform(0, 0.02, n)),
+        'low': close * (1 - rng.uniform(0, 0.02, n)),
+        'close': close,
+        'volume': rng.uniform(1e5, 1e6, n),
+    })
+
+    start = time.perf_counter()
+    levels = find_key_levels(df)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"现价 {levels.current_price:.2f}，{levels.bars} 根 K 线，耗时 {elapsed:.2f} ms")
+    for kind, items in (("压力", levels.resistances[::-1]), ("支撑", levels.supports)):
+        for level in items:
+            print(f"{kind} {level.price:.2f} 强度{level.strength:.1f} {level.source_text} {level.touches}次触及")